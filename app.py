@@ -4,12 +4,13 @@ from flask_wtf import CSRFProtect
 from flask_socketio import SocketIO
 from flask_session import Session
 from database.base import db, login_manager
+from database.routing import replica_binds, replica_status
+from database.instrumentation import init_sql_instrumentation
 from dotenv import load_dotenv
 from markupsafe import Markup
+import click
 import logging
 import os
-import markdown
-import redis
 
 # 加载环境变量
 env_path = os.path.join(os.path.dirname(__file__), ".env")
@@ -39,6 +40,23 @@ def create_app():
         "SQLALCHEMY_TRACK_MODIFICATIONS"
     )
 
+    # 只读从库（可选，逗号分隔），@read_only 查询会路由到这些库
+    replica_uris = [
+        uri.strip()
+        for uri in os.getenv("SQLALCHEMY_REPLICA_URIS", "").split(",")
+        if uri.strip()
+    ]
+    app.config["SQLALCHEMY_BINDS"] = replica_binds(replica_uris)
+    app.config["SQLALCHEMY_REPLICA_MAX_LAG"] = float(
+        os.getenv("SQLALCHEMY_REPLICA_MAX_LAG", 5)
+    )  # 允许的最大复制延迟（秒）
+    app.config["SQLALCHEMY_REPLICA_LAG_CHECK_INTERVAL"] = float(
+        os.getenv("SQLALCHEMY_REPLICA_LAG_CHECK_INTERVAL", 10)
+    )  # 延迟探测周期（秒）
+    app.config["SQLALCHEMY_REPLICA_STICKY_SECONDS"] = float(
+        os.getenv("SQLALCHEMY_REPLICA_STICKY_SECONDS", 5)
+    )  # 提交后继续读主库的时间窗口（秒）
+
     # Redis 会话配置
     app.config["SESSION_TYPE"] = "redis"
     app.config["SESSION_PERMANENT"] = True
@@ -46,15 +64,11 @@ def create_app():
     app.config["SESSION_KEY_PREFIX"] = "session:"  # Redis key 前缀
     app.config["PERMANENT_SESSION_LIFETIME"] = timedelta(days=7)  # 会话过期时间
 
-    # 初始化 Redis 连接用于会话存储
+    # 初始化 Redis 连接用于会话存储（与 SharedDict 共用 RedisClient 管理的连接池）
     try:
-        app.config["SESSION_REDIS"] = redis.Redis(
-            host=os.getenv("REDIS_HOST", "localhost"),
-            port=int(os.getenv("REDIS_PORT", 6379)),
-            db=int(os.getenv("REDIS_SESSION_DB", 1)),  # 使用独立的数据库
-            password=os.getenv("REDIS_PASSWORD", None),
-            decode_responses=False,  # Flask-Session 需要 bytes
-        )
+        from utils.redis_client import RedisClient
+
+        app.config["SESSION_REDIS"] = RedisClient().session_client
         # 测试连接
         app.config["SESSION_REDIS"].ping()
         app.logger.info("Redis 会话存储连接成功")
@@ -81,6 +95,13 @@ def create_app():
         ),  # 超过 pool_size 后最多再创建的连接数
     }
 
+    # SQL 统计与慢查询日志
+    app.config["SQL_SLOW_QUERY_MS"] = float(os.getenv("SQL_SLOW_QUERY_MS", 200))
+    app.config["SQL_N_PLUS_ONE_THRESHOLD"] = int(
+        os.getenv("SQL_N_PLUS_ONE_THRESHOLD", 5)
+    )  # 同一语句在单个请求中执行多少次视为疑似 N+1
+    app.config["SLOW_QUERY_LOG"] = os.getenv("SLOW_QUERY_LOG", "slow_query.log")
+
     app.config["LOG_LEVEL"] = os.getenv("LOG_LEVEL")
     app.config["ADMIN_ONLY_LOGIN"] = os.getenv("ADMIN_ONLY_LOGIN", "False") == "True"
     app.config["TEACHER_REGISTRATION_CODE"] = os.getenv("TEACHER_REGISTRATION_CODE")
@@ -103,6 +124,12 @@ def create_app():
     app.config["MEM_LIMIT"] = os.getenv("MEM_LIMIT", "1g")
     app.config["MEMSWAP_LIMIT"] = os.getenv("MEMSWAP_LIMIT", "1.5g")
     app.config["PIDS_LIMIT"] = int(os.getenv("PIDS_LIMIT", 8))
+    app.config["DOCKER_EVENT_WATCHER"] = (
+        os.getenv("DOCKER_EVENT_WATCHER", "True") == "True"
+    )  # 由一个 worker 订阅 Docker 事件维护容器状态
+    app.config["CONTAINER_STATS"] = (
+        os.getenv("CONTAINER_STATS", "True") == "True"
+    )  # 由一个 worker 采集容器资源用量
 
     # CSRF保护
     csrf = CSRFProtect()
@@ -113,17 +140,43 @@ def create_app():
 
     # 初始化 SocketIO (用于 WebShell)
     # 使用 eventlet 模式以支持 Gunicorn + WebSocket
+    # 多个 worker 通过 Redis 消息队列互相转发 emit，后台线程的推送可以到达任意 worker
+    # 上的客户端；Redis 不可用时退化为单 worker 模式
+    from utils.redis_client import RedisClient
+
+    message_queue = os.getenv("SOCKETIO_MESSAGE_QUEUE")
+    if message_queue is None and RedisClient().is_available():
+        password = os.getenv("REDIS_PASSWORD")
+        auth = f":{password}@" if password else ""
+        message_queue = (
+            f"redis://{auth}{os.getenv('REDIS_HOST', 'localhost')}:"
+            f"{os.getenv('REDIS_PORT', 6379)}/{os.getenv('REDIS_DB', 0)}"
+        )
+    if not message_queue:
+        app.logger.warning("未配置 Socket.IO 消息队列，跨 worker 推送不可用")
+    # 客户端可用的传输方式：未配置负载均衡粘性会话时只能使用 websocket，
+    # 轮询请求会落到不同 worker 上
+    app.config["SOCKETIO_TRANSPORTS"] = os.getenv("SOCKETIO_TRANSPORTS", "websocket")
     global socketio
     socketio = SocketIO(
         app,
         cors_allowed_origins="*",
         async_mode=os.getenv("WORKER_CLASS", "eventlet"),
+        message_queue=message_queue or None,
+        channel=os.getenv("SOCKETIO_CHANNEL", "uniweb-socketio"),
+        # 负载均衡按该 cookie 做会话粘性（例如 nginx sticky cookie）
+        cookie=os.getenv("SOCKETIO_AFFINITY_COOKIE") or None,
         logger=False,
         engineio_logger=False,
     )
 
+    @app.context_processor
+    def inject_socketio_transports():
+        return {"socketio_transports": app.config["SOCKETIO_TRANSPORTS"]}
+
     # 初始化数据库
     db.init_app(app)
+    init_sql_instrumentation(app)
 
     # 启用 SQLite 外键约束（测试环境）
     if "sqlite" in app.config["SQLALCHEMY_DATABASE_URI"]:
@@ -190,22 +243,224 @@ def create_app():
     # 初始化 Terminal WebSocket 事件处理器
     init_terminal_socketio(socketio)
 
+    # 初始化项目状态推送
+    from blueprints.status import init_status_socketio
+
+    init_status_socketio(socketio)
+
+    # Docker 事件监听（各 worker 收到第一个请求时参与选主）
+    from utils.docker_watcher import init_docker_watcher
+
+    init_docker_watcher(app)
+
+    # 容器生命周期任务执行者（各 worker 收到第一个请求时参与选主）
+    from utils.lifecycle import init_lifecycle
+
+    init_lifecycle(app)
+
+    # 空闲容器休眠检查（各 worker 收到第一个请求时参与选主）
+    from utils.hibernation import init_hibernation
+
+    init_hibernation(app)
+
+    # 容器资源用量采集（各 worker 收到第一个请求时参与选主）
+    from utils.container_stats import init_container_stats
+
+    init_container_stats(app)
+
     # 注册 Markdown 过滤器
+    from utils.markdown_renderer import render_markdown
+
     @app.template_filter("markdown")
     def markdown_filter(text):
-        """将 Markdown 文本转换为 HTML"""
-        if not text:
-            return ""
-        md = markdown.Markdown(
-            extensions=[
-                "extra",  # 支持表格、代码块等扩展语法
-                "codehilite",  # 代码高亮
-                "fenced_code",  # 围栏代码块
-                "nl2br",  # 换行转 <br>
-                "sane_lists",  # 更好的列表支持
-            ]
+        """将 Markdown 文本转换为 HTML（按内容哈希缓存）"""
+        return Markup(render_markdown(text))
+
+    # 注册命令行工具（flask --app main <command>）
+    @app.cli.command("upgrade-db")
+    def upgrade_db_command():
+        """为已有数据库补齐新增的列、约束和索引"""
+        from database.migrations import upgrade_database
+
+        applied = upgrade_database()
+        if applied:
+            for name in applied:
+                click.echo(f"已应用: {name}")
+        else:
+            click.echo("数据库结构已是最新")
+
+    @app.cli.command("reconcile-stars")
+    def reconcile_stars_command():
+        """按点赞表校正项目点赞计数（可由 cron 定期执行）"""
+        from database.actions import reconcile_project_star_counts
+
+        fixed = reconcile_project_star_counts()
+        if fixed < 0:
+            raise click.ClickException("点赞计数校正失败，详见日志")
+        click.echo(f"点赞计数校正完成，修正项目数: {fixed}")
+
+    @app.cli.command("explain-queries")
+    def explain_queries_command():
+        """检查热点查询的执行计划，存在全表扫描时以非零状态退出"""
+        from database.explain import explain_hot_queries
+
+        results = explain_hot_queries()
+        for result in results:
+            mark = "FULL SCAN" if result["full_scan"] else "OK"
+            click.echo(f"[{mark}] {result['name']}")
+            click.echo(f"    {result['sql']}")
+            for line in result["plan"]:
+                click.echo(f"      - {line}")
+        if any(result["full_scan"] for result in results):
+            raise click.ClickException("存在未走索引的热点查询")
+
+    @app.cli.command("check-query-counts")
+    def check_query_counts_command():
+        """在临时 SQLite 库上检查列表/详情加载器的查询次数不随数据量增长"""
+        from database.checks import LARGE_SIZE, SMALL_SIZE, check_query_counts
+
+        results = check_query_counts()
+        for result in results:
+            mark = "OK" if result["ok"] else "N+1"
+            click.echo(
+                f"[{mark}] {result['name']}: {SMALL_SIZE} 组 {result['small']} 条, "
+                f"{LARGE_SIZE} 组 {result['large']} 条"
+            )
+        if not all(result["ok"] for result in results):
+            raise click.ClickException("存在随数据量增长的查询（N+1）")
+
+    @app.cli.command("check-replica-routing")
+    def check_replica_routing_command():
+        """在一主一从两个临时 SQLite 库上检查只读查询路由与读己之写"""
+        from database.checks import check_replica_routing
+
+        results = check_replica_routing()
+        for result in results:
+            click.echo(f"[{'OK' if result['ok'] else 'FAIL'}] {result['name']}")
+        if not all(result["ok"] for result in results):
+            raise click.ClickException("读写分离检查失败")
+
+    @app.cli.command("replica-status")
+    def replica_status_command():
+        """探测所有只读从库的复制延迟与可用状态"""
+        status = replica_status(db)
+        if not status:
+            click.echo("未配置从库 (SQLALCHEMY_REPLICA_URIS)")
+        for replica in status:
+            mark = "OK" if replica["healthy"] else "FALLBACK"
+            click.echo(f"[{mark}] {replica['bind']} {replica['url']} lag={replica['lag']}")
+
+    @app.cli.command("import-roster")
+    @click.argument("csv_file", type=click.File("r", encoding="utf-8-sig"))
+    @click.option("--default-password", default=None, help="password 列为空时使用")
+    @click.option("--workers", default=None, type=int, help="密码哈希进程数")
+    def import_roster_command(csv_file, default_password, workers):
+        """从 CSV 花名册批量导入用户、工作组和项目"""
+        from database.roster import import_roster
+
+        report = import_roster(csv_file, default_password, workers)
+        for error in report["errors"]:
+            click.echo(f"第 {error['line']} 行 ({error['uname']}): {error['error']}")
+        click.echo(
+            f"导入完成: 用户 {report['users']}, 工作组 {report['groups']}, "
+            f"项目 {report['projects']}, 错误 {len(report['errors'])}"
         )
-        return Markup(md.convert(text))
+
+    @app.cli.command("reseed-ports")
+    def reseed_ports_command():
+        """按项目端口与宿主机监听端口重建端口位图（清除已失效的占用）"""
+        from utils.port_allocator import port_stats, seed
+
+        seed(replace=True)
+        stats = port_stats()
+        if stats["reserved"] is None:
+            raise click.ClickException("Redis 不可用，端口位图未重建")
+        click.echo(f"端口位图已重建: 已占用 {stats['reserved']}, 空闲 {stats['free']}")
+
+    @app.cli.command("bench-markdown")
+    @click.option("--rounds", default=20, show_default=True, type=int)
+    def bench_markdown_command(rounds):
+        """对比 Markdown 冷渲染、复用渲染器与缓存命中的耗时"""
+        from database.models import Project, Group, User
+        from utils.markdown_renderer import benchmark_markdown
+        from sqlalchemy import select
+
+        texts = []
+        for column in (Project.pinfo, Group.ginfo, User.uinfo):
+            texts += db.session.execute(
+                select(column).where(column.is_not(None)).limit(50)
+            ).scalars().all()
+        result = benchmark_markdown(texts, rounds)
+        click.echo(
+            f"{result['documents']} 篇: 冷渲染 {result['cold_ms']} ms, "
+            f"复用渲染器 {result['reuse_ms']} ms, 缓存命中 {result['warm_ms']} ms"
+        )
+
+    @app.cli.command("migrate-shared-dict")
+    def migrate_shared_dict_command():
+        """将旧版 docker_status:* / terminal_sessions:* 键迁移到命名空间 hash"""
+        from utils.redis_client import docker_status, terminal_sessions
+
+        for shared in (docker_status, terminal_sessions):
+            if not shared.redis_client.is_available():
+                raise click.ClickException("Redis 不可用")
+            migrated = shared.migrate_legacy_keys()
+            click.echo(f"{shared.namespace}: 迁移 {migrated} 个键")
+
+    @app.cli.command("bench-shared-dict")
+    @click.option("--keys", "count", default=200, show_default=True, type=int)
+    def bench_shared_dict_command(count):
+        """对比 SharedDict 逐键读写与批量读写的耗时（需要可用的 Redis）"""
+        from utils.redis_client import benchmark_shared_dict
+
+        result = benchmark_shared_dict(count)
+        if result is None:
+            raise click.ClickException("Redis 不可用")
+        pairs = (("set", "set_many"), ("get", "get_many"), ("delete", "delete_many"))
+        for single, batch in pairs:
+            click.echo(
+                f"{count} 个键: {single} {result[single]} ms, {batch} {result[batch]} ms"
+            )
+
+    @app.cli.command("bench-codecs")
+    @click.option("--rounds", default=2000, show_default=True, type=int)
+    def bench_codecs_command(rounds):
+        """对比 SharedDict 各编解码器的编码/解码耗时与编码后大小"""
+        from utils.shared_codec import benchmark_codecs
+
+        for row in benchmark_codecs(rounds):
+            click.echo(
+                f"{row['record']:<17} {row['codec']:<18} "
+                f"encode {row['encode_us']:>8} us  decode {row['decode_us']:>8} us  "
+                f"{row['bytes']:>6} B"
+            )
+
+    @app.cli.command("migrate-keys")
+    @click.argument("target_uri")
+    @click.option("--batch-size", default=1000, show_default=True, type=int)
+    def migrate_keys_command(target_uri, batch_size):
+        """将当前数据库复制到使用二进制主键（DB_KEY_MODE=binary）的目标库"""
+        from database.key_migration import migrate_to_binary_keys
+
+        try:
+            copied = migrate_to_binary_keys(target_uri, batch_size)
+        except RuntimeError as e:
+            raise click.ClickException(str(e))
+        for table_name, count in copied.items():
+            click.echo(f"{table_name}: {count} 行")
+        click.echo("迁移完成，请将 SQLALCHEMY_DATABASE_URI 指向目标库并设置 DB_KEY_MODE=binary")
+
+    @app.cli.command("bench-keys")
+    @click.option("--rows", default=10000, show_default=True, type=int)
+    def bench_keys_command(rows):
+        """对比字符串 UUIDv4 与二进制 UUIDv7 主键的插入吞吐和索引大小"""
+        from database.key_migration import benchmark_key_layouts
+
+        for name, result in benchmark_key_layouts(rows).items():
+            click.echo(
+                f"{name}: {result['rows_per_second']} 行/秒, "
+                f"数据 {result['data_bytes']} 字节, 索引 {result['index_bytes']} 字节"
+            )
 
     # 创建数据库表
     with app.app_context():
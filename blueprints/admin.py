@@ -4,6 +4,7 @@ from flask import (
     render_template,
     flash,
     abort,
+    request,
 )
 from flask_login import login_required, current_user
 from functools import wraps
@@ -11,7 +12,16 @@ from database.actions import *
 from blueprints.user import UserForm
 from blueprints.group import GroupForm, ChangeLeaderForm
 from blueprints.project import ProjectForm
+from database.roster import import_roster
+from database.instrumentation import get_sql_stats, reset_sql_stats
+from utils.redis_client import RedisClient, cache_stats
+from utils.docker_client import docker_metrics
+from utils.lifecycle import executor as lifecycle_executor
+from utils.hibernation import hibernation_stats
+from utils.container_stats import ORDERINGS, collector, top_consumers
+from utils import port_allocator
 import logging
+import os
 
 # 管理员蓝图
 admin_bp = Blueprint("admin", __name__)
@@ -56,7 +66,104 @@ def admin_required(func):
 @admin_required
 def dashboard():
     """管理员仪表板"""
-    return render_template("admin/dashboard.html")
+    return render_template("admin/dashboard.html", hibernation=hibernation_stats())
+
+
+@admin_bp.route("/sql_stats", methods=["GET"])
+@login_required
+@admin_required
+def sql_stats():
+    """当前 worker 的按端点 SQL 统计（查询次数、耗时、疑似 N+1）"""
+    return jsonify(get_sql_stats(top=request.args.get("top", 20, type=int))), 200
+
+
+@admin_bp.route("/sql_stats/reset", methods=["POST"])
+@login_required
+@admin_required
+def sql_stats_reset():
+    """清空当前 worker 的 SQL 统计"""
+    reset_sql_stats()
+    return jsonify({"message": "SQL 统计已清空"}), 200
+
+
+@admin_bp.route("/cache_stats", methods=["GET"])
+@login_required
+@admin_required
+def shared_cache_stats():
+    """当前 worker 的 SharedDict 近端缓存命中率、内存字典占用与 Redis 连接池状态"""
+    return (
+        jsonify(
+            {
+                "pid": os.getpid(),
+                "redis": RedisClient().stats(),
+                "namespaces": cache_stats(),
+            }
+        ),
+        200,
+    )
+
+
+@admin_bp.route("/docker_metrics", methods=["GET"])
+@login_required
+@admin_required
+def docker_call_metrics():
+    """当前 worker 各 Docker 操作的调用次数、错误、熔断拒绝与耗时"""
+    return jsonify(docker_metrics()), 200
+
+
+@admin_bp.route("/lifecycle", methods=["GET"])
+@login_required
+@admin_required
+def lifecycle_stats():
+    """容器生命周期任务队列长度、执行者状态与预热池命中率、启动耗时"""
+    return jsonify(lifecycle_executor.stats()), 200
+
+
+@admin_bp.route("/hibernation", methods=["GET"])
+@login_required
+@admin_required
+def hibernation_status():
+    """空闲休眠的容器数与释放的内存"""
+    return jsonify(hibernation_stats()), 200
+
+
+@admin_bp.route("/top_consumers", methods=["GET"])
+@login_required
+@admin_required
+def container_top_consumers():
+    """按最近一次采样排序的资源占用最高的项目（by: cpu | memory | network | io）"""
+    by = request.args.get("by", "cpu")
+    if by not in ORDERINGS:
+        abort(400, description=f"by 仅支持 {', '.join(ORDERINGS)}")
+    limit = min(max(request.args.get("limit", 10, type=int), 1), 50)
+    rows = top_consumers(by, limit)
+    for row in rows:
+        project = get_project_by_pid(row["pid"])
+        row["pname"] = project.pname if project else None
+    return jsonify({"by": by, "collector": collector.stats(), "projects": rows}), 200
+
+
+@admin_bp.route("/import_roster", methods=["POST"])
+@login_required
+@admin_required
+def roster_import():
+    """上传 CSV 花名册，批量导入用户、工作组和项目"""
+    file = request.files.get("roster")
+    if not file or not file.filename:
+        abort(400, description="请选择要导入的 CSV 文件")
+    try:
+        content = file.read().decode("utf-8-sig")
+    except UnicodeDecodeError:
+        abort(400, description="CSV 文件需使用 UTF-8 编码")
+    report = import_roster(
+        content, default_password=request.form.get("default_password") or None
+    )
+    logger.info(
+        f"花名册导入: users={report['users']}, groups={report['groups']}, "
+        f"projects={report['projects']}, errors={len(report['errors'])}, "
+        f"operator={current_user.uname}"
+    )
+    return jsonify(report), 200
 
 
 @admin_bp.route("/del_user/<uuid:uid>", methods=["POST"])
@@ -136,9 +243,13 @@ def del_group(gid):
     if not group:
         flash("工作组不存在", "warning")
         return jsonify({"error": "工作组不存在"}), 404
+    # 组内项目随工作组级联删除，删除前记下它们的端口
+    ports = [project.port for project in group.projects]
     if not delete_group(group):
         flash("删除工作组失败", "error")
         return jsonify({"error": "删除工作组失败"}), 500
+    for port in ports:
+        port_allocator.release(port)
     flash("工作组已删除", "success")
     return jsonify({"message": "工作组删除成功"}), 200
 
@@ -201,9 +312,11 @@ def del_project(pid):
     if not project:
         flash("项目不存在", "warning")
         return jsonify({"error": "项目不存在"}), 404
+    port = project.port
     if not delete_project(project):
         flash("删除项目失败", "error")
         return jsonify({"error": "删除项目失败"}), 500
+    port_allocator.release(port)
     flash("项目已删除", "success")
     return jsonify({"message": "项目删除成功"}), 200
 
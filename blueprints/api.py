@@ -1,6 +1,8 @@
 from flask import (
     Blueprint,
     jsonify,
+    request,
+    abort,
 )
 from flask_login import login_user, logout_user, login_required, current_user
 from database.actions import *
@@ -11,13 +13,51 @@ import logging
 api_bp = Blueprint("api", __name__)
 logger = logging.getLogger(__name__)
 
+# 游标分页参数
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+@api_bp.errorhandler(400)
+def handle_bad_request(e):
+    """参数错误统一返回JSON"""
+    return jsonify({"error": e.name, "message": e.description}), 400
+
+
+def _page_args():
+    """解析分页参数 limit / after，游标无效时返回 400"""
+    limit = request.args.get("limit", DEFAULT_PAGE_SIZE, type=int)
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    after = request.args.get("after") or None
+    if after:
+        try:
+            decode_cursor(after)
+        except ValueError:
+            abort(400, description="无效的分页游标")
+    return limit, after
+
+
+def _page_response(items, data, limit):
+    """组装分页响应，满页时返回下一页游标"""
+    next_cursor = encode_cursor(items[-1]) if len(items) == limit else None
+    return jsonify({"items": data, "next_cursor": next_cursor})
+
+
+@api_bp.route("/stats", methods=["GET"])
+@login_required
+@admin_required
+def api_stats():
+    """用户、工作组、项目总数"""
+    return jsonify(get_system_stats())
+
 
 @api_bp.route("/users", methods=["GET"])
 @login_required
 @admin_required
 def api_users():
-    """列出所有用户"""
-    users = list_all_users()
+    """分页列出用户"""
+    limit, after = _page_args()
+    users = list_all_users(limit=limit, after=after)
     users_data = [
         {
             "uid": user.uid,
@@ -30,15 +70,16 @@ def api_users():
         }
         for user in users
     ]
-    return jsonify(users_data)
+    return _page_response(users, users_data, limit)
 
 
 @api_bp.route("/groups", methods=["GET"])
 @login_required
 @admin_required
 def api_groups():
-    """列出所有工作组"""
-    groups = list_all_groups()
+    """分页列出工作组"""
+    limit, after = _page_args()
+    groups = list_all_groups_with_stats(load_projects=True, limit=limit, after=after)
     groups_data = [
         {
             "gid": group.gid,
@@ -50,26 +91,28 @@ def api_groups():
         }
         for group in groups
     ]
-    return jsonify(groups_data)
+    return _page_response(groups, groups_data, limit)
 
 
 @api_bp.route("/projects", methods=["GET"])
 @login_required
 @admin_required
 def list_projects():
-    """列出所有项目"""
-    projects = list_all_projects()
+    """分页列出项目"""
+    limit, after = _page_args()
+    projects = list_all_projects_with_stats(limit=limit, after=after)
     projects_data = [
         {
             "pid": project.pid,
             "pname": project.pname,
+            "pinfo": project.pinfo,
             "gid": project.gid,
             "gname": project.group.gname,
             "docker_name": project.docker_name,
             "port": project.port,
             "docker_port": project.docker_port,
-            "star_count": len(project.stars),
+            "star_count": project.star_count or 0,
         }
         for project in projects
     ]
-    return jsonify(projects_data)
+    return _page_response(projects, projects_data, limit)
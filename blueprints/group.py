@@ -11,10 +11,17 @@ from flask import (
 )
 from flask_login import login_required, current_user
 from flask_wtf import FlaskForm
-from wtforms import StringField, SubmitField, SelectField, TextAreaField
-from wtforms.validators import DataRequired, Length
+from wtforms import (
+    StringField,
+    SubmitField,
+    SelectField,
+    TextAreaField,
+    IntegerField,
+)
+from wtforms.validators import DataRequired, Length, Optional, NumberRange
 from database.actions import *
-from blueprints.project import ProjectForm
+from blueprints.project import ProjectForm, reserve_port
+from utils import port_allocator
 from utils.image_upload import save_uploaded_image
 import logging
 
@@ -30,6 +37,9 @@ class GroupForm(FlaskForm):
         "工作组名称", validators=[DataRequired(), Length(min=3, max=50)]
     )
     ginfo = TextAreaField("工作组描述", validators=[Length(max=2000)])
+    idle_timeout = IntegerField(
+        "空闲休眠（分钟）", validators=[Optional(), NumberRange(min=0, max=60 * 24 * 30)]
+    )
     submit = SubmitField("保存")
 
 
@@ -89,7 +99,7 @@ def leader_required(func):
 @group_bp.route("/", methods=["GET"])
 def group_list():
     """工作组列表页面"""
-    groups = list_all_groups()
+    groups = list_all_groups_with_stats()
 
     # 获取当前用户的所有待审核申请
     user_applications = {}
@@ -109,7 +119,7 @@ def group_list():
 def group_detail(gid):
     """工作组详情页面"""
     gid = str(gid)
-    group = get_group_by_gid(gid)
+    group = get_group_with_members_by_gid(gid)
     if not group:
         abort(404, description="工作组不存在")
 
@@ -332,14 +342,19 @@ def project_create(gid):
         return redirect(url_for("group.group_list"))
     form = ProjectForm()
     if form.validate_on_submit():
+        port = reserve_port(form.port.data)
+        if port is None:
+            flash("端口号已被占用或没有可用端口，请重试", "danger")
+            return render_template("project/create.html", form=form, group=group)
         project = create_project(
             pname=form.pname.data,
             pinfo=form.pinfo.data,
             gid=group.gid,
-            port=form.port.data,
+            port=port,
             docker_port=form.docker_port.data,
         )
         if not project:
+            port_allocator.release(port)
             flash("创建项目失败，请重试", "danger")
             logger.error(
                 f"创建项目失败: project={form.pname.data}, group={group.gname}, operator={current_user.uname}"
@@ -366,12 +381,13 @@ def project_delete(gid, pid):
     if not project or str(project.gid) != str(gid):
         return jsonify({"error": "项目不存在"}), 404
 
-    pname = project.pname  # 保存项目名，删除后无法访问
+    pname, port = project.pname, project.port  # 删除后无法访问
     if not delete_project(project):
         logger.error(
             f"删除项目失败: project={pname}, pid={pid}, operator={current_user.uname}"
         )
         return jsonify({"error": "删除项目失败"}), 500
+    port_allocator.release(port)
     logger.info(
         f"删除项目成功: project={pname}, pid={pid}, operator={current_user.uname}"
     )
@@ -440,6 +456,7 @@ def group_edit(gid):
             group,
             gname=form.gname.data,
             ginfo=form.ginfo.data,
+            idle_timeout=form.idle_timeout.data,
         )
         if not updated_group:
             flash("更新工作组信息失败，请重试", "danger")
@@ -468,8 +485,12 @@ def group_delete(gid):
     group = get_group_by_gid(gid)
     if not group:
         return jsonify({"error": "工作组不存在"}), 404
+    # 组内项目随工作组级联删除，删除前记下它们的端口
+    ports = [project.port for project in group.projects]
     if not delete_group(group):
         logger.warning(f"删除工作组失败: {group.gname} by user {current_user.uname}")
         return jsonify({"error": "删除工作组失败"}), 500
+    for port in ports:
+        port_allocator.release(port)
     logger.info(f"删除工作组成功: {group.gname} by user {current_user.uname}")
     return jsonify({"message": "工作组已成功删除"}), 200  # 自动清空用户的gid字段
@@ -13,27 +13,29 @@ from flask import (
 from flask_login import login_required, current_user
 from flask_wtf import FlaskForm
 from wtforms import StringField, SubmitField, TextAreaField
-from wtforms.validators import DataRequired, Length, ValidationError
+from wtforms.validators import DataRequired, Length, Optional, ValidationError
 from database.actions import *
 from utils.redis_client import docker_status as DOCKER_STATUS
+from utils.docker_watcher import docker_events, watcher as docker_watcher
 from utils.docker_client import (
-    _docker_image_exists,
     _docker_container_exists,
     _docker_container_status,
-    _docker_build_image,
-    _docker_run_container,
-    _docker_start_container,
-    _docker_stop_container,
-    _docker_remove_container,
+    _docker_containers_status,
+    docker_client,
 )
+from utils import container_stats, lifecycle, port_allocator
+from utils.lifecycle import set_docker_status
 from utils.image_upload import save_uploaded_image
 import logging
-import threading
+import uuid
 
 # 项目蓝图
 project_bp = Blueprint("project", __name__)
 logger = logging.getLogger(__name__)
 
+# stop / remove 请求等待任务结束的最长时间（秒）
+LIFECYCLE_WAIT_TIMEOUT = 30
+
 
 # -------------------------------------------------------------------------------------------
 # Project Forms
@@ -41,7 +43,7 @@ logger = logging.getLogger(__name__)
 class ProjectForm(FlaskForm):
     pname = StringField("项目名称", validators=[DataRequired(), Length(min=3, max=100)])
     pinfo = TextAreaField("项目描述", validators=[Length(max=5000)])
-    port = StringField("项目端口", validators=[DataRequired(), Length(min=2, max=10)])
+    port = StringField("项目端口", validators=[Optional(), Length(max=10)])
     docker_port = StringField(
         "Docker端口", validators=[DataRequired(), Length(min=2, max=10)]
     )
@@ -54,14 +56,18 @@ class ProjectForm(FlaskForm):
 
     # 自定义验证器
     def validate_port(self, port):
-        if not port.data.isdigit() or not (10000 <= int(port.data) <= 65535):
-            raise ValidationError("端口号必须是10000到65535之间的数字")
+        # 留空时自动分配
+        if not port.data:
+            return
+        low, high = port_allocator.PORT_RANGE
+        if not port.data.isdigit() or not (low <= int(port.data) <= high):
+            raise ValidationError(f"端口号必须是{low}到{high}之间的数字")
         # 如果端口号没有改变，跳过验证
         if self.original_port and int(port.data) == int(self.original_port):
             return
-        # 检查端口是否被其他项目占用
+        # 检查端口是否被其他项目或宿主机上的进程占用
         existing_project = get_projects_by_port(port.data)
-        if existing_project:
+        if existing_project or port_allocator.is_reserved(port.data):
             raise ValidationError("端口号已被占用")
 
     def validate_docker_port(self, docker_port):
@@ -71,6 +77,25 @@ class ProjectForm(FlaskForm):
             raise ValidationError("Docker端口号必须是1024到65535之间的数字")
 
 
+def reserve_port(requested, current=None):
+    """
+    为项目预留宿主机端口。
+
+    参数:
+        requested (str): 表单中填写的端口，为空时沿用当前端口或自动分配。
+        current (int): 项目当前的端口。
+
+    返回:
+        int: 预留的端口；端口已被占用或没有可用端口时返回 None。
+    """
+    if not requested:
+        return current or port_allocator.allocate()
+    port = int(requested)
+    if current and port == int(current):
+        return port
+    return port if port_allocator.claim(port) else None
+
+
 # -------------------------------------------------------------------------------------------
 # Group Decorators
 # -------------------------------------------------------------------------------------------
@@ -102,7 +127,7 @@ def group_required_pid(func):
 @project_bp.route("/", methods=["GET"])
 def project_list():
     """项目列表页面"""
-    projects = list_all_projects()
+    projects = list_all_projects_with_stats()
     external_url = (
         current_app.config.get("SERVER_PROTOCOL", "http")
         + "://"
@@ -117,15 +142,15 @@ def project_list():
 def project_detail(pid):
     """项目详情页面"""
     pid = str(pid)
-    project = get_project_by_pid(pid)
+    project = get_project_with_stats_by_pid(pid)
     if not project:
         abort(404, description="项目不存在")
 
     # 获取评论列表
     comments = get_ordered_project_comments_by_pid(pid)
 
-    # 获取点赞数和当前用户点赞状态
-    star_count = get_project_star_count_by_pid(pid)
+    # 点赞数已随项目一并加载，这里只需检查当前用户点赞状态
+    star_count = project.star_count or 0
     user_starred = False
     if current_user.is_authenticated:
         user_starred = check_user_starred(current_user.uid, pid)
@@ -158,44 +183,23 @@ def project_star(pid):
     if not project:
         return jsonify({"success": False, "message": "项目不存在"}), 404
 
-    # find existing star record by current user
-    existing_star = next((s for s in project.stars if s.uid == current_user.uid), None)
-    if existing_star:
-        # 已点赞，取消点赞
-        if not delete_project_star(existing_star):
-            logger.error(
-                f"取消点赞失败: user={current_user.uname}, project={project.pname}"
-            )
-            return jsonify({"success": False, "message": "取消点赞失败"}), 500
-        # get fresh count
-        star_count = get_project_star_count_by_pid(pid)
-        logger.debug(f"取消点赞: user={current_user.uname}, project={project.pname}")
-        return (
-            jsonify(
-                {
-                    "success": True,
-                    "message": "取消点赞成功",
-                    "star_count": star_count,
-                    "starred": False,
-                }
-            ),
-            200,
-        )
-
-    # 未点赞，添加点赞
-    new_star = create_project_star(current_user.uid, project.pid)
-    if not new_star:
-        logger.error(f"点赞失败: user={current_user.uname}, project={project.pname}")
-        return jsonify({"success": False, "message": "点赞失败"}), 500
-    star_count = get_project_star_count_by_pid(pid)
-    logger.debug(f"点赞成功: user={current_user.uname}, project={project.pname}")
+    # 点赞记录与计数器在同一事务内切换（提交后 project 已过期，先取出项目名用于日志）
+    pname = project.pname
+    result = toggle_project_star(current_user.uid, project.pid)
+    if result is None:
+        logger.error(f"切换点赞失败: user={current_user.uname}, project={pname}")
+        return jsonify({"success": False, "message": "点赞操作失败"}), 500
+    starred, star_count = result
+    logger.debug(
+        f"{'点赞' if starred else '取消点赞'}: user={current_user.uname}, project={pname}"
+    )
     return (
         jsonify(
             {
                 "success": True,
-                "message": "点赞成功",
+                "message": "点赞成功" if starred else "取消点赞成功",
                 "star_count": star_count,
-                "starred": True,
+                "starred": starred,
             }
         ),
         200,
@@ -343,13 +347,21 @@ def project_edit(pid):
             else:
                 flash(message, "warning")
 
+        original_port = project.port
+        port = reserve_port(form.port.data, original_port)
+        if port is None:
+            flash("端口号已被占用或没有可用端口，请重试", "danger")
+            return render_template("project/edit.html", form=form, project=project)
         updated_project = update_project(
             project,
             pname=form.pname.data,
             pinfo=form.pinfo.data,
-            port=form.port.data,
+            port=port,
             docker_port=form.docker_port.data,
         )
+        if port != original_port:
+            # 更新成功时释放旧端口，失败时释放新预留的端口
+            port_allocator.release(original_port if updated_project else port)
         if not updated_project:
             flash("更新项目失败，请重试", "danger")
             logger.error(
@@ -368,37 +380,17 @@ def project_edit(pid):
     return render_template("project/edit.html", form=form, project=project)
 
 
-@project_bp.route("/<uuid:pid>/start", methods=["POST"])
-@login_required
-@group_required_pid
-def start_docker(pid):
-    """启动Docker容器"""
+def _enqueue_start(pid, action):
+    """start / rebuild 共用：入队后立即返回，进度通过 /status 推送"""
     pid = str(pid)
     project = get_project_by_pid(pid)
-    working_dir = current_app.config.get("WORKING_DIR")
     if not project:
         return jsonify({"success": False, "message": "项目不存在"}), 404
 
-    image_name = current_app.config.get("IMAGE_NAME")
-    container_name = project.docker_name
-
-    # 需要提前配置好端口映射
-    try:
-        host_port = int(project.port) if project.port else None
-        container_port = int(project.docker_port) if project.docker_port else None
-    except Exception:
-        host_port = None
-        container_port = None
-
-    # docker config
-    CPU_COUNT = current_app.config.get("CPU_COUNT", 1)
-    MEM_LIMIT = current_app.config.get("MEM_LIMIT", "1g")
-    MEMSWAP_LIMIT = current_app.config.get("MEMSWAP_LIMIT", "1.5g")
-    PIDS_LIMIT = current_app.config.get("PIDS_LIMIT", 8)
-
-    if not host_port or not container_port:
+    params = lifecycle.start_params(project, current_app.config)
+    if params is None:
         logger.error(
-            f"启动容器失败，端口未配置: project={project.pname}, port={host_port}, container={container_port}"
+            f"启动容器失败，端口未配置: project={project.pname}, port={project.port}, container={project.docker_port}"
         )
         return (
             jsonify(
@@ -407,127 +399,88 @@ def start_docker(pid):
             400,
         )
 
-    # 如果已有正在处理的任务，直接返回启动中
-    if DOCKER_STATUS.get(pid) == "starting":
-        return (
-            jsonify({"success": True, "message": "启动中", "status": "starting"}),
-            202,
-        )
-
-    # 检查镜像是否存在
-    image_exists = _docker_image_exists(image_name)
-
-    # 检查容器是否存在
-    container_exists = _docker_container_exists(container_name)
-
-    # 启动流程可能比较耗时（build），我们使用后台线程执行并立即返回启动中状态
-    def _build_and_start():
-        try:
-            DOCKER_STATUS[pid] = "starting"
-            logger.info(f"开始启动项目容器: project={project.pname}, pid={pid}")
-
-            # 如果镜像不存在，先 build
-            if not image_exists:
-                logger.info(
-                    f"镜像不存在，开始构建: image={image_name}, project={project.pname}"
-                )
-                success = _docker_build_image(image_name, path=working_dir)
-                if not success:
-                    DOCKER_STATUS[pid] = "stopped"
-                    logger.error(
-                        f"镜像构建失败，容器启动终止: project={project.pname}, pid={pid}"
-                    )
-                    return
-
-            # 如果容器不存在，创建并运行；否则尝试启动已存在的容器
-            if not container_exists:
-                logger.info(
-                    f"容器不存在，创建并运行: container={container_name}, project={project.pname}"
-                )
-                container_id = _docker_run_container(
-                    image_name,
-                    container_name,
-                    host_port,
-                    container_port,
-                    cpu_count=CPU_COUNT,
-                    mem_limit=MEM_LIMIT,
-                    memswap_limit=MEMSWAP_LIMIT,
-                    pids_limit=PIDS_LIMIT,
-                )
-                if container_id:
-                    # persist container id to project record
-                    DOCKER_STATUS[pid] = "running"
-                    logger.info(
-                        f"容器启动成功: container={container_name}, id={container_id}, project={project.pname}"
-                    )
-                    return
-                else:
-                    DOCKER_STATUS[pid] = "stopped"
-                    logger.error(
-                        f"容器创建失败: container={container_name}, project={project.pname}"
-                    )
-                    return
-            else:
-                # 尝试启动已存在容器
-                logger.info(
-                    f"容器已存在，尝试启动: container={container_name}, project={project.pname}"
-                )
-                started = _docker_start_container(container_name)
-                if started:
-                    DOCKER_STATUS[pid] = "running"
-                    logger.info(
-                        f"已存在容器启动成功: container={container_name}, project={project.pname}"
-                    )
-                    return
-                else:
-                    DOCKER_STATUS[pid] = "stopped"
-                    logger.error(
-                        f"已存在容器启动失败: container={container_name}, project={project.pname}"
-                    )
-                    return
-        finally:
-            # 如果线程结束且状态仍为 starting，则设置为 stopped 以表示未运行
-            if DOCKER_STATUS.get(pid) == "starting":
-                DOCKER_STATUS[pid] = "stopped"
-                logger.warning(
-                    f"容器启动超时或异常终止: project={project.pname}, pid={pid}"
-                )
-
-    # 启动后台线程
-    t = threading.Thread(target=_build_and_start, daemon=True)
-    t.start()
-
+    # 同一项目同一操作只会排队一次，重复请求返回已有任务
+    job, created = lifecycle.enqueue(action, pid, params)
+    message = "启动已开始" if created else "启动中"
+    if created:
+        # 排队期间页面即显示启动中，执行者开始执行后推送具体进度
+        set_docker_status(pid, "starting", progress=0, message="等待执行")
+        logger.info(f"{action} 任务已提交: project={project.pname}, job={job['id']}")
     return (
-        jsonify({"success": True, "message": "启动已开始", "status": "starting"}),
+        jsonify(
+            {
+                "success": True,
+                "message": message,
+                "status": "starting",
+                "job": job["id"],
+            }
+        ),
         202,
     )
 
 
-@project_bp.route("/<uuid:pid>/docker/stop", methods=["POST"])
-@login_required
-@group_required_pid
-def stop_docker(pid):
-    """停止Docker容器"""
+def _run_and_wait(pid, action, done_message):
+    """stop / remove 共用：入队并在限定时间内等待结果，超时返回 202 与任务ID"""
     pid = str(pid)
     project = get_project_by_pid(pid)
     if not project:
         return jsonify({"success": False, "message": "项目不存在"}), 404
 
     container_name = project.docker_name
+    # 熔断中无法判断容器是否存在，直接失败而不是误报"容器不存在"
+    if not docker_client:
+        logger.warning(
+            f"{action} 容器失败，Docker 不可用: container={container_name}, project={project.pname}"
+        )
+        return jsonify({"success": False, "message": "Docker 暂不可用"}), 503
     if not _docker_container_exists(container_name):
         logger.warning(
-            f"停止容器失败，容器不存在: container={container_name}, project={project.pname}"
+            f"{action} 容器失败，容器不存在: container={container_name}, project={project.pname}"
         )
         return jsonify({"success": False, "message": "容器不存在"}), 404
-    stopped = _docker_stop_container(container_name)
-    if not stopped:
+
+    params = {"pname": project.pname, "container_name": container_name}
+    job, _ = lifecycle.enqueue(action, pid, params)
+    job = lifecycle.wait_for(job["id"], timeout=LIFECYCLE_WAIT_TIMEOUT) or job
+    if job["status"] == "succeeded":
+        logger.info(f"{done_message}: project={project.pname}, pid={pid}")
+        return (
+            jsonify({"success": True, "message": done_message, "status": "stopped"}),
+            200,
+        )
+    if job["status"] == "failed":
         logger.error(
-            f"停止容器失败: container={container_name}, project={project.pname}"
+            f"{action} 容器失败: container={container_name}, project={project.pname}, 错误: {job.get('error')}"
         )
-        return jsonify({"success": False, "message": "停止容器失败"}), 500
-    DOCKER_STATUS[pid] = "stopped"
-    logger.info(f"容器已停止: project={project.pname}, pid={pid}")
-    return jsonify({"success": True, "message": "容器已停止", "status": "stopped"}), 200
+        return jsonify({"success": False, "message": job.get("error")}), 500
+    return (
+        jsonify({"success": True, "message": "任务执行中", "job": job["id"]}),
+        202,
+    )
+
+
+@project_bp.route("/<uuid:pid>/start", methods=["POST"])
+@login_required
+@group_required_pid
+def start_docker(pid):
+    """启动Docker容器（后台任务，构建镜像可能比较耗时）"""
+    return _enqueue_start(pid, "start")
+
+
+@project_bp.route("/<uuid:pid>/docker/rebuild", methods=["POST"])
+@login_required
+@group_required_pid
+def rebuild_docker(pid):
+    """删除并按当前端口与资源配置重新创建Docker容器"""
+    return _enqueue_start(pid, "rebuild")
+
+
+@project_bp.route("/<uuid:pid>/docker/stop", methods=["POST"])
+@login_required
+@group_required_pid
+def stop_docker(pid):
+    """停止Docker容器"""
+    return _run_and_wait(pid, "stop", "容器已停止")
 
 
 @project_bp.route("/<uuid:pid>/docker/remove", methods=["POST"])
@@ -535,31 +488,67 @@ def stop_docker(pid):
 @group_required_pid
 def remove_docker(pid):
     """删除Docker容器"""
-    pid = str(pid)
-    project = get_project_by_pid(pid)
-    if not project:
-        return jsonify({"success": False, "message": "项目不存在"}), 404
+    return _run_and_wait(pid, "remove", "容器已删除")
 
-    container_name = project.docker_name
-    if not _docker_container_exists(container_name):
-        logger.warning(
-            f"删除容器失败，容器不存在: container={container_name}, project={project.pname}"
-        )
-        return jsonify({"success": False, "message": "容器不存在"}), 404
 
-    removed = _docker_remove_container(container_name)
-    if not removed:
-        logger.error(
-            f"删除容器失败: container={container_name}, project={project.pname}"
+@project_bp.route("/<uuid:pid>/docker/stats", methods=["GET"])
+@login_required
+def project_docker_stats(pid):
+    """项目容器的资源用量时间序列（resolution: 1m | 5m | 1h），用于详情页迷你图"""
+    data = container_stats.series(str(pid), request.args.get("resolution", "1m"))
+    if data is None:
+        return jsonify({"success": False, "message": "resolution 无效"}), 400
+    return jsonify({"success": True, **data}), 200
+
+
+@project_bp.route("/<uuid:pid>/docker/jobs/<job_id>", methods=["GET"])
+@login_required
+@group_required_pid
+def docker_job(pid, job_id):
+    """查询生命周期任务状态"""
+    job = lifecycle.get_job(job_id)
+    if not job or job["pid"] != str(pid):
+        return jsonify({"success": False, "message": "任务不存在"}), 404
+    job.pop("params", None)
+    return jsonify({"success": True, "job": job}), 200
+
+
+# 单次批量查询的项目数上限
+MAX_BULK_STATUS = 200
+
+
+@project_bp.route("/docker/status", methods=["GET"])
+def project_docker_status_bulk():
+    """
+    批量返回项目 docker 状态，参数 pids 为逗号分隔的项目ID。
+
+    先读共享状态缓存；未命中且事件监听未运行时，用一次数据库查询和一次
+    Docker 列表调用补齐。
+    """
+    pids = []
+    for value in request.args.get("pids", "").split(","):
+        try:
+            pids.append(str(uuid.UUID(value.strip())))
+        except ValueError:
+            continue
+    pids = list(dict.fromkeys(pids))
+    if len(pids) > MAX_BULK_STATUS:
+        return (
+            jsonify({"success": False, "message": f"一次最多查询 {MAX_BULK_STATUS} 个"}),
+            400,
         )
-        return jsonify({"success": False, "message": "删除容器失败"}), 500
 
-    # 清除内存状态
-    DOCKER_STATUS.pop(pid, None)
-    logger.info(
-        f"容器已删除: project={project.pname}, pid={pid}, container={container_name}"
-    )
-    return jsonify({"success": True, "message": "容器已删除", "status": "stopped"}), 200
+    cached = DOCKER_STATUS.get_many(pids) if pids else {}
+    statuses = {pid: cached[pid] for pid in pids if cached.get(pid)}
+    missing = [pid for pid in pids if pid not in statuses]
+    if missing and not docker_watcher.is_active():
+        names = get_project_docker_names(missing)
+        containers = _docker_containers_status(list(names)) or {}
+        for name, pid in names.items():
+            statuses[pid] = containers.get(name, "stopped")
+    for pid in missing:
+        statuses.setdefault(pid, "stopped")
+    return jsonify({"success": True, "statuses": statuses}), 200
 
 
 @project_bp.route("/<uuid:pid>/docker/status", methods=["GET"])
@@ -570,20 +559,29 @@ def project_docker_status(pid):
     if not project:
         return jsonify({"success": False, "message": "项目不存在"}), 404
 
-    # 首先检查内存状态
+    # 状态由 Docker 事件监听维护，读取缓存即可
     status = DOCKER_STATUS.get(pid)
     if status:
-        return jsonify({"success": True, "status": status}), 200
-
-    # 如果没有内存标记，检测容器实际状态
-    container_name = project.docker_name
-    if _docker_container_exists(container_name):
-        st = _docker_container_status(container_name)
-        mapped = "running" if st == "running" else "stopped"
-        return jsonify({"success": True, "status": mapped}), 200
-
-    # 默认视为已停止
-    return jsonify({"success": True, "status": "stopped"}), 200
+        detail = docker_events.get(pid) or {}
+        return (
+            jsonify(
+                {
+                    "success": True,
+                    "status": status,
+                    "updated_at": detail.get("time"),
+                    "health": detail.get("health"),
+                }
+            ),
+            200,
+        )
+    if docker_watcher.is_active():
+        # 监听已完成校正，缓存中没有记录说明项目从未创建容器
+        return jsonify({"success": True, "status": "stopped"}), 200
+
+    # 监听未运行（Docker 或 Redis 不可用）时直接检测容器实际状态；
+    # Docker 熔断期间返回最后已知状态，容器不存在时视为已停止
+    status = _docker_container_status(project.docker_name)
+    return jsonify({"success": True, "status": status}), 200
 
 
 # TODO: iframe 或者别的实现方法
@@ -0,0 +1,87 @@
+"""
+项目容器状态推送（Socket.IO /status 命名空间）
+
+项目详情页连接后发送 subscribe 加入 project:<pid> 房间，服务端在状态变化时推送
+status 事件，取代原来的每 3 秒轮询:
+
+    {"pid", "status", "progress", "message", "time", ...}
+
+status 取值: starting | building | running | stopped | failed。building 与 failed
+只出现在推送中；docker_status 中保存的仍是 starting / running / stopped，
+HTTP 接口 /project/<pid>/docker/status 保持不变，作为推送不可用时的回退。
+"""
+
+from flask import request
+from flask_socketio import join_room, leave_room
+from utils.redis_client import docker_status as DOCKER_STATUS
+import logging
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+STATUS_NAMESPACE = "/status"
+
+_socketio = None
+
+
+def _room(pid):
+    return f"project:{pid}"
+
+
+def _parse_pid(data):
+    """校验客户端传入的项目 ID，非法时返回 None"""
+    try:
+        return str(uuid.UUID(str((data or {}).get("pid"))))
+    except (ValueError, TypeError, AttributeError):
+        return None
+
+
+def publish_status(pid, status, progress=None, message=None, **extra):
+    """
+    向订阅该项目的客户端推送状态变化（可在后台线程中调用）。
+
+    参数:
+        pid (str): 项目ID。
+        status (str): starting | building | running | stopped | failed。
+        progress (int): 启动进度百分比，可选。
+        message (str): 提示信息，可选。
+        extra: 附加字段（如 exit_code、health）。
+    """
+    if _socketio is None:
+        return
+    payload = {
+        "pid": str(pid),
+        "status": status,
+        "progress": progress,
+        "message": message,
+        "time": time.time(),
+        **extra,
+    }
+    try:
+        _socketio.emit("status", payload, namespace=STATUS_NAMESPACE, to=_room(pid))
+    except Exception as e:
+        logger.warning(f"推送项目状态失败: pid={pid}, 错误: {e}")
+
+
+def init_status_socketio(socketio_instance):
+    """初始化 /status WebSocket 事件处理器"""
+    global _socketio
+    _socketio = socketio_instance
+
+    @socketio_instance.on("subscribe", namespace=STATUS_NAMESPACE)
+    def handle_subscribe(data):
+        """加入项目房间，并通过 ack 返回当前缓存的状态（未缓存时为 None）"""
+        pid = _parse_pid(data)
+        if pid is None:
+            return {"success": False, "message": "项目ID无效"}
+        join_room(_room(pid))
+        logger.debug(f"状态订阅: sid={request.sid}, pid={pid}")
+        # 只读缓存，不访问数据库或 Docker；未命中时客户端回退到 HTTP 接口
+        return {"success": True, "pid": pid, "status": DOCKER_STATUS.get(pid)}
+
+    @socketio_instance.on("unsubscribe", namespace=STATUS_NAMESPACE)
+    def handle_unsubscribe(data):
+        pid = _parse_pid(data)
+        if pid is not None:
+            leave_room(_room(pid))
@@ -12,9 +12,12 @@ from database.actions import *
 from blueprints.project import group_required_pid
 from utils.redis_client import terminal_sessions as TERMINAL_SESSIONS_REDIS
 from utils.docker_client import docker_client, _upload_to_container
+from utils import activity, hibernation
+from utils.worker_channel import worker_channel, worker_id
 import logging
 import docker
 import threading
+import time
 import gzip
 import io
 import os
@@ -27,8 +30,72 @@ logger = logging.getLogger(__name__)
 _LOCAL_SESSION_OBJECTS = {}
 
 
+def _write_local(sid: str, text: str) -> bool:
+    """写入本 worker 持有的 exec socket，会话不在本 worker 时返回 False"""
+    local_objs = _LOCAL_SESSION_OBJECTS.get(sid)
+    sock = local_objs.get("socket") if local_objs else None
+    if not sock:
+        return False
+    input_bytes = text.encode("utf-8")
+    try:
+        if hasattr(sock, "_sock"):
+            # Unix socket (Linux/Mac)
+            sock._sock.sendall(input_bytes)
+        else:
+            # Windows named pipe socket
+            sock.sendall(input_bytes)
+    except AttributeError:
+        # 备用方案：直接使用 socket 的 send 方法
+        sock.send(input_bytes)
+    activity.touch(local_objs["pid"], "terminal")
+    logger.debug(f"输入已发送: {len(input_bytes)} 字节, sid={sid}")
+    return True
+
+
+def _resize_local(sid: str, exec_id: str, rows: int, cols: int) -> bool:
+    """调整本 worker 持有的 exec 终端大小，会话不在本 worker 时返回 False"""
+    local_objs = _LOCAL_SESSION_OBJECTS.get(sid)
+    container = local_objs.get("container") if local_objs else None
+    if not container or not exec_id:
+        return False
+    container.client.api.exec_resize(exec_id, height=rows, width=cols)
+    logger.debug(f"终端大小已调整: rows={rows}, cols={cols}, sid={sid}")
+    return True
+
+
+def _close_local(sid: str) -> None:
+    """关闭并移除本 worker 持有的 exec socket"""
+    local_objs = _LOCAL_SESSION_OBJECTS.pop(sid, None)
+    sock = local_objs.get("socket") if local_objs else None
+    if not sock:
+        return
+    try:
+        if hasattr(sock, "_sock"):
+            sock._sock.close()
+        if hasattr(sock, "close"):
+            sock.close()
+        logger.info(f"Socket 已关闭: sid={sid}")
+    except Exception as close_error:
+        logger.warning(f"关闭 socket 时出错（可忽略）: {close_error}")
+
+
+def _forward(sid: str, op: str, session_info=None, **payload) -> bool:
+    """
+    会话的 exec socket 在其他 worker 上时，经 Redis 把操作转发给持有者。
+
+    返回:
+        bool: 是否已转发（持有者不存在或已退出时为 False）。
+    """
+    if session_info is None:
+        session_info = TERMINAL_SESSIONS_REDIS.get(sid)
+    owner = (session_info or {}).get("owner")
+    if not owner or owner == worker_id():
+        return False
+    return worker_channel.send(owner, op, {"sid": sid, **payload})
+
+
 def _get_container_by_project(pid: str):
-    """根据项目 ID 获取运行中的容器"""
+    """根据项目 ID 获取运行中的容器，容器处于空闲休眠时先恢复"""
     project = get_project_by_pid(pid)
     if not project:
         logger.warning(f"项目 {pid} 不存在，无法获取容器")
@@ -38,6 +105,10 @@ def _get_container_by_project(pid: str):
         return None
     try:
         container = docker_client.containers.get(project.docker_name)
+        if container.status != "running" and hibernation.resume(
+            project, current_app.config
+        ):
+            container.reload()
         if container.status == "running":
             logger.debug(f"成功获取项目 {pid} 的容器: {container.id}")
             return container
@@ -160,6 +231,7 @@ def upload_file(pid):
         )
 
         if success:
+            activity.touch(pid, "upload")
             logger.info(
                 f"用户 {current_user.uname} 上传文件到项目 {pid}: {relative_path} -> {final_target}/{filename}"
             )
@@ -198,18 +270,11 @@ def init_terminal_socketio(socketio_instance):
 
         if session_info or local_objs:
             try:
-                # 发送 exit 命令让 bash 优雅退出
-                if local_objs and local_objs.get("socket"):
-                    sock = local_objs["socket"]
-
-                    try:
-                        if hasattr(sock, "_sock"):
-                            sock._sock.close()
-                        if hasattr(sock, "close"):
-                            sock.close()
-                        logger.info(f"Socket 已关闭: sid={request.sid}")
-                    except Exception as close_error:
-                        logger.warning(f"关闭 socket 时出错（可忽略）: {close_error}")
+                # 关闭 exec socket；socket 在其他 worker 上时通知持有者关闭
+                if local_objs:
+                    _close_local(request.sid)
+                else:
+                    _forward(request.sid, "terminal.close", session_info)
 
                 if session_info:
                     logger.info(
@@ -271,8 +336,15 @@ def init_terminal_socketio(socketio_instance):
             emit("error", {"message": "Docker 客户端未初始化"})
             return
 
+        # 订阅本 worker 的转发频道，落到其他 worker 的输入会经 Redis 转发过来
+        worker_channel.ensure_running()
+
         try:
             container = docker_client.containers.get(container_name)
+            if container.status != "running" and hibernation.resume(
+                project, current_app.config
+            ):
+                container.reload()
             if container.status != "running":
                 emit("error", {"message": "容器未运行"})
                 return
@@ -314,6 +386,7 @@ def init_terminal_socketio(socketio_instance):
                     "session_marker": session_marker,
                     "container_id": container.id,
                     "container_name": container.name,
+                    "owner": worker_id(),  # 持有 exec socket 的 worker
                 },
             )
 
@@ -321,7 +394,9 @@ def init_terminal_socketio(socketio_instance):
             _LOCAL_SESSION_OBJECTS[current_sid] = {
                 "socket": exec_socket,
                 "container": container,
+                "pid": str(pid),
             }
+            activity.touch(pid, "terminal", at=time.time())
 
             # 启动后台线程读取容器输出
             def read_output():
@@ -414,63 +489,67 @@ def init_terminal_socketio(socketio_instance):
     @socketio_instance.on("input", namespace="/terminal")
     def handle_input(data):
         """处理用户输入"""
-        local_objs = _LOCAL_SESSION_OBJECTS.get(request.sid)
-
-        if not local_objs:
-            logger.warning(f"Shell 会话不存在: sid={request.sid}")
-            emit("error", {"message": "Shell 会话不存在"})
-            return
-
-        sock = local_objs.get("socket")
-
-        if not sock:
-            logger.warning(f"Socket 不存在: sid={request.sid}")
-            emit("error", {"message": "Socket 不存在"})
-            return
-
+        input_data = data.get("data", "")
+        logger.debug(f"收到输入: {repr(input_data)[:50]}, sid={request.sid}")
         try:
-            input_data = data.get("data", "")
-            logger.debug(f"收到输入: {repr(input_data)[:50]}, sid={request.sid}")
-
-            # 写入到容器的 stdin
-            input_bytes = input_data.encode("utf-8")
-
-            try:
-                if hasattr(sock, "_sock"):
-                    # Unix socket (Linux/Mac)
-                    sock._sock.sendall(input_bytes)
-                else:
-                    # Windows named pipe socket
-                    sock.sendall(input_bytes)
-            except AttributeError:
-                # 备用方案：直接使用 socket 的 send 方法
-                sock.send(input_bytes)
-
-            logger.debug(f"输入已发送: {len(input_bytes)} 字节, sid={request.sid}")
+            # 写入到容器的 stdin；会话在其他 worker 上时转发给持有者
+            if _write_local(request.sid, input_data):
+                return
+            if _forward(request.sid, "terminal.input", data=input_data):
+                return
         except Exception as e:
             logger.error(f"发送输入到容器失败: {e}", exc_info=True)
             emit("error", {"message": f"发送输入失败: {str(e)}"})
+            return
+        logger.warning(f"Shell 会话不存在: sid={request.sid}")
+        emit("error", {"message": "Shell 会话不存在"})
 
     @socketio_instance.on("resize", namespace="/terminal")
     def handle_resize(data):
         """调整终端大小"""
         session_info = TERMINAL_SESSIONS_REDIS.get(request.sid)
-        local_objs = _LOCAL_SESSION_OBJECTS.get(request.sid)
-
-        if not session_info or not local_objs:
+        if not session_info:
             return
 
         try:
             rows = int(data.get("rows", 24))
             cols = int(data.get("cols", 80))
             exec_id = session_info.get("exec_id")
-            container = local_objs.get("container")
 
             # 调用 Docker API 调整终端大小
-            if container and exec_id:
-                container.client.api.exec_resize(exec_id, height=rows, width=cols)
-                logger.debug(
-                    f"终端大小已调整: rows={rows}, cols={cols}, sid={request.sid}"
+            if not _resize_local(request.sid, exec_id, rows, cols):
+                _forward(
+                    request.sid, "terminal.resize", session_info, rows=rows, cols=cols
                 )
         except Exception as e:
             logger.error(f"调整终端大小失败: {e}", exc_info=True)
+
+    # ------------------------------------------------------------------------------
+    # 其他 worker 转发过来的操作（在转发频道的订阅线程中执行）
+    # ------------------------------------------------------------------------------
+    def _forwarded_input(payload):
+        sid = payload.get("sid")
+        try:
+            if _write_local(sid, payload.get("data", "")):
+                return
+            message = "Shell 会话不存在"
+        except Exception as e:
+            logger.error(f"发送转发的输入到容器失败: {e}", exc_info=True)
+            message = f"发送输入失败: {str(e)}"
+        socketio_instance.emit(
+            "error", {"message": message}, namespace="/terminal", room=sid
+        )
+
+    def _forwarded_resize(payload):
+        sid = payload.get("sid")
+        session_info = TERMINAL_SESSIONS_REDIS.get(sid) or {}
+        _resize_local(
+            sid,
+            session_info.get("exec_id"),
+            int(payload.get("rows", 24)),
+            int(payload.get("cols", 80)),
+        )
+
+    worker_channel.on("terminal.input", _forwarded_input)
+    worker_channel.on("terminal.resize", _forwarded_resize)
+    worker_channel.on("terminal.close", lambda payload: _close_local(payload.get("sid")))
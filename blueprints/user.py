@@ -75,7 +75,7 @@ class UserForm(FlaskForm):
 def user_detail(uid):
     """用户详情页面"""
     uid = str(uid)
-    user = get_user_by_uid(uid)
+    user = get_user_with_group_by_uid(uid)
     if not user:
         abort(404, description="用户不存在")
     return render_template("user/detail.html", user=user)
@@ -1,6 +1,15 @@
 from .base import db
 from .models import User, Project, Group, GroupApplication, ProjectStar, ProjectComment
-from sqlalchemy import select
+from .routing import read_only
+from utils.markdown_renderer import render_markdown
+from sqlalchemy import select, func, update, delete, or_, and_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload, joinedload, contains_eager, with_expression
+from flask import g, has_request_context
+from datetime import datetime
+from functools import wraps
+import base64
+import json
 import logging
 
 
@@ -8,6 +17,49 @@ import logging
 logger = logging.getLogger(__name__)
 
 
+# -------------------------------------------------------------------------------------------
+# 请求级主键缓存
+# -------------------------------------------------------------------------------------------
+def _request_cache():
+    """当前请求的主键查询缓存，不在请求上下文中时返回 None"""
+    if not has_request_context():
+        return None
+    if "_pk_cache" not in g:
+        g._pk_cache = {}
+    return g._pk_cache
+
+
+def _clear_request_cache():
+    """提交或删除后清空缓存，避免后续读取到过期对象"""
+    if has_request_context():
+        g.pop("_pk_cache", None)
+
+
+def _request_cached(model):
+    """
+    主键查询的请求级缓存：同一请求内装饰器与视图按相同主键查询时只访问一次数据库。
+    只缓存查到的对象，未找到时不缓存。
+    """
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(key):
+            cache = _request_cache()
+            if cache is None:
+                return func(key)
+            cache_key = (model.__name__, str(key))
+            if cache_key not in cache:
+                instance = func(key)
+                if instance is None:
+                    return None
+                cache[cache_key] = instance
+            return cache[cache_key]
+
+        return wrapper
+
+    return decorator
+
+
 # -------------------------------------------------------------------------------------------
 # 基础数据库工具函数
 # -------------------------------------------------------------------------------------------
@@ -18,6 +70,7 @@ def safe_commit():
     返回:
         bool: 提交是否成功。
     """
+    _clear_request_cache()
     try:
         db.session.commit()
         return True
@@ -58,6 +111,7 @@ def safe_delete(instance):
     返回:
         bool: 删除并提交是否成功。
     """
+    _clear_request_cache()
     try:
         db.session.delete(instance)
         return safe_commit()
@@ -69,6 +123,92 @@ def safe_delete(instance):
         return False
 
 
+def _prerender_markdown(*texts):
+    """在写入时预先渲染 Markdown 字段，详情页首次访问即可命中缓存"""
+    for text in texts:
+        try:
+            render_markdown(text)
+        except Exception as e:
+            logger.warning(f"预渲染 Markdown 失败: {e}")
+
+
+# -------------------------------------------------------------------------------------------
+# 游标分页工具函数
+# -------------------------------------------------------------------------------------------
+def encode_cursor(instance):
+    """
+    根据记录的 (created_at, 主键) 生成不透明的分页游标。
+
+    参数:
+        instance: 带有 created_at 字段的模型实例（通常是上一页的最后一条）。
+
+    返回:
+        str: URL 安全的游标字符串。
+    """
+    key = instance.__mapper__.primary_key_from_instance(instance)[0]
+    payload = json.dumps([instance.created_at.isoformat(), key])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """
+    解析分页游标。
+
+    参数:
+        cursor (str): encode_cursor 生成的游标。
+
+    返回:
+        tuple: (created_at, 主键)。
+
+    异常:
+        ValueError: 游标格式错误。
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, key = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created_at), str(key)
+    except Exception as e:
+        raise ValueError(f"无效的分页游标: {cursor}") from e
+
+
+def _paginate(stmt, model, limit=None, after=None):
+    """按 (created_at, 主键) 排序，并追加 keyset 过滤条件与条数限制"""
+    key_column = model.__mapper__.primary_key[0]
+    stmt = stmt.order_by(model.created_at, key_column)
+    if after:
+        created_at, key = decode_cursor(after)
+        stmt = stmt.where(
+            or_(
+                model.created_at > created_at,
+                and_(model.created_at == created_at, key_column > key),
+            )
+        )
+    if limit:
+        stmt = stmt.limit(limit)
+    return stmt
+
+
+@read_only
+def get_system_stats():
+    """
+    统计用户、工作组和项目总数（管理员仪表盘使用）。
+
+    返回:
+        dict: {"users": int, "groups": int, "projects": int}。
+    """
+    try:
+        return {
+            "users": db.session.execute(select(func.count(User.uid))).scalar() or 0,
+            "groups": db.session.execute(select(func.count(Group.gid))).scalar()
+            or 0,
+            "projects": db.session.execute(select(func.count(Project.pid))).scalar()
+            or 0,
+        }
+    except Exception as e:
+        logger.error(f"get_system_stats Failed: {e}", exc_info=True)
+        return {"users": 0, "groups": 0, "projects": 0}
+
+
 # -------------------------------------------------------------------------------------------
 # User CRUD 操作
 # -------------------------------------------------------------------------------------------
@@ -134,7 +274,10 @@ def update_user(user, **kwargs):
                     user.set_password(value)
                 elif key != "uid":  # 不允许修改ID
                     setattr(user, key, value)
-        return safe_commit()
+        if not safe_commit():
+            return False
+        _prerender_markdown(kwargs.get("uinfo"))
+        return True
     except Exception as e:
         logger.error(
             f"更新用户失败: uid={user.uid}, uname={getattr(user, 'uname', 'unknown')}",
@@ -168,20 +311,50 @@ def delete_user(user):
         return False
 
 
-def list_all_users():
+@read_only
+def list_all_users(limit=None, after=None):
     """
-    列出所有用户。
+    按 (created_at, uid) 顺序列出用户，支持游标分页。
+
+    参数:
+        limit (int): 每页条数，为 None 时返回全部。
+        after (str): 上一页最后一条记录的游标。
 
     返回:
-        list: 所有用户对象列表。
+        list: 用户对象列表。
     """
     try:
-        return db.session.execute(select(User)).scalars().all()
+        return (
+            db.session.execute(_paginate(select(User), User, limit, after))
+            .scalars()
+            .all()
+        )
     except Exception as e:
         logger.error(f"list_all_users Failed: {e}", exc_info=True)
         return []
 
 
+@read_only
+def get_user_with_group_by_uid(uid):
+    """
+    根据用户ID获取用户，并一次性加载所属工作组（用户详情页使用）。
+
+    参数:
+        uid (str): 用户ID。
+
+    返回:
+        User: 匹配的用户对象，未找到则返回None。
+    """
+    try:
+        return db.session.execute(
+            select(User).options(joinedload(User.group)).where(User.uid == uid)
+        ).scalar_one_or_none()
+    except Exception as e:
+        logger.error(f"get_user_with_group_by_uid Failed: {e}", exc_info=True)
+        return None
+
+
+@read_only
 def get_user_by_uname(uname):
     """
     根据用户名获取用户。
@@ -201,6 +374,7 @@ def get_user_by_uname(uname):
         return None
 
 
+@read_only
 def get_user_by_email(email):
     """
     根据邮箱获取用户。
@@ -220,6 +394,8 @@ def get_user_by_email(email):
         return None
 
 
+@_request_cached(User)
+@read_only
 def get_user_by_uid(uid):
     """
     根据用户ID获取用户。
@@ -239,6 +415,7 @@ def get_user_by_uid(uid):
         return None
 
 
+@read_only
 def get_user_by_sid(sid):
     """
     根据学号获取用户。
@@ -303,7 +480,10 @@ def update_group(group, **kwargs):
             if hasattr(group, key):
                 if key != "gid":  # 不允许修改ID
                     setattr(group, key, value)
-        return safe_commit()
+        if not safe_commit():
+            return False
+        _prerender_markdown(kwargs.get("ginfo"))
+        return True
     except Exception as e:
         logger.error(
             f"更新工作组失败: gid={group.gid}, gname={getattr(group, 'gname', 'unknown')}",
@@ -337,20 +517,97 @@ def delete_group(group):
         return False
 
 
-def list_all_groups():
+@read_only
+def list_all_groups(limit=None, after=None):
     """
-    列出所有工作组。
+    按 (created_at, gid) 顺序列出工作组，支持游标分页。
+
+    参数:
+        limit (int): 每页条数，为 None 时返回全部。
+        after (str): 上一页最后一条记录的游标。
 
     返回:
-        list: 所有工作组对象列表。
+        list: 工作组对象列表。
     """
     try:
-        return db.session.execute(select(Group)).scalars().all()
+        return (
+            db.session.execute(_paginate(select(Group), Group, limit, after))
+            .scalars()
+            .all()
+        )
     except Exception as e:
         logger.error(f"list_all_groups Failed: {e}", exc_info=True)
         return []
 
 
+def _group_project_count_expr():
+    """工作组项目数的关联 COUNT 子查询"""
+    return (
+        select(func.count(Project.pid))
+        .where(Project.gid == Group.gid)
+        .correlate(Group)
+        .scalar_subquery()
+    )
+
+
+@read_only
+def list_all_groups_with_stats(load_projects=False, limit=None, after=None):
+    """
+    列出工作组，并预加载列表页所需的成员与项目数，支持游标分页。
+
+    查询次数与工作组数量无关：工作组 + 项目数子查询一次，成员一次，
+    load_projects 为 True 时项目再一次。
+
+    参数:
+        load_projects (bool): 是否同时加载项目对象（API 需要项目名称）。
+        limit (int): 每页条数，为 None 时返回全部。
+        after (str): 上一页最后一条记录的游标。
+
+    返回:
+        list: 工作组对象列表，group.project_count 已填充。
+    """
+    try:
+        options = [
+            selectinload(Group.users),
+            with_expression(Group.project_count, _group_project_count_expr()),
+        ]
+        if load_projects:
+            options.append(selectinload(Group.projects))
+        stmt = _paginate(select(Group).options(*options), Group, limit, after)
+        return db.session.execute(stmt).scalars().all()
+    except Exception as e:
+        logger.error(f"list_all_groups_with_stats Failed: {e}", exc_info=True)
+        return []
+
+
+@read_only
+def get_group_with_members_by_gid(gid):
+    """
+    根据工作组ID获取工作组，并预加载成员和项目（工作组详情页使用）。
+
+    参数:
+        gid (str): 工作组ID。
+
+    返回:
+        Group: 匹配的工作组对象，未找到则返回None。
+    """
+    try:
+        return db.session.execute(
+            select(Group)
+            .options(
+                selectinload(Group.users),
+                selectinload(Group.projects),
+                with_expression(Group.project_count, _group_project_count_expr()),
+            )
+            .where(Group.gid == gid)
+        ).scalar_one_or_none()
+    except Exception as e:
+        logger.error(f"get_group_with_members_by_gid Failed: {e}", exc_info=True)
+        return None
+
+
+@_request_cached(Group)
+@read_only
 def get_group_by_gid(gid):
     """
     根据工作组ID获取工作组。
@@ -419,7 +676,10 @@ def update_project(project, **kwargs):
             if hasattr(project, key):
                 if key != "pid":  # 不允许修改ID
                     setattr(project, key, value)
-        return safe_commit()
+        if not safe_commit():
+            return False
+        _prerender_markdown(kwargs.get("pinfo"))
+        return True
     except Exception as e:
         logger.error(f"更新项目 {project.pid} 失败: {e}", exc_info=True)
         db.session.rollback()
@@ -446,20 +706,75 @@ def delete_project(project):
         return False
 
 
-def list_all_projects():
+@read_only
+def list_all_projects(limit=None, after=None):
     """
-    列出所有项目。
+    按 (created_at, pid) 顺序列出项目，支持游标分页。
+
+    参数:
+        limit (int): 每页条数，为 None 时返回全部。
+        after (str): 上一页最后一条记录的游标。
 
     返回:
-        list: 所有项目对象列表。
+        list: 项目对象列表。
     """
     try:
-        return db.session.execute(select(Project)).scalars().all()
+        return (
+            db.session.execute(_paginate(select(Project), Project, limit, after))
+            .scalars()
+            .all()
+        )
     except Exception as e:
         logger.error(f"list_all_projects Failed: {e}", exc_info=True)
         return []
 
 
+@read_only
+def list_all_projects_with_stats(limit=None, after=None):
+    """
+    列出项目，并在同一条查询中加载所属工作组（点赞数为冗余列，随行读取），支持游标分页。
+
+    参数:
+        limit (int): 每页条数，为 None 时返回全部。
+        after (str): 上一页最后一条记录的游标。
+
+    返回:
+        list: 项目对象列表，project.group 已加载。
+    """
+    try:
+        stmt = _paginate(
+            select(Project).options(joinedload(Project.group)), Project, limit, after
+        )
+        return db.session.execute(stmt).scalars().all()
+    except Exception as e:
+        logger.error(f"list_all_projects_with_stats Failed: {e}", exc_info=True)
+        return []
+
+
+@read_only
+def get_project_with_stats_by_pid(pid):
+    """
+    根据项目ID获取项目，并在同一条查询中加载所属工作组（项目详情页使用）。
+
+    参数:
+        pid (str): 项目ID。
+
+    返回:
+        Project: 匹配的项目对象，未找到则返回None。
+    """
+    try:
+        return db.session.execute(
+            select(Project)
+            .options(joinedload(Project.group))
+            .where(Project.pid == pid)
+        ).scalar_one_or_none()
+    except Exception as e:
+        logger.error(f"get_project_with_stats_by_pid Failed: {e}", exc_info=True)
+        return None
+
+
+@_request_cached(Project)
+@read_only
 def get_project_by_pid(pid):
     """
     根据项目ID获取项目。
@@ -479,6 +794,7 @@ def get_project_by_pid(pid):
         return None
 
 
+@read_only
 def get_projects_by_port(port):
     """
     根据端口获取项目列表。
@@ -498,6 +814,26 @@ def get_projects_by_port(port):
         return None
 
 
+@read_only
+def get_project_ports():
+    """
+    获取所有已分配的项目端口（端口位图初始化使用）。
+
+    返回:
+        list: 端口号列表。
+    """
+    try:
+        return (
+            db.session.execute(select(Project.port).where(Project.port.is_not(None)))
+            .scalars()
+            .all()
+        )
+    except Exception as e:
+        logger.error(f"get_project_ports Failed: {e}", exc_info=True)
+        return []
+
+
+@read_only
 def get_projects_by_docker_port(docker_port):
     """
     根据Docker映射端口获取项目列表。
@@ -517,6 +853,7 @@ def get_projects_by_docker_port(docker_port):
         return None
 
 
+@read_only
 def get_projects_by_user(user):
     """
     根据用户获取项目列表。
@@ -538,6 +875,73 @@ def get_projects_by_user(user):
         return []
 
 
+@read_only
+def get_project_docker_names(pids=None):
+    """
+    获取项目的容器名到项目ID的映射（Docker 事件监听与批量状态查询使用）。
+
+    参数:
+        pids (list): 只查询这些项目，为 None 时返回全部项目。
+
+    返回:
+        dict: {docker_name: pid}。
+    """
+    try:
+        stmt = select(Project.docker_name, Project.pid)
+        if pids is not None:
+            if not pids:
+                return {}
+            stmt = stmt.where(Project.pid.in_(pids))
+        rows = db.session.execute(stmt).all()
+        return {name: str(pid) for name, pid in rows if name}
+    except Exception as e:
+        logger.error(f"get_project_docker_names Failed: {e}", exc_info=True)
+        return {}
+
+
+@read_only
+def get_project_idle_timeouts():
+    """
+    获取每个项目的容器名与所在工作组的空闲休眠阈值（空闲休眠检查使用）。
+
+    返回:
+        dict: {pid: (docker_name, idle_timeout)}，idle_timeout 为分钟数或 None。
+    """
+    try:
+        rows = db.session.execute(
+            select(Project.pid, Project.docker_name, Group.idle_timeout).join(
+                Group, Project.gid == Group.gid
+            )
+        ).all()
+        return {str(pid): (name, timeout) for pid, name, timeout in rows if name}
+    except Exception as e:
+        logger.error(f"get_project_idle_timeouts Failed: {e}", exc_info=True)
+        return {}
+
+
+@read_only
+def get_startable_projects():
+    """
+    获取已配置项目端口与容器端口的项目（容器预热池使用），按创建时间倒序。
+
+    返回:
+        list: 项目对象列表。
+    """
+    try:
+        return (
+            db.session.execute(
+                select(Project)
+                .where(Project.port.is_not(None), Project.docker_port.is_not(None))
+                .order_by(Project.created_at.desc())
+            )
+            .scalars()
+            .all()
+        )
+    except Exception as e:
+        logger.error(f"get_startable_projects Failed: {e}", exc_info=True)
+        return []
+
+
 # -------------------------------------------------------------------------------------------
 # GroupApplication CRUD 操作
 # -------------------------------------------------------------------------------------------
@@ -618,6 +1022,8 @@ def delete_group_application(application):
         return False
 
 
+@_request_cached(GroupApplication)
+@read_only
 def get_application_by_gaid(gaid):
     """
     根据申请ID获取申请。
@@ -637,6 +1043,7 @@ def get_application_by_gaid(gaid):
         return None
 
 
+@read_only
 def get_pending_application(uid, gid):
     """
     获取用户对某工作组的待审核申请。
@@ -661,6 +1068,7 @@ def get_pending_application(uid, gid):
         return None
 
 
+@read_only
 def get_group_pending_applications(gid):
     """
     获取某工作组的所有待审核申请。
@@ -674,9 +1082,9 @@ def get_group_pending_applications(gid):
     try:
         return (
             db.session.execute(
-                select(GroupApplication).where(
-                    GroupApplication.gid == gid, GroupApplication.status == 0
-                )
+                select(GroupApplication)
+                .options(joinedload(GroupApplication.user))
+                .where(GroupApplication.gid == gid, GroupApplication.status == 0)
             )
             .scalars()
             .all()
@@ -686,6 +1094,7 @@ def get_group_pending_applications(gid):
         return []
 
 
+@read_only
 def get_user_applications(uid):
     """
     获取用户的所有申请。
@@ -724,7 +1133,13 @@ def create_project_star(uid, pid):
     """
     try:
         project_star = ProjectStar(uid=uid, pid=pid)
-        if safe_add(project_star):
+        db.session.add(project_star)
+        db.session.execute(
+            update(Project)
+            .where(Project.pid == pid)
+            .values(star_count=Project.star_count + 1)
+        )
+        if safe_commit():
             logger.info(f"项目点赞记录创建成功, 用户ID: {uid}, 项目ID: {pid}")
             return project_star
         return None
@@ -748,18 +1163,111 @@ def delete_project_star(project_star):
         logger.warning("delete_project_star Failed: 点赞对象为 None")
         return False
     try:
+        pid = project_star.pid
         db.session.delete(project_star)
-        db.session.commit()
-        return True
+        db.session.execute(
+            update(Project)
+            .where(Project.pid == pid)
+            .values(star_count=Project.star_count - 1)
+        )
+        return safe_commit()
     except Exception as e:
         logger.error(f"删除项目点赞记录失败: {e}", exc_info=True)
         db.session.rollback()
         return False
 
 
+def toggle_project_star(uid, pid):
+    """
+    切换用户对项目的点赞状态，点赞记录与计数器在同一事务内更新。
+
+    先尝试删除已有点赞，未删除到任何行时再插入；并发重复点赞由
+    (uid, pid) 唯一约束拦截，此时视为已点赞。
+
+    参数:
+        uid (str): 用户ID。
+        pid (str): 项目ID。
+
+    返回:
+        tuple: (是否已点赞, 最新点赞数)，失败则返回None。
+    """
+    try:
+        deleted = db.session.execute(
+            delete(ProjectStar)
+            .where(ProjectStar.uid == uid, ProjectStar.pid == pid)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if deleted:
+            delta = -deleted
+            starred = False
+        else:
+            db.session.add(ProjectStar(uid=uid, pid=pid))
+            db.session.flush()
+            delta = 1
+            starred = True
+        db.session.execute(
+            update(Project)
+            .where(Project.pid == pid)
+            .values(star_count=Project.star_count + delta)
+            .execution_options(synchronize_session=False)
+        )
+        star_count = db.session.execute(
+            select(Project.star_count).where(Project.pid == pid)
+        ).scalar()
+        _clear_request_cache()
+        db.session.commit()
+        logger.debug(f"切换点赞: uid={uid}, pid={pid}, starred={starred}")
+        return starred, star_count or 0
+    except IntegrityError:
+        # 并发请求已插入同一点赞记录
+        db.session.rollback()
+        logger.debug(f"并发点赞已存在: uid={uid}, pid={pid}")
+        star_count = db.session.execute(
+            select(Project.star_count).where(Project.pid == pid)
+        ).scalar()
+        return True, star_count or 0
+    except Exception as e:
+        logger.error(f"切换点赞失败: uid={uid}, pid={pid}, {e}", exc_info=True)
+        db.session.rollback()
+        return None
+
+
+def reconcile_project_star_counts():
+    """
+    按点赞表重新计算 projects.star_count，修复计数偏差。
+
+    级联删除用户时数据库会直接删除其点赞记录而不经过计数器，需定期执行本函数。
+
+    返回:
+        int: 被修正的项目数，失败则返回-1。
+    """
+    try:
+        actual = (
+            select(func.count(ProjectStar.psid))
+            .where(ProjectStar.pid == Project.pid)
+            .correlate(Project)
+            .scalar_subquery()
+        )
+        fixed = db.session.execute(
+            update(Project)
+            .where(Project.star_count != actual)
+            .values(star_count=actual)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if not safe_commit():
+            return -1
+        logger.info(f"点赞计数校正完成: 修正项目数={fixed}")
+        return fixed
+    except Exception as e:
+        logger.error(f"reconcile_project_star_counts Failed: {e}", exc_info=True)
+        db.session.rollback()
+        return -1
+
+
+@read_only
 def get_project_star_count_by_pid(pid):
     """
-    获取项目的点赞数。
+    获取项目的点赞数（读取冗余计数列）。
 
     参数:
         pid (str): 项目ID。
@@ -768,11 +1276,8 @@ def get_project_star_count_by_pid(pid):
         int: 点赞数量。
     """
     try:
-        from .models import ProjectStar
-        from sqlalchemy import func
-
         count = db.session.execute(
-            select(func.count(ProjectStar.psid)).where(ProjectStar.pid == pid)
+            select(Project.star_count).where(Project.pid == pid)
         ).scalar()
         return count or 0
     except Exception as e:
@@ -780,6 +1285,7 @@ def get_project_star_count_by_pid(pid):
         return 0
 
 
+@read_only
 def check_user_starred(uid, pid):
     """
     检查用户是否已对项目点赞。
@@ -792,10 +1298,11 @@ def check_user_starred(uid, pid):
         bool: 是否已点赞。
     """
     try:
-        from .models import ProjectStar
-
+        # 只取主键，命中 (uid, pid) 唯一索引即可判断，无需加载整条记录
         star = db.session.execute(
-            select(ProjectStar).where(ProjectStar.uid == uid, ProjectStar.pid == pid)
+            select(ProjectStar.psid).where(
+                ProjectStar.uid == uid, ProjectStar.pid == pid
+            )
         ).scalar_one_or_none()
         return star is not None
     except Exception as e:
@@ -877,6 +1384,8 @@ def delete_project_comment(project_comment):
         return False
 
 
+@_request_cached(ProjectComment)
+@read_only
 def get_comment_by_pcid(pcid):
     """
     根据评论ID获取评论。
@@ -896,6 +1405,7 @@ def get_comment_by_pcid(pcid):
         return None
 
 
+@read_only
 def get_ordered_project_comments_by_pid(pid):
     """
     获取项目的所有评论，教师评论排在最前面。
@@ -914,6 +1424,7 @@ def get_ordered_project_comments_by_pid(pid):
             db.session.execute(
                 select(ProjectComment)
                 .join(User, ProjectComment.uid == User.uid)
+                .options(contains_eager(ProjectComment.user))  # 复用 join，避免逐条懒加载作者
                 .where(ProjectComment.pid == pid)
                 .order_by(
                     User.role.desc(),  # role=1 (教师) 排在前面
@@ -0,0 +1,233 @@
+"""
+数据访问自检
+
+检查在临时目录中的 SQLite 文件上独立建库，不会读写 SQLALCHEMY_DATABASE_URI
+指向的数据库，可在 CI 或部署前执行，失败时以非零状态退出。
+
+- check_query_counts: 分别填充 3 组与 30 组数据，调用列表页/详情页的加载器并访问
+  模板会读取的所有属性，断言语句数不随数据量增长（防止 N+1 查询回归）。
+- check_replica_routing: 主库与从库为两个 SQLite 文件，确认 @read_only 查询会路由到
+  从库，且事务中 flush 但尚未提交的写入对随后的 @read_only 查询可见（读己之写）。
+
+用法:
+    flask --app main check-query-counts
+    flask --app main check-replica-routing
+"""
+
+from flask import Flask
+from .base import db
+from .models import User, Group, Project, generate_uuid
+from .explain import _capture_statements
+from .routing import replica_binds, replica_status
+from . import actions
+from sqlalchemy import insert
+import logging
+import os
+import shutil
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+# 对比的两种数据量
+SMALL_SIZE = 3
+LARGE_SIZE = 30
+
+
+def _scratch_app(directory, replicas=0):
+    """使用临时 SQLite 文件的最小应用（只注册数据库扩展），从库没有复制延迟"""
+    app = Flask(__name__)
+    app.config["SECRET_KEY"] = "check"
+    app.config["SQLALCHEMY_DATABASE_URI"] = (
+        f"sqlite:///{os.path.join(directory, 'primary.db')}"
+    )
+    app.config["SQLALCHEMY_BINDS"] = replica_binds(
+        [
+            f"sqlite:///{os.path.join(directory, f'replica_{i}.db')}"
+            for i in range(replicas)
+        ]
+    )
+    app.config["SQLALCHEMY_REPLICA_LAG_PROBE"] = lambda conn: 0
+    db.init_app(app)
+    return app
+
+
+# -------------------------------------------------------------------------------------------
+# 查询次数
+# -------------------------------------------------------------------------------------------
+def _seed(size):
+    """
+    填充 size 个工作组，每组一名组长和一个项目；第一个工作组再加入 size 名成员和
+    size 个项目，使详情页加载器的数据量也随 size 增长。
+
+    返回:
+        dict: 第一个工作组的 {"gid", "uid", "pid"}。
+    """
+    ids = {}
+    for i in range(size):
+        gid, leader_uid = generate_uuid(), generate_uuid()
+        extra = size if i == 0 else 0
+        db.session.add(Group(gid=gid, gname=f"group-{i}", leader_id=leader_uid))
+        for k in range(1 + extra):
+            db.session.add(
+                User(
+                    uid=leader_uid if k == 0 else generate_uuid(),
+                    uname=f"user-{i}-{k}",
+                    sid=f"{i:05d}{k:05d}",
+                    email=f"user-{i}-{k}@example.com",
+                    passwd_hash="-",
+                    gid=gid,
+                )
+            )
+        for k in range(1 + extra):
+            pid = generate_uuid()
+            db.session.add(
+                Project(pid=pid, pname=f"project-{i}-{k}", gid=gid, star_count=k)
+            )
+            ids.setdefault("pid", pid)
+        if i == 0:
+            ids.update(gid=gid, uid=leader_uid)
+    db.session.commit()
+    db.session.expunge_all()
+    return ids
+
+
+def _loaders(ids):
+    """加载器列表: (名称, 调用加载器并访问模板读取的全部属性的函数)"""
+
+    def project_list():
+        return [
+            (project.group.gname, project.star_count)
+            for project in actions.list_all_projects_with_stats()
+        ]
+
+    def group_list():
+        return [
+            (
+                len(group.users),
+                group.project_count,
+                [user.group.gname for user in group.users],
+                [project.pname for project in group.projects],
+            )
+            for group in actions.list_all_groups_with_stats(load_projects=True)
+        ]
+
+    def group_detail():
+        group = actions.get_group_with_members_by_gid(ids["gid"])
+        return (
+            len(group.users),
+            group.project_count,
+            [(user.uname, user.group.gname) for user in group.users],
+            [(project.pname, project.star_count) for project in group.projects],
+        )
+
+    def project_detail():
+        project = actions.get_project_with_stats_by_pid(ids["pid"])
+        return project.group.gname, project.star_count
+
+    def user_detail():
+        user = actions.get_user_with_group_by_uid(ids["uid"])
+        return user.uname, user.group.gname
+
+    return [
+        ("list_all_projects_with_stats", project_list),
+        ("list_all_groups_with_stats", group_list),
+        ("get_group_with_members_by_gid", group_detail),
+        ("get_project_with_stats_by_pid", project_detail),
+        ("get_user_with_group_by_uid", user_detail),
+    ]
+
+
+def _count_statements(size):
+    """在 size 规模的临时库上统计每个加载器发出的语句数"""
+    with tempfile.TemporaryDirectory() as directory:
+        app = _scratch_app(directory)
+        with app.app_context():
+            db.create_all()
+            ids = _seed(size)
+            counts = {}
+            for name, func in _loaders(ids):
+                # 每个加载器从空的 identity map 开始，避免复用前一个加载器的对象
+                db.session.remove()
+                counts[name] = len(_capture_statements(func))
+            db.session.remove()
+            db.engine.dispose()
+    return counts
+
+
+def check_query_counts():
+    """
+    比较两种数据量下各加载器的语句数。
+
+    返回:
+        list: 每个加载器一个字典 {"name", "small", "large", "ok"}，
+              ok 为 False 表示语句数随数据量增长（存在 N+1 查询）。
+    """
+    small = _count_statements(SMALL_SIZE)
+    large = _count_statements(LARGE_SIZE)
+    results = []
+    for name, count in small.items():
+        ok = large[name] == count
+        if not ok:
+            logger.warning(f"查询次数随数据量增长: {name} {count} -> {large[name]}")
+        results.append({"name": name, "small": count, "large": large[name], "ok": ok})
+    return results
+
+
+# -------------------------------------------------------------------------------------------
+# 读写分离
+# -------------------------------------------------------------------------------------------
+def _user_values(uname):
+    return {
+        "uid": generate_uuid(),
+        "uname": uname,
+        "sid": uname[-10:].rjust(10, "0"),
+        "email": f"{uname}@example.com",
+        "passwd_hash": "-",
+    }
+
+
+def check_replica_routing():
+    """
+    在一主一从两个 SQLite 文件上检查 @read_only 查询的路由。
+
+    返回:
+        list: 每项检查一个字典 {"name", "ok"}。
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        app = _scratch_app(directory, replicas=1)
+        with app.app_context():
+            db.create_all()
+            db.engine.dispose()
+        # 从库从主库的副本开始
+        shutil.copy(
+            os.path.join(directory, "primary.db"),
+            os.path.join(directory, "replica_0.db"),
+        )
+        with app.test_request_context():
+            # 立即探测从库，覆盖其他应用留下的同名从库健康状态
+            replica_status(db)
+            # 只写入从库的行能被读到，说明 @read_only 查询确实走了从库
+            with db.engines["replica_0"].begin() as conn:
+                conn.execute(insert(User).values(**_user_values("replica-only")))
+            routed = actions.get_user_by_uname("replica-only") is not None
+            results.append({"name": "@read_only 查询路由到从库", "ok": routed})
+
+            # flush 但未提交的写入只在主库的当前事务中可见
+            db.session.add(User(**_user_values("uncommitted")))
+            db.session.flush()
+            seen = actions.get_user_by_uname("uncommitted") is not None
+            results.append({"name": "flush 后未提交的写入可读（读己之写）", "ok": seen})
+            db.session.rollback()
+
+            # 回滚之后恢复读从库
+            routed = actions.get_user_by_uname("replica-only") is not None
+            results.append({"name": "回滚后恢复读从库", "ok": routed})
+            db.session.remove()
+        with app.app_context():
+            for engine in db.engines.values():
+                engine.dispose()
+    for result in results:
+        if not result["ok"]:
+            logger.warning(f"读写分离检查失败: {result['name']}")
+    return results
@@ -0,0 +1,131 @@
+"""
+热点查询执行计划检查
+
+直接调用 database.actions 中的热点函数，捕获它们实际发出的 SQL，再用 EXPLAIN
+（MySQL）或 EXPLAIN QUERY PLAN（SQLite）检查每条语句是否走索引。
+
+用法:
+    flask --app main explain-queries
+"""
+
+from .base import db
+from .models import User, Group, Project
+from . import actions
+from sqlalchemy import event, select
+from types import SimpleNamespace
+import logging
+import uuid
+
+logger = logging.getLogger(__name__)
+
+
+def _sample_ids():
+    """取库中已有的主键作为样本参数，空库时使用随机 UUID"""
+
+    def first(column):
+        value = db.session.execute(select(column).limit(1)).scalar()
+        return value or str(uuid.uuid4())
+
+    return {
+        "uid": first(User.uid),
+        "gid": first(Group.gid),
+        "pid": first(Project.pid),
+    }
+
+
+def _hot_queries(ids):
+    """热点查询列表: (名称, 调用函数)"""
+    uid, gid, pid = ids["uid"], ids["gid"], ids["pid"]
+    return [
+        ("get_user_by_uid", lambda: actions.get_user_by_uid(uid)),
+        ("get_group_by_gid", lambda: actions.get_group_by_gid(gid)),
+        ("get_project_by_pid", lambda: actions.get_project_by_pid(pid)),
+        ("check_user_starred", lambda: actions.check_user_starred(uid, pid)),
+        (
+            "get_ordered_project_comments_by_pid",
+            lambda: actions.get_ordered_project_comments_by_pid(pid),
+        ),
+        ("get_pending_application", lambda: actions.get_pending_application(uid, gid)),
+        (
+            "get_group_pending_applications",
+            lambda: actions.get_group_pending_applications(gid),
+        ),
+        (
+            "get_projects_by_user",
+            lambda: actions.get_projects_by_user(SimpleNamespace(gid=gid)),
+        ),
+        (
+            "Group.users (get_group_with_members_by_gid)",
+            lambda: actions.get_group_with_members_by_gid(gid),
+        ),
+        ("list_all_users (分页)", lambda: actions.list_all_users(limit=50)),
+    ]
+
+
+def _capture_statements(func):
+    """执行函数并返回其发出的 (SQL, 参数) 列表"""
+    captured = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, many):
+        if statement.lstrip().upper().startswith("SELECT"):
+            captured.append((statement, parameters))
+
+    # 只读查询可能被路由到从库，需要同时监听所有引擎
+    engines = list(db.engines.values())
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        func()
+    finally:
+        for engine in engines:
+            event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    return captured
+
+
+def _explain(statement, parameters):
+    """返回 (执行计划行列表, 是否存在全表扫描)"""
+    dialect = db.engine.dialect.name
+    with db.engine.connect() as conn:
+        if dialect == "sqlite":
+            rows = conn.exec_driver_sql(
+                "EXPLAIN QUERY PLAN " + statement, parameters
+            ).all()
+            plan = [row[-1] for row in rows]
+            # SQLite: "SCAN <table>" 表示全表扫描，"SCAN <table> USING INDEX" 为索引扫描
+            full_scan = any(
+                detail.startswith("SCAN") and "INDEX" not in detail for detail in plan
+            )
+        else:
+            rows = conn.exec_driver_sql("EXPLAIN " + statement, parameters).all()
+            plan = [
+                f"{row._mapping.get('table')}: type={row._mapping.get('type')}, "
+                f"key={row._mapping.get('key')}, extra={row._mapping.get('Extra')}"
+                for row in rows
+            ]
+            # MySQL: type=ALL 表示全表扫描
+            full_scan = any(row._mapping.get("type") == "ALL" for row in rows)
+    return plan, full_scan
+
+
+def explain_hot_queries():
+    """
+    检查所有热点查询的执行计划。
+
+    返回:
+        list: 每条语句一个字典 {"name", "sql", "plan", "full_scan"}。
+    """
+    results = []
+    for name, func in _hot_queries(_sample_ids()):
+        for statement, parameters in _capture_statements(func):
+            plan, full_scan = _explain(statement, parameters)
+            if full_scan:
+                logger.warning(f"热点查询存在全表扫描: {name}")
+            results.append(
+                {
+                    "name": name,
+                    "sql": " ".join(statement.split()),
+                    "plan": plan,
+                    "full_scan": full_scan,
+                }
+            )
+    return results
@@ -0,0 +1,226 @@
+"""
+按请求统计 SQL 执行情况
+
+通过 SQLAlchemy 的 before/after_cursor_execute 事件记录每个请求的查询次数、数据库
+总耗时以及归一化后的语句指纹:
+
+- 同一指纹的 SELECT 在一个请求中执行次数达到 SQL_N_PLUS_ONE_THRESHOLD 时记为疑似
+  N+1 查询并输出告警。
+- 单条语句耗时超过 SQL_SLOW_QUERY_MS 时写入独立的慢查询日志（SLOW_QUERY_LOG），
+  绑定参数只记录类型与长度，不记录原值。
+- 汇总数据保存在当前 worker 进程内，由 /admin/sql_stats 查看；DEBUG 模式下在响应头
+  中返回 X-DB-Query-Count / X-DB-Time-Ms / X-DB-N-Plus-One。
+"""
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from collections import Counter
+import logging
+import os
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+slow_query_logger = logging.getLogger("sql.slow")
+
+# 每个 worker 最多保留的端点与指纹条目数
+MAX_ENDPOINTS = 200
+MAX_FINGERPRINTS = 500
+
+_NUMBER = re.compile(r"\b\d+(\.\d+)?\b")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_PLACEHOLDER_LIST = re.compile(r"\((?:\s*(?:\?|%s|:\w+)\s*,)+\s*(?:\?|%s|:\w+)\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+_lock = threading.Lock()
+_endpoint_stats = {}
+_fingerprint_stats = {}
+_settings = {"slow_ms": 200.0, "n_plus_one": 5, "headers": False}
+
+
+def fingerprint(statement):
+    """归一化 SQL 语句：去除字面量、折叠 IN 列表与空白"""
+    statement = _STRING.sub("?", statement)
+    statement = _NUMBER.sub("?", statement)
+    statement = _PLACEHOLDER_LIST.sub("(?)", statement)
+    return _WHITESPACE.sub(" ", statement).strip()
+
+
+def _redact_value(value):
+    if value is None or isinstance(value, bool):
+        return value
+    if isinstance(value, (str, bytes)):
+        return f"<{type(value).__name__}:{len(value)}>"
+    return f"<{type(value).__name__}>"
+
+
+def redact_parameters(parameters):
+    """将绑定参数替换为类型占位符，避免日志中出现密码哈希、邮箱等敏感值"""
+    if isinstance(parameters, dict):
+        return {key: _redact_value(value) for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        if parameters and isinstance(parameters[0], (dict, list, tuple)):
+            # executemany 只记录条数与第一组参数
+            return {
+                "rows": len(parameters),
+                "first": redact_parameters(parameters[0]),
+            }
+        return [_redact_value(value) for value in parameters]
+    return _redact_value(parameters)
+
+
+# -------------------------------------------------------------------------------------------
+# SQLAlchemy 事件
+# -------------------------------------------------------------------------------------------
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("_query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["_query_started"].pop()
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    if elapsed_ms >= _settings["slow_ms"]:
+        slow_query_logger.warning(
+            f"{elapsed_ms:.1f}ms [{conn.engine.url.database}] "
+            f"{_WHITESPACE.sub(' ', statement)} params={redact_parameters(parameters)}"
+        )
+    if has_request_context() and "_sql_stats" in g:
+        stats = g._sql_stats
+        stats["count"] += 1
+        stats["time_ms"] += elapsed_ms
+        stats["fingerprints"][fingerprint(statement)] += 1
+
+
+def _handle_error(exception_context):
+    # 执行失败时不会触发 after_cursor_execute，丢弃对应的开始时间
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("_query_started"):
+        conn.info["_query_started"].pop()
+
+
+# -------------------------------------------------------------------------------------------
+# 请求钩子
+# -------------------------------------------------------------------------------------------
+def _start_request():
+    g._sql_stats = {"count": 0, "time_ms": 0.0, "fingerprints": Counter()}
+
+
+def _n_plus_one(fingerprints):
+    """返回疑似 N+1 的 SELECT 指纹及其执行次数"""
+    return {
+        sql: count
+        for sql, count in fingerprints.items()
+        if count >= _settings["n_plus_one"] and sql.upper().startswith("SELECT")
+    }
+
+
+def _record(endpoint, stats, suspects):
+    with _lock:
+        entry = _endpoint_stats.get(endpoint)
+        if entry is None:
+            if len(_endpoint_stats) >= MAX_ENDPOINTS:
+                return
+            entry = _endpoint_stats[endpoint] = {
+                "requests": 0,
+                "queries": 0,
+                "max_queries": 0,
+                "time_ms": 0.0,
+                "n_plus_one": 0,
+            }
+        entry["requests"] += 1
+        entry["queries"] += stats["count"]
+        entry["max_queries"] = max(entry["max_queries"], stats["count"])
+        entry["time_ms"] += stats["time_ms"]
+        entry["n_plus_one"] += 1 if suspects else 0
+        for sql, count in stats["fingerprints"].items():
+            if sql not in _fingerprint_stats:
+                if len(_fingerprint_stats) >= MAX_FINGERPRINTS:
+                    continue
+                _fingerprint_stats[sql] = {"executions": 0, "endpoints": set()}
+            item = _fingerprint_stats[sql]
+            item["executions"] += count
+            item["endpoints"].add(endpoint)
+
+
+def _finish_request(response):
+    stats = g.pop("_sql_stats", None)
+    if stats is None:
+        return response
+    endpoint = request.endpoint or "<unmatched>"
+    suspects = _n_plus_one(stats["fingerprints"])
+    for sql, count in suspects.items():
+        logger.warning(f"疑似 N+1 查询: endpoint={endpoint}, 执行 {count} 次: {sql}")
+    _record(endpoint, stats, suspects)
+    if _settings["headers"]:
+        response.headers["X-DB-Query-Count"] = str(stats["count"])
+        response.headers["X-DB-Time-Ms"] = f"{stats['time_ms']:.1f}"
+        response.headers["X-DB-N-Plus-One"] = str(len(suspects))
+    return response
+
+
+# -------------------------------------------------------------------------------------------
+# 入口
+# -------------------------------------------------------------------------------------------
+def get_sql_stats(top=20):
+    """
+    返回当前 worker 的 SQL 统计汇总。
+
+    参数:
+        top (int): 返回执行次数最多的语句指纹条数。
+
+    返回:
+        dict: {"pid", "endpoints", "top_statements"}。
+    """
+    with _lock:
+        endpoints = {
+            name: {
+                **entry,
+                "time_ms": round(entry["time_ms"], 1),
+                "avg_queries": round(entry["queries"] / entry["requests"], 2),
+            }
+            for name, entry in _endpoint_stats.items()
+        }
+        statements = sorted(
+            _fingerprint_stats.items(), key=lambda item: -item[1]["executions"]
+        )[:top]
+    return {
+        "pid": os.getpid(),
+        "endpoints": endpoints,
+        "top_statements": [
+            {
+                "sql": sql,
+                "executions": item["executions"],
+                "endpoints": sorted(item["endpoints"]),
+            }
+            for sql, item in statements
+        ],
+    }
+
+
+def reset_sql_stats():
+    """清空当前 worker 的统计数据"""
+    with _lock:
+        _endpoint_stats.clear()
+        _fingerprint_stats.clear()
+
+
+def init_sql_instrumentation(app):
+    """注册 SQL 事件监听与请求钩子，并配置慢查询日志"""
+    _settings["slow_ms"] = app.config["SQL_SLOW_QUERY_MS"]
+    _settings["n_plus_one"] = app.config["SQL_N_PLUS_ONE_THRESHOLD"]
+    _settings["headers"] = app.config["DEBUG"]
+
+    if app.config.get("SLOW_QUERY_LOG") and not slow_query_logger.handlers:
+        handler = logging.FileHandler(app.config["SLOW_QUERY_LOG"], encoding="utf-8")
+        handler.setFormatter(logging.Formatter("[%(asctime)s] %(message)s"))
+        slow_query_logger.addHandler(handler)
+        slow_query_logger.propagate = False
+
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(Engine, "handle_error", _handle_error)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
@@ -0,0 +1,153 @@
+"""
+数据库结构升级工具
+
+db.create_all() 只会创建缺失的表，不会修改已有表。这里的每个迁移步骤都会先检查
+目标结构是否已经存在，因此可以在已有的 MySQL / SQLite 数据库上重复执行。
+
+用法:
+    flask --app main upgrade-db
+"""
+
+from .base import db
+from .models import User, Group, Project, GroupApplication, ProjectStar, ProjectComment
+from sqlalchemy import inspect, text
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# -------------------------------------------------------------------------------------------
+# 结构检查工具函数
+# -------------------------------------------------------------------------------------------
+def _column_names(inspector, table_name):
+    """返回表中已有的列名集合"""
+    return {column["name"] for column in inspector.get_columns(table_name)}
+
+
+def _index_names(inspector, table_name):
+    """返回表中已有的索引与唯一约束名集合"""
+    names = {index["name"] for index in inspector.get_indexes(table_name)}
+    names |= {uq["name"] for uq in inspector.get_unique_constraints(table_name)}
+    return names
+
+
+def _create_model_index(conn, model, index_name):
+    """按模型中声明的 Index 生成对应方言的 DDL 并执行"""
+    index = next(i for i in model.__table__.indexes if i.name == index_name)
+    index.create(bind=conn)
+
+
+def _recount_project_stars(conn):
+    """按点赞表重新计算 projects.star_count"""
+    conn.execute(
+        text(
+            "UPDATE projects SET star_count = ("
+            "SELECT COUNT(*) FROM project_stars WHERE project_stars.pid = projects.pid)"
+        )
+    )
+
+
+# -------------------------------------------------------------------------------------------
+# 迁移步骤（返回 True 表示本次执行了变更）
+# -------------------------------------------------------------------------------------------
+def _add_project_star_count(conn, inspector):
+    """projects 表新增冗余点赞计数列"""
+    if "star_count" in _column_names(inspector, "projects"):
+        return False
+    conn.execute(
+        text("ALTER TABLE projects ADD COLUMN star_count INTEGER NOT NULL DEFAULT 0")
+    )
+    _recount_project_stars(conn)
+    return True
+
+
+def _add_group_idle_timeout(conn, inspector):
+    """groups 表新增空闲休眠阈值列"""
+    if "idle_timeout" in _column_names(inspector, "groups"):
+        return False
+    conn.execute(text("ALTER TABLE groups ADD COLUMN idle_timeout INTEGER NULL"))
+    return True
+
+
+def _add_project_star_unique_index(conn, inspector):
+    """project_stars 表新增 (uid, pid) 唯一索引"""
+    if "uq_project_star_uid_pid" in _index_names(inspector, "project_stars"):
+        return False
+    # 先清理历史上并发点击产生的重复点赞，每组只保留 psid 最小的一条
+    # 外层再包一层派生表，绕过 MySQL 不允许在子查询中引用被删除表的限制
+    conn.execute(
+        text(
+            "DELETE FROM project_stars WHERE psid NOT IN ("
+            "SELECT keep_psid FROM ("
+            "SELECT MIN(psid) AS keep_psid FROM project_stars GROUP BY uid, pid"
+            ") AS keep_stars)"
+        )
+    )
+    _create_model_index(conn, ProjectStar, "uq_project_star_uid_pid")
+    if "star_count" in _column_names(inspector, "projects"):
+        _recount_project_stars(conn)
+    return True
+
+
+def _model_index_step(model, index_name):
+    """生成“按模型声明补建索引”的迁移步骤"""
+
+    def step(conn, inspector):
+        if index_name in _index_names(inspector, model.__tablename__):
+            return False
+        _create_model_index(conn, model, index_name)
+        return True
+
+    return step
+
+
+# 按顺序执行的迁移步骤
+MIGRATIONS = [
+    ("project_stars 唯一索引 (uid, pid)", _add_project_star_unique_index),
+    ("projects.star_count 点赞计数列", _add_project_star_count),
+    (
+        "users 分页索引 (created_at, uid)",
+        _model_index_step(User, "ix_users_created_at_uid"),
+    ),
+    (
+        "groups 分页索引 (created_at, gid)",
+        _model_index_step(Group, "ix_groups_created_at_gid"),
+    ),
+    (
+        "projects 分页索引 (created_at, pid)",
+        _model_index_step(Project, "ix_projects_created_at_pid"),
+    ),
+    ("users 索引 (gid)", _model_index_step(User, "ix_users_gid")),
+    ("projects 索引 (gid)", _model_index_step(Project, "ix_projects_gid")),
+    (
+        "group_applications 索引 (uid, gid, status)",
+        _model_index_step(GroupApplication, "ix_group_applications_uid_gid_status"),
+    ),
+    (
+        "group_applications 索引 (gid, status)",
+        _model_index_step(GroupApplication, "ix_group_applications_gid_status"),
+    ),
+    ("project_stars 索引 (pid)", _model_index_step(ProjectStar, "ix_project_stars_pid")),
+    (
+        "project_comments 索引 (pid, created_at)",
+        _model_index_step(ProjectComment, "ix_project_comments_pid_created_at"),
+    ),
+    ("groups.idle_timeout 空闲休眠阈值列", _add_group_idle_timeout),
+]
+
+
+def upgrade_database():
+    """
+    依次执行所有尚未应用的迁移步骤。
+
+    返回:
+        list: 本次实际应用的迁移步骤名称。
+    """
+    applied = []
+    with db.engine.begin() as conn:
+        for name, step in MIGRATIONS:
+            # 每一步前重新检查，前一步的结构变更需要对后续步骤可见
+            if step(conn, inspect(conn)):
+                logger.info(f"数据库迁移已应用: {name}")
+                applied.append(name)
+    return applied
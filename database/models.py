@@ -1,8 +1,10 @@
 from .base import db, login_manager
 from datetime import datetime, timedelta, timezone
 from sqlalchemy import Column, DateTime
+from sqlalchemy.orm import query_expression
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
+from .types import UUIDKey, BINARY_KEYS, uuid7, key_prefix_lengths
 import uuid
 
 # Asia/Shanghai timezone (UTC+8)
@@ -10,7 +12,8 @@ _local_tz = timezone(timedelta(hours=8))
 
 
 def generate_uuid():
-    return str(uuid.uuid4())
+    # 二进制主键模式使用时间有序的 UUIDv7，保持插入顺序与索引顺序一致
+    return str(uuid7()) if BINARY_KEYS else str(uuid.uuid4())
 
 
 class TimestampMixin:
@@ -28,15 +31,21 @@ class TimestampMixin:
 class User(db.Model, TimestampMixin, UserMixin):
     # 用户表
     __tablename__ = "users"
+    __table_args__ = (
+        # 游标分页按 (created_at, uid) 顺序扫描
+        db.Index("ix_users_created_at_uid", "created_at", "uid"),
+        # Group.users 按 gid 加载成员
+        db.Index("ix_users_gid", "gid"),
+    )
     # 字段
-    uid = db.Column(db.String(512), primary_key=True, default=generate_uuid)
+    uid = db.Column(UUIDKey(), primary_key=True, default=generate_uuid)
     uname = db.Column(db.String(512), unique=True, nullable=False)
     uinfo = db.Column(db.Text, nullable=True)
     sid = db.Column(db.String(512), unique=True, nullable=False)
     email = db.Column(db.String(512), unique=True, nullable=False)
     passwd_hash = db.Column(db.String(512), nullable=False)
     gid = db.Column(
-        db.String(512), db.ForeignKey("groups.gid", ondelete="SET NULL"), nullable=True
+        UUIDKey(), db.ForeignKey("groups.gid", ondelete="SET NULL"), nullable=True
     )
     role = db.Column(db.Integer, default=0)  # 0: 普通用户, 1: 管理员, 2: Teacher
 
@@ -68,11 +77,14 @@ class User(db.Model, TimestampMixin, UserMixin):
 class Group(db.Model, TimestampMixin):
     # 工作组表
     __tablename__ = "groups"
+    __table_args__ = (db.Index("ix_groups_created_at_gid", "created_at", "gid"),)
     # 字段
-    gid = db.Column(db.String(512), primary_key=True, default=generate_uuid)
+    gid = db.Column(UUIDKey(), primary_key=True, default=generate_uuid)
     gname = db.Column(db.String(512), nullable=False)
     ginfo = db.Column(db.Text, nullable=True)
-    leader_id = db.Column(db.String(512), db.ForeignKey("users.uid"), nullable=False)
+    leader_id = db.Column(UUIDKey(), db.ForeignKey("users.uid"), nullable=False)
+    # 组内容器空闲多少分钟后休眠，None 使用 HIBERNATE_IDLE_MINUTES，0 表示不休眠
+    idle_timeout = db.Column(db.Integer, nullable=True)
     users = db.relationship("User", backref="group", foreign_keys=[User.gid], lazy=True)
     projects = db.relationship(
         "Project",
@@ -81,6 +93,8 @@ class Group(db.Model, TimestampMixin):
         passive_deletes=True,
         lazy=True,
     )
+    # 由列表加载器通过 with_expression 填充的聚合值（未加载时为 None）
+    project_count = query_expression()
 
     def __repr__(self):
         users_list = ";".join(user.uname for user in self.users)
@@ -90,16 +104,23 @@ class Group(db.Model, TimestampMixin):
 class Project(db.Model, TimestampMixin):
     # 项目表
     __tablename__ = "projects"
+    __table_args__ = (
+        db.Index("ix_projects_created_at_pid", "created_at", "pid"),
+        # get_projects_by_user / Group.projects 按 gid 查找
+        db.Index("ix_projects_gid", "gid"),
+    )
     # 字段
-    pid = db.Column(db.String(512), primary_key=True, default=generate_uuid)
+    pid = db.Column(UUIDKey(), primary_key=True, default=generate_uuid)
     pname = db.Column(db.String(512), nullable=False)
     pinfo = db.Column(db.Text, nullable=True)
     gid = db.Column(
-        db.String(512), db.ForeignKey("groups.gid", ondelete="CASCADE"), nullable=False
+        UUIDKey(), db.ForeignKey("groups.gid", ondelete="CASCADE"), nullable=False
     )
     docker_name = db.Column(db.String(512), unique=True, default=generate_uuid)
     port = db.Column(db.Integer, unique=True, nullable=True)
     docker_port = db.Column(db.Integer, unique=False, nullable=True)
+    # 冗余的点赞计数，由 toggle_project_star 原子维护，reconcile_project_star_counts 修复偏差
+    star_count = db.Column(db.Integer, default=0, server_default="0", nullable=False)
 
     def __repr__(self):
         return f"<Project {self.pname} ({self.port}:{self.docker_port})>"
@@ -108,13 +129,25 @@ class Project(db.Model, TimestampMixin):
 class GroupApplication(db.Model, TimestampMixin):
     # 工作组申请表
     __tablename__ = "group_applications"
+    __table_args__ = (
+        # get_pending_application: uid + gid + status 等值查找
+        db.Index(
+            "ix_group_applications_uid_gid_status",
+            "uid",
+            "gid",
+            "status",
+            mysql_length=key_prefix_lengths("uid", "gid"),
+        ),
+        # get_group_pending_applications: 组长查看待审核申请
+        db.Index("ix_group_applications_gid_status", "gid", "status"),
+    )
     # 字段
-    gaid = db.Column(db.String(512), primary_key=True, default=generate_uuid)
+    gaid = db.Column(UUIDKey(), primary_key=True, default=generate_uuid)
     uid = db.Column(
-        db.String(512), db.ForeignKey("users.uid", ondelete="CASCADE"), nullable=False
+        UUIDKey(), db.ForeignKey("users.uid", ondelete="CASCADE"), nullable=False
     )
     gid = db.Column(
-        db.String(512), db.ForeignKey("groups.gid", ondelete="CASCADE"), nullable=False
+        UUIDKey(), db.ForeignKey("groups.gid", ondelete="CASCADE"), nullable=False
     )
     status = db.Column(
         db.Integer, default=0, nullable=False
@@ -140,13 +173,25 @@ class GroupApplication(db.Model, TimestampMixin):
 class ProjectStar(db.Model, TimestampMixin):
     # 项目点赞表
     __tablename__ = "project_stars"
+    __table_args__ = (
+        # 同一用户对同一项目只能点赞一次，并发点击由数据库约束兜底
+        db.Index(
+            "uq_project_star_uid_pid",
+            "uid",
+            "pid",
+            unique=True,
+            mysql_length=key_prefix_lengths("uid", "pid"),
+        ),
+        # 按项目统计/校正点赞数
+        db.Index("ix_project_stars_pid", "pid"),
+    )
     # 字段
-    psid = db.Column(db.String(512), primary_key=True, default=generate_uuid)
+    psid = db.Column(UUIDKey(), primary_key=True, default=generate_uuid)
     uid = db.Column(
-        db.String(512), db.ForeignKey("users.uid", ondelete="CASCADE"), nullable=False
+        UUIDKey(), db.ForeignKey("users.uid", ondelete="CASCADE"), nullable=False
     )
     pid = db.Column(
-        db.String(512),
+        UUIDKey(),
         db.ForeignKey("projects.pid", ondelete="CASCADE"),
         nullable=False,
     )
@@ -169,13 +214,17 @@ class ProjectStar(db.Model, TimestampMixin):
 class ProjectComment(db.Model, TimestampMixin):
     # 项目评论表
     __tablename__ = "project_comments"
+    __table_args__ = (
+        # get_ordered_project_comments_by_pid: 按项目筛选并按时间排序
+        db.Index("ix_project_comments_pid_created_at", "pid", "created_at"),
+    )
     # 字段
-    pcid = db.Column(db.String(512), primary_key=True, default=generate_uuid)
+    pcid = db.Column(UUIDKey(), primary_key=True, default=generate_uuid)
     uid = db.Column(
-        db.String(512), db.ForeignKey("users.uid", ondelete="CASCADE"), nullable=False
+        UUIDKey(), db.ForeignKey("users.uid", ondelete="CASCADE"), nullable=False
     )
     pid = db.Column(
-        db.String(512),
+        UUIDKey(),
         db.ForeignKey("projects.pid", ondelete="CASCADE"),
         nullable=False,
     )
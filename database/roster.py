@@ -0,0 +1,396 @@
+"""
+批量导入花名册（用户 / 工作组 / 项目）
+
+CSV 第一行为表头，每行一个用户:
+    uname,email,sid,password,uinfo,role,group,leader,project,pinfo,docker_port
+
+- uname / email / sid 必填；password 为空时使用导入时指定的默认密码。
+- role: 0 普通用户（默认）或 2 教师，不支持导入管理员。
+- group: 工作组名称。库中已有同名工作组时加入该组，否则新建；新建组的组长为
+  leader 列为 1 的成员，未指定时为该组第一个成功导入的成员。
+- project / pinfo / docker_port: 为该行所在工作组创建项目（同组同名只创建一次），
+  宿主机端口由 utils/port_allocator.py 自动分配，docker_port 为空时使用
+  DEFAULT_DOCKER_PORT。
+
+唯一性检查按整批 IN 查询完成，密码哈希在进程池中并行计算，写入使用 executemany
+分批提交。某一批写入冲突时逐行重试，单行错误只记录在报告中，不中断整个导入。
+
+用法:
+    flask --app main import-roster roster.csv --default-password 123456
+"""
+
+from .base import db
+from .models import User, Group, Project, generate_uuid
+from utils import port_allocator
+from sqlalchemy import select, insert, update, or_, tuple_
+from sqlalchemy.exc import IntegrityError
+from concurrent.futures import ProcessPoolExecutor
+from werkzeug.security import generate_password_hash
+import csv
+import io
+import logging
+import multiprocessing
+
+logger = logging.getLogger(__name__)
+
+# 每个事务写入的行数
+BATCH_SIZE = 500
+# IN 查询每次携带的参数个数
+IN_CHUNK_SIZE = 500
+# 少于该数量的密码直接在当前进程中计算哈希
+POOL_THRESHOLD = 16
+# 未指定容器端口时的默认值
+DEFAULT_DOCKER_PORT = 3000
+
+IMPORTABLE_ROLES = {0, 2}
+
+
+# -------------------------------------------------------------------------------------------
+# 解析与校验
+# -------------------------------------------------------------------------------------------
+def _chunks(items, size):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+def _parse_int(value, default):
+    value = (value or "").strip()
+    return int(value) if value else default
+
+
+def _parse_row(line, raw, default_password):
+    """校验单行数据，返回 (规范化后的行, 错误信息)"""
+    row = {
+        key.strip().lower(): (value or "").strip()
+        for key, value in raw.items()
+        if key
+    }
+    uname, email, sid = row.get("uname", ""), row.get("email", ""), row.get("sid", "")
+    if not (3 <= len(uname) <= 50):
+        return None, "用户名长度应为 3-50 个字符"
+    if "@" not in email or len(email) > 100:
+        return None, "邮箱格式不正确"
+    if len(sid) != 10 or not sid.isdigit():
+        return None, "学号格式不正确，应为10位数字"
+    password = row.get("password") or default_password
+    if not password:
+        return None, "缺少密码且未指定默认密码"
+    try:
+        role = _parse_int(row.get("role"), 0)
+        docker_port = _parse_int(row.get("docker_port"), DEFAULT_DOCKER_PORT)
+    except ValueError:
+        return None, "role / docker_port 必须是数字"
+    if role not in IMPORTABLE_ROLES:
+        return None, "role 只能为 0（普通用户）或 2（教师）"
+    if not (1024 <= docker_port <= 65535):
+        return None, "Docker端口号必须是1024到65535之间的数字"
+    project = row.get("project", "")
+    if project and not row.get("group"):
+        return None, "创建项目需要同时指定工作组"
+    if project and not (3 <= len(project) <= 100):
+        return None, "项目名称长度应为 3-100 个字符"
+    return {
+        "line": line,
+        "uid": generate_uuid(),
+        "uname": uname,
+        "email": email,
+        "sid": sid,
+        "password": password,
+        "uinfo": row.get("uinfo") or None,
+        "role": role,
+        "group": row.get("group", ""),
+        "leader": row.get("leader", "").lower() in ("1", "true", "yes", "y"),
+        "project": project,
+        "pinfo": row.get("pinfo") or None,
+        "docker_port": docker_port,
+    }, None
+
+
+def _existing_identities(rows):
+    """一次性（按块）查询库中已存在的用户名、邮箱与学号"""
+    taken = {"uname": set(), "email": set(), "sid": set()}
+    for chunk in _chunks(rows, IN_CHUNK_SIZE):
+        stmt = select(User.uname, User.email, User.sid).where(
+            or_(
+                User.uname.in_([r["uname"] for r in chunk]),
+                User.email.in_([r["email"] for r in chunk]),
+                User.sid.in_([r["sid"] for r in chunk]),
+            )
+        )
+        for uname, email, sid in db.session.execute(stmt):
+            taken["uname"].add(uname)
+            taken["email"].add(email)
+            taken["sid"].add(sid)
+    return taken
+
+
+def _check_uniqueness(rows, errors):
+    """剔除与库中或文件中前面的行重复的用户"""
+    taken = _existing_identities(rows)
+    seen = {"uname": set(), "email": set(), "sid": set()}
+    labels = {"uname": "用户名", "email": "邮箱", "sid": "学号"}
+    unique_rows = []
+    for row in rows:
+        conflict = None
+        for field, label in labels.items():
+            if row[field] in taken[field]:
+                conflict = f"{label}已存在"
+            elif row[field] in seen[field]:
+                conflict = f"{label}在文件中重复"
+            if conflict:
+                break
+        if conflict:
+            errors.append(
+                {"line": row["line"], "uname": row["uname"], "error": conflict}
+            )
+            continue
+        for field in labels:
+            seen[field].add(row[field])
+        unique_rows.append(row)
+    return unique_rows
+
+
+def _hash_passwords(rows, workers=None):
+    """并行计算密码哈希（scrypt/pbkdf2 为 CPU 密集型，线程无法并行）"""
+    passwords = [row["password"] for row in rows]
+    if len(passwords) < POOL_THRESHOLD:
+        hashes = [generate_password_hash(p) for p in passwords]
+    else:
+        # spawn 启动的子进程不继承 eventlet 补丁与数据库连接
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            hashes = list(pool.map(generate_password_hash, passwords, chunksize=8))
+    for row, passwd_hash in zip(rows, hashes):
+        row["passwd_hash"] = passwd_hash
+
+
+# -------------------------------------------------------------------------------------------
+# 批量写入
+# -------------------------------------------------------------------------------------------
+def _insert_batches(model, items, errors, batch_size=BATCH_SIZE):
+    """
+    按批 executemany 写入，每批一个事务。某一批违反约束（例如与并发注册冲突）时
+    回滚该批并逐行重试，以定位出错的行。
+
+    参数:
+        model: 目标模型。
+        items (list): (行信息, 写入值) 列表，行信息为 {"line", "uname"}。
+        errors (list): 错误报告列表。
+
+    返回:
+        list: 成功写入的 (行信息, 写入值)。
+    """
+    written = []
+    for batch in _chunks(items, batch_size):
+        try:
+            db.session.execute(insert(model), [values for _, values in batch])
+            db.session.commit()
+            written.extend(batch)
+            continue
+        except IntegrityError:
+            db.session.rollback()
+        for info, values in batch:
+            try:
+                db.session.execute(insert(model), [values])
+                db.session.commit()
+                written.append((info, values))
+            except IntegrityError as e:
+                db.session.rollback()
+                errors.append(
+                    {**info, "error": f"写入 {model.__tablename__} 失败: {e.orig}"}
+                )
+    return written
+
+
+def _resolve_groups(rows, errors):
+    """
+    将行中的工作组名称解析为 gid，必要时创建新工作组。
+
+    返回:
+        (dict, int): 工作组名称 -> gid，新建工作组数量。
+    """
+    names = {row["group"] for row in rows if row["group"]}
+    existing = {}
+    for chunk in _chunks(names, IN_CHUNK_SIZE):
+        for gid, gname in db.session.execute(
+            select(Group.gid, Group.gname).where(Group.gname.in_(chunk))
+        ):
+            existing.setdefault(gname, []).append(gid)
+
+    members = {}
+    for row in rows:
+        if row["group"]:
+            members.setdefault(row["group"], []).append(row)
+
+    gids = {}
+    new_groups = []
+    for name, group_rows in members.items():
+        if len(existing.get(name, [])) > 1:
+            for row in group_rows:
+                errors.append(
+                    {
+                        "line": row["line"],
+                        "uname": row["uname"],
+                        "error": f"存在多个名为 {name} 的工作组，无法确定加入哪一个",
+                    }
+                )
+        elif name in existing:
+            gids[name] = existing[name][0]
+        else:
+            leader = next((r for r in group_rows if r["leader"]), group_rows[0])
+            new_groups.append(
+                (
+                    {"line": leader["line"], "uname": leader["uname"]},
+                    {"gid": generate_uuid(), "gname": name, "leader_id": leader["uid"]},
+                )
+            )
+
+    created = _insert_batches(Group, new_groups, errors)
+    for _, values in created:
+        gids[values["gname"]] = values["gid"]
+    return gids, len(created)
+
+
+def _create_projects(rows, gids, errors):
+    """为各工作组创建项目，同组同名的项目只创建一次，已存在的跳过"""
+    wanted = {}
+    for row in rows:
+        gid = gids.get(row["group"])
+        if row["project"] and gid and (gid, row["project"]) not in wanted:
+            wanted[(gid, row["project"])] = row
+
+    existing = set()
+    for chunk in _chunks(wanted, IN_CHUNK_SIZE):
+        existing.update(
+            db.session.execute(
+                select(Project.gid, Project.pname).where(
+                    tuple_(Project.gid, Project.pname).in_(chunk)
+                )
+            ).all()
+        )
+
+    pending = [(key, row) for key, row in wanted.items() if key not in existing]
+    ports = port_allocator.allocate_many(len(pending))
+    if len(ports) < len(pending):
+        for _, row in pending[len(ports) :]:
+            errors.append(
+                {"line": row["line"], "uname": row["uname"], "error": "可用端口不足"}
+            )
+    items = [
+        (
+            {"line": row["line"], "uname": row["uname"]},
+            {
+                "pid": generate_uuid(),
+                "docker_name": generate_uuid(),
+                "pname": pname,
+                "pinfo": row["pinfo"],
+                "gid": gid,
+                "port": port,
+                "docker_port": row["docker_port"],
+            },
+        )
+        for ((gid, pname), row), port in zip(pending, ports)
+    ]
+    created = _insert_batches(Project, items, errors)
+    # 写入失败的项目释放预留的端口
+    for port in set(ports) - {values["port"] for _, values in created}:
+        port_allocator.release(port)
+    return len(created)
+
+
+# -------------------------------------------------------------------------------------------
+# 入口
+# -------------------------------------------------------------------------------------------
+def import_roster(stream, default_password=None, workers=None):
+    """
+    从 CSV 花名册批量导入用户、工作组和项目。
+
+    参数:
+        stream: 文本文件对象或 CSV 字符串。
+        default_password (str): password 列为空时使用的密码。
+        workers (int): 密码哈希进程数，默认为 CPU 核数。
+
+    返回:
+        dict: {"users", "groups", "projects", "errors"}，errors 为
+              [{"line", "uname", "error"}] 列表，line 为 CSV 中的行号。
+    """
+    if isinstance(stream, str):
+        stream = io.StringIO(stream)
+    errors = []
+    rows = []
+    reader = csv.DictReader(stream)
+    missing = {"uname", "email", "sid"} - {
+        (name or "").strip().lower() for name in reader.fieldnames or []
+    }
+    if missing:
+        return {
+            "users": 0,
+            "groups": 0,
+            "projects": 0,
+            "errors": [
+                {
+                    "line": 1,
+                    "uname": None,
+                    "error": f"缺少列: {', '.join(sorted(missing))}",
+                }
+            ],
+        }
+    for raw in reader:
+        row, error = _parse_row(reader.line_num, raw, default_password)
+        if error:
+            errors.append(
+                {"line": reader.line_num, "uname": raw.get("uname"), "error": error}
+            )
+        else:
+            rows.append(row)
+
+    rows = _check_uniqueness(rows, errors)
+    _hash_passwords(rows, workers)
+
+    # 先写入用户（gid 留空），users.gid 与 groups.leader_id 互相引用
+    written = _insert_batches(
+        User,
+        [
+            (
+                {"line": row["line"], "uname": row["uname"]},
+                {
+                    "uid": row["uid"],
+                    "uname": row["uname"],
+                    "email": row["email"],
+                    "sid": row["sid"],
+                    "passwd_hash": row["passwd_hash"],
+                    "uinfo": row["uinfo"],
+                    "role": row["role"],
+                },
+            )
+            for row in rows
+        ],
+        errors,
+    )
+    written_uids = {values["uid"] for _, values in written}
+    rows = [row for row in rows if row["uid"] in written_uids]
+
+    gids, group_count = _resolve_groups(rows, errors)
+    memberships = [
+        {"uid": row["uid"], "gid": gids[row["group"]]}
+        for row in rows
+        if row["group"] in gids
+    ]
+    for batch in _chunks(memberships, BATCH_SIZE):
+        # ORM 按主键批量 UPDATE，以 executemany 执行
+        db.session.execute(update(User), batch)
+        db.session.commit()
+
+    project_count = _create_projects(rows, gids, errors)
+    errors.sort(key=lambda e: e["line"])
+    logger.info(
+        f"花名册导入完成: 用户 {len(rows)}, 工作组 {group_count}, "
+        f"项目 {project_count}, 错误 {len(errors)}"
+    )
+    return {
+        "users": len(rows),
+        "groups": group_count,
+        "projects": project_count,
+        "errors": errors,
+    }
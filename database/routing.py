@@ -0,0 +1,211 @@
+"""
+读写分离：只读查询路由到从库
+
+database.actions 中以 @read_only 标记的函数在执行期间通过 RoutingSession.get_bind
+选择一个从库引擎，其余查询与所有写入（flush）始终走主库。
+
+- 从库通过环境变量 SQLALCHEMY_REPLICA_URIS（逗号分隔）配置，注册为
+  SQLALCHEMY_BINDS 中的 replica_<n>，未配置时行为与单库完全一致。
+- 读己之写: 当前事务已有未 flush 的改动、已 flush 或直接执行过写语句时，只读查询
+  走主库，直到提交或回滚；请求内发生任何 commit 后，本请求剩余的查询全部走主库；
+  同时在会话中记录一个短时间窗口（SQLALCHEMY_REPLICA_STICKY_SECONDS），覆盖提交后
+  重定向的下一个请求。
+- 延迟回退: 每个从库按 SQLALCHEMY_REPLICA_LAG_CHECK_INTERVAL 周期探测复制延迟，
+  超过 SQLALCHEMY_REPLICA_MAX_LAG 或无法连接时暂时不再使用该从库。
+
+测试时可将主库与从库分别指向两个 SQLite 文件（从库文件需先复制一份主库），
+并通过 app.config["SQLALCHEMY_REPLICA_LAG_PROBE"] 注入自定义的延迟探测函数
+（参数为从库连接，返回延迟秒数）来模拟复制延迟；flask check-replica-routing
+（database/checks.py）即按此方式检查读己之写。
+"""
+
+from flask import current_app, g, has_request_context, session as http_session
+from flask_sqlalchemy.session import Session
+from contextvars import ContextVar
+from functools import wraps
+from sqlalchemy import event
+import logging
+import random
+import time
+
+logger = logging.getLogger(__name__)
+
+REPLICA_BIND_PREFIX = "replica_"
+
+# 当前调用栈是否处于 @read_only 函数中
+_read_only = ContextVar("db_read_only", default=False)
+
+# 从库健康状态缓存: bind key -> (检查时间, 延迟秒数或 None, 是否可用)
+_replica_health = {}
+
+
+def replica_binds(uris):
+    """将从库连接串列表转换为 SQLALCHEMY_BINDS 配置"""
+    return {f"{REPLICA_BIND_PREFIX}{i}": uri for i, uri in enumerate(uris)}
+
+
+def read_only(func):
+    """标记只读查询函数，执行期间允许路由到从库"""
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        token = _read_only.set(True)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _read_only.reset(token)
+
+    return wrapper
+
+
+# -------------------------------------------------------------------------------------------
+# 读己之写
+# -------------------------------------------------------------------------------------------
+def _sticky_to_primary():
+    """当前请求是否必须读主库"""
+    if not has_request_context():
+        return False
+    if g.get("_db_sticky_primary"):
+        return True
+    return http_session.get("_db_primary_until", 0) > time.time()
+
+
+def _mark_write(db_session):
+    """提交后让本请求及随后短时间内的请求读主库"""
+    if not has_request_context() or not _replica_keys(db_session._db):
+        return
+    g._db_sticky_primary = True
+    sticky_seconds = current_app.config.get("SQLALCHEMY_REPLICA_STICKY_SECONDS", 5)
+    if sticky_seconds:
+        http_session["_db_primary_until"] = time.time() + sticky_seconds
+
+
+def _mark_transaction_write(db_session, *args):
+    """本事务已写入主库：提交或回滚之前的只读查询也走主库"""
+    db_session.info["_db_wrote"] = True
+
+
+def _mark_execute_write(orm_execute_state):
+    """session.execute(insert/update/delete) 不经过 flush，同样视为已写入"""
+    if (
+        orm_execute_state.is_insert
+        or orm_execute_state.is_update
+        or orm_execute_state.is_delete
+    ):
+        _mark_transaction_write(orm_execute_state.session)
+
+
+def _clear_transaction_write(db_session):
+    db_session.info.pop("_db_wrote", None)
+
+
+# -------------------------------------------------------------------------------------------
+# 从库延迟探测
+# -------------------------------------------------------------------------------------------
+def _default_lag_probe(conn):
+    """返回从库复制延迟（秒），复制中断时返回 None"""
+    if conn.dialect.name != "mysql":
+        return 0
+    for statement in ("SHOW REPLICA STATUS", "SHOW SLAVE STATUS"):
+        try:
+            row = conn.exec_driver_sql(statement).mappings().first()
+        except Exception:
+            continue
+        if row is None:
+            # 未配置复制（例如直接指向一个只读实例）
+            return 0
+        lag = row.get("Seconds_Behind_Source", row.get("Seconds_Behind_Master"))
+        return None if lag is None else float(lag)
+    return 0
+
+
+def _check_replica(db, key):
+    """探测从库延迟并更新健康状态缓存"""
+    config = current_app.config
+    probe = config.get("SQLALCHEMY_REPLICA_LAG_PROBE") or _default_lag_probe
+    max_lag = config.get("SQLALCHEMY_REPLICA_MAX_LAG", 5)
+    try:
+        with db.engines[key].connect() as conn:
+            lag = probe(conn)
+        healthy = lag is not None and lag <= max_lag
+    except Exception as e:
+        logger.warning(f"从库 {key} 探测失败: {e}")
+        lag, healthy = None, False
+    if not healthy:
+        logger.warning(f"从库 {key} 不可用或延迟过高 (lag={lag})，暂时回退主库")
+    _replica_health[key] = (time.monotonic(), lag, healthy)
+    return healthy
+
+
+def _replica_healthy(db, key):
+    interval = current_app.config.get("SQLALCHEMY_REPLICA_LAG_CHECK_INTERVAL", 10)
+    checked_at, _, healthy = _replica_health.get(key, (None, None, False))
+    if checked_at is None or time.monotonic() - checked_at >= interval:
+        return _check_replica(db, key)
+    return healthy
+
+
+def _replica_keys(db):
+    return [
+        key
+        for key in db.engines
+        if key is not None and key.startswith(REPLICA_BIND_PREFIX)
+    ]
+
+
+def choose_replica(db):
+    """随机选择一个健康的从库引擎，没有可用从库时返回 None"""
+    healthy = [key for key in _replica_keys(db) if _replica_healthy(db, key)]
+    return db.engines[random.choice(healthy)] if healthy else None
+
+
+def replica_status(db):
+    """
+    立即探测所有从库。
+
+    返回:
+        list: 每个从库一个字典 {"bind", "url", "lag", "healthy"}。
+    """
+    status = []
+    for key in _replica_keys(db):
+        healthy = _check_replica(db, key)
+        status.append(
+            {
+                "bind": key,
+                "url": db.engines[key].url.render_as_string(hide_password=True),
+                "lag": _replica_health[key][1],
+                "healthy": healthy,
+            }
+        )
+    return status
+
+
+# -------------------------------------------------------------------------------------------
+# 路由 Session
+# -------------------------------------------------------------------------------------------
+class RoutingSession(Session):
+    """在 @read_only 函数中把查询路由到从库的 Session"""
+
+    def _has_pending_writes(self):
+        """当前事务是否有未 flush 的改动，或已向主库写入但尚未提交"""
+        return self.info.get("_db_wrote", False) or not self._is_clean()
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (
+            bind is None
+            and not self._flushing
+            and _read_only.get()
+            and not self._has_pending_writes()
+            and not _sticky_to_primary()
+        ):
+            engine = choose_replica(self._db)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+event.listen(RoutingSession, "after_commit", _mark_write)
+event.listen(RoutingSession, "after_flush", _mark_transaction_write)
+event.listen(RoutingSession, "do_orm_execute", _mark_execute_write)
+event.listen(RoutingSession, "after_commit", _clear_transaction_write)
+event.listen(RoutingSession, "after_rollback", _clear_transaction_write)
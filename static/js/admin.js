@@ -12,7 +12,11 @@
 
     let pendingAction = null;
 
+    // 每页条数
+    const PAGE_SIZE = 50;
+
     // 统计元素
+    const statsEl = document.getElementById('admin-stats');
     const statUsers = document.getElementById('stat-users');
     const statGroups = document.getElementById('stat-groups');
     const statProjects = document.getElementById('stat-projects');
@@ -44,25 +48,17 @@
     // 加载统计数据
     async function loadStats() {
         try {
-            const [users, groups, projects] = await Promise.all([
-                fetchJson(btnUsers?.dataset.endpoint || '/api/users'),
-                fetchJson(btnGroups?.dataset.endpoint || '/api/groups'),
-                fetchJson(btnProjects?.dataset.endpoint || '/api/projects')
-            ]);
-            if(statUsers) statUsers.textContent = users.length || 0;
-            if(statGroups) statGroups.textContent = groups.length || 0;
-            if(statProjects) statProjects.textContent = projects.length || 0;
+            const stats = await fetchJson(statsEl?.dataset.endpoint || '/api/stats');
+            if(statUsers) statUsers.textContent = stats.users || 0;
+            if(statGroups) statGroups.textContent = stats.groups || 0;
+            if(statProjects) statProjects.textContent = stats.projects || 0;
         } catch (e) {
             console.error('加载统计失败:', e);
         }
     }
 
-    function renderUsers(users) {
-        if (!Array.isArray(users) || users.length === 0) {
-            resultEl.innerHTML = '<div class="p-8 text-center text-gray-500 dark:text-gray-400">暂无用户</div>';
-            return;
-        }
-        const rows = users.map(u => `
+    function userRow(u) {
+        return `
             <tr class="hover:bg-gray-50 dark:hover:bg-gray-700">
                 <td class="px-6 py-4 whitespace-nowrap text-sm font-medium text-gray-900 dark:text-white">
                     <a href="/user/${u.uid}" class="text-primary-600 hover:text-primary-900 dark:text-primary-400 dark:hover:text-primary-300">${u.uname}</a>
@@ -80,37 +76,11 @@
                     <button class="text-indigo-600 hover:text-indigo-900 dark:text-indigo-400 dark:hover:text-indigo-300" data-action="reset_password" data-id="${u.uid}">重置密码</button>
                 </td>
             </tr>
-        `).join('');
-        resultEl.innerHTML = `
-            <div class="px-4 py-5 sm:px-6 border-b border-gray-200 dark:border-gray-700">
-                <h3 class="text-lg leading-6 font-medium text-gray-900 dark:text-white">用户管理</h3>
-            </div>
-            <div class="overflow-x-auto">
-                <table class="min-w-full divide-y divide-gray-200 dark:divide-gray-700">
-                    <thead class="bg-gray-50 dark:bg-gray-700">
-                        <tr>
-                            <th scope="col" class="px-6 py-3 text-left text-xs font-medium text-gray-500 dark:text-gray-300 uppercase tracking-wider">用户名</th>
-                            <th scope="col" class="px-6 py-3 text-left text-xs font-medium text-gray-500 dark:text-gray-300 uppercase tracking-wider">邮箱</th>
-                            <th scope="col" class="px-6 py-3 text-left text-xs font-medium text-gray-500 dark:text-gray-300 uppercase tracking-wider">学号</th>
-                            <th scope="col" class="px-6 py-3 text-left text-xs font-medium text-gray-500 dark:text-gray-300 uppercase tracking-wider">Admin</th>
-                            <th scope="col" class="px-6 py-3 text-left text-xs font-medium text-gray-500 dark:text-gray-300 uppercase tracking-wider">Teacher</th>
-                            <th scope="col" class="px-6 py-3 text-left text-xs font-medium text-gray-500 dark:text-gray-300 uppercase tracking-wider">操作</th>
-                        </tr>
-                    </thead>
-                    <tbody class="bg-white dark:bg-gray-800 divide-y divide-gray-200 dark:divide-gray-700">
-                        ${rows}
-                    </tbody>
-                </table>
-            </div>
         `;
     }
 
-    function renderProjects(projects) {
-        if (!Array.isArray(projects) || projects.length === 0) {
-            resultEl.innerHTML = '<div class="p-8 text-center text-gray-500 dark:text-gray-400">暂无项目</div>';
-            return;
-        }
-        const rows = projects.map(p => `
+    function projectRow(p) {
+        return `
             <tr class="hover:bg-gray-50 dark:hover:bg-gray-700">
                 <td class="px-6 py-4 whitespace-nowrap text-sm font-medium text-gray-900 dark:text-white">
                     <a href="/project/${p.pid}" class="text-primary-600 hover:text-primary-900 dark:text-primary-400 dark:hover:text-primary-300">${p.pname}</a>
@@ -123,37 +93,11 @@
                     <button class="text-red-600 hover:text-red-900 dark:text-red-400 dark:hover:text-red-300" data-action="del_projects" data-id="${p.pid}">删除</button>
                 </td>
             </tr>
-        `).join('');
-        resultEl.innerHTML = `
-            <div class="px-4 py-5 sm:px-6 border-b border-gray-200 dark:border-gray-700">
-                <h3 class="text-lg leading-6 font-medium text-gray-900 dark:text-white">项目管理</h3>
-            </div>
-            <div class="overflow-x-auto">
-                <table class="min-w-full divide-y divide-gray-200 dark:divide-gray-700">
-                    <thead class="bg-gray-50 dark:bg-gray-700">
-                        <tr>
-                            <th scope="col" class="px-6 py-3 text-left text-xs font-medium text-gray-500 dark:text-gray-300 uppercase tracking-wider">项目名</th>
-                            <th scope="col" class="px-6 py-3 text-left text-xs font-medium text-gray-500 dark:text-gray-300 uppercase tracking-wider">简介</th>
-                            <th scope="col" class="px-6 py-3 text-left text-xs font-medium text-gray-500 dark:text-gray-300 uppercase tracking-wider">组名</th>
-                            <th scope="col" class="px-6 py-3 text-left text-xs font-medium text-gray-500 dark:text-gray-300 uppercase tracking-wider">端口</th>
-                            <th scope="col" class="px-6 py-3 text-left text-xs font-medium text-gray-500 dark:text-gray-300 uppercase tracking-wider">容器端口</th>
-                            <th scope="col" class="px-6 py-3 text-left text-xs font-medium text-gray-500 dark:text-gray-300 uppercase tracking-wider">操作</th>
-                        </tr>
-                    </thead>
-                    <tbody class="bg-white dark:bg-gray-800 divide-y divide-gray-200 dark:divide-gray-700">
-                        ${rows}
-                    </tbody>
-                </table>
-            </div>
         `;
     }
 
-    function renderGroups(groups) {
-        if (!Array.isArray(groups) || groups.length === 0) {
-            resultEl.innerHTML = '<div class="p-8 text-center text-gray-500 dark:text-gray-400">暂无工作组</div>';
-            return;
-        }
-        const rows = groups.map(g => `
+    function groupRow(g) {
+        return `
             <tr class="hover:bg-gray-50 dark:hover:bg-gray-700">
                 <td class="px-6 py-4 whitespace-nowrap text-sm font-medium text-gray-900 dark:text-white">
                     <a href="/group/${g.gid}" class="text-primary-600 hover:text-primary-900 dark:text-primary-400 dark:hover:text-primary-300">${g.gname}</a>
@@ -165,59 +109,109 @@
                     <button class="text-red-600 hover:text-red-900 dark:text-red-400 dark:hover:text-red-300" data-action="del_group" data-id="${g.gid}">删除</button>
                 </td>
             </tr>
+        `;
+    }
+
+    // 各列表的表头、行渲染与接口配置
+    const LISTS = {
+        users: {
+            title: '用户管理',
+            empty: '暂无用户',
+            headers: ['用户名', '邮箱', '学号', 'Admin', 'Teacher', '操作'],
+            row: userRow,
+            endpoint: () => btnUsers?.dataset.endpoint || '/api/users',
+        },
+        projects: {
+            title: '项目管理',
+            empty: '暂无项目',
+            headers: ['项目名', '简介', '组名', '端口', '容器端口', '操作'],
+            row: projectRow,
+            endpoint: () => btnProjects?.dataset.endpoint || '/api/projects',
+        },
+        groups: {
+            title: '工作组管理',
+            empty: '暂无工作组',
+            headers: ['组名', '简介', '成员数', '项目数', '操作'],
+            row: groupRow,
+            endpoint: () => btnGroups?.dataset.endpoint || '/api/groups',
+        },
+    };
+
+    // 当前列表的分页状态：按游标逐页拉取，新页追加到表格末尾
+    let listState = null;
+
+    function renderTableShell(list) {
+        const headers = list.headers.map(h => `
+            <th scope="col" class="px-6 py-3 text-left text-xs font-medium text-gray-500 dark:text-gray-300 uppercase tracking-wider">${h}</th>
         `).join('');
         resultEl.innerHTML = `
             <div class="px-4 py-5 sm:px-6 border-b border-gray-200 dark:border-gray-700">
-                <h3 class="text-lg leading-6 font-medium text-gray-900 dark:text-white">工作组管理</h3>
+                <h3 class="text-lg leading-6 font-medium text-gray-900 dark:text-white">${list.title}</h3>
             </div>
             <div class="overflow-x-auto">
                 <table class="min-w-full divide-y divide-gray-200 dark:divide-gray-700">
                     <thead class="bg-gray-50 dark:bg-gray-700">
-                        <tr>
-                            <th scope="col" class="px-6 py-3 text-left text-xs font-medium text-gray-500 dark:text-gray-300 uppercase tracking-wider">组名</th>
-                            <th scope="col" class="px-6 py-3 text-left text-xs font-medium text-gray-500 dark:text-gray-300 uppercase tracking-wider">简介</th>
-                            <th scope="col" class="px-6 py-3 text-left text-xs font-medium text-gray-500 dark:text-gray-300 uppercase tracking-wider">成员数</th>
-                            <th scope="col" class="px-6 py-3 text-left text-xs font-medium text-gray-500 dark:text-gray-300 uppercase tracking-wider">项目数</th>
-                            <th scope="col" class="px-6 py-3 text-left text-xs font-medium text-gray-500 dark:text-gray-300 uppercase tracking-wider">操作</th>
-                        </tr>
+                        <tr>${headers}</tr>
                     </thead>
-                    <tbody class="bg-white dark:bg-gray-800 divide-y divide-gray-200 dark:divide-gray-700">
-                        ${rows}
-                    </tbody>
+                    <tbody id="admin-rows" class="bg-white dark:bg-gray-800 divide-y divide-gray-200 dark:divide-gray-700"></tbody>
                 </table>
             </div>
+            <div class="p-4 text-center hidden" id="admin-more-wrap">
+                <button type="button" id="admin-more" class="inline-flex items-center px-4 py-2 border border-gray-300 shadow-sm text-sm font-medium rounded-md text-gray-700 bg-white hover:bg-gray-50 dark:bg-gray-700 dark:text-white dark:border-gray-600 dark:hover:bg-gray-600">
+                    加载更多
+                </button>
+            </div>
         `;
+        document.getElementById('admin-more')?.addEventListener('click', () => {
+            loadNextPage().catch(e => showFlash('加载失败：' + e.message, 'danger'));
+        });
     }
 
-    async function loadUsers() {
+    async function loadNextPage() {
+        if (!listState || listState.loading) return;
+        const state = listState;
+        const list = LISTS[state.kind];
+        const moreBtn = document.getElementById('admin-more');
+        state.loading = true;
+        if (moreBtn) moreBtn.disabled = true;
         try {
-            showLoading();
-            const data = await fetchJson(btnUsers.dataset.endpoint);
-            renderUsers(data);
-        } catch (e) {
-            resultEl.innerHTML = `<div class="p-4 text-red-600 bg-red-50 dark:bg-red-900/20 dark:text-red-400 rounded-md">加载失败：${e.message}</div>`;
+            const params = new URLSearchParams({ limit: PAGE_SIZE });
+            if (state.cursor) params.set('after', state.cursor);
+            const page = await fetchJson(`${list.endpoint()}?${params}`);
+            // 请求期间切换了列表，丢弃过期结果
+            if (listState !== state) return;
+            const items = page.items || [];
+            if (!state.rendered) {
+                if (items.length === 0) {
+                    resultEl.innerHTML = `<div class="p-8 text-center text-gray-500 dark:text-gray-400">${list.empty}</div>`;
+                    return;
+                }
+                renderTableShell(list);
+                state.rendered = true;
+            }
+            document.getElementById('admin-rows')?.insertAdjacentHTML('beforeend', items.map(list.row).join(''));
+            state.cursor = page.next_cursor;
+            document.getElementById('admin-more-wrap')?.classList.toggle('hidden', !state.cursor);
+        } finally {
+            state.loading = false;
+            const btn = document.getElementById('admin-more');
+            if (btn) btn.disabled = false;
         }
     }
 
-    async function loadProjects() {
+    async function loadList(kind) {
+        listState = { kind, cursor: null, loading: false, rendered: false };
         try {
             showLoading();
-            const data = await fetchJson(btnProjects.dataset.endpoint);
-            renderProjects(data);
+            await loadNextPage();
         } catch (e) {
             resultEl.innerHTML = `<div class="p-4 text-red-600 bg-red-50 dark:bg-red-900/20 dark:text-red-400 rounded-md">加载失败：${e.message}</div>`;
         }
     }
 
-    async function loadGroups() {
-        try {
-            showLoading();
-            const data = await fetchJson(btnGroups.dataset.endpoint);
-            renderGroups(data);
-        } catch (e) {
-            resultEl.innerHTML = `<div class="p-4 text-red-600 bg-red-50 dark:bg-red-900/20 dark:text-red-400 rounded-md">加载失败：${e.message}</div>`;
-        }
-    }
+    const loadUsers = () => loadList('users');
+    const loadProjects = () => loadList('projects');
+    const loadGroups = () => loadList('groups');
 
     function openConfirm(text, action) {
         confirmText.textContent = text;
@@ -286,11 +280,106 @@
         }
     }
 
+    // 花名册导入：上传 CSV 并展示逐行错误报告
+    const rosterForm = document.getElementById('roster-form');
+    const btnRoster = document.getElementById('btn-roster');
+
+    function renderRosterReport(report) {
+        const rows = report.errors.map(e => `
+            <tr>
+                <td class="px-6 py-3 whitespace-nowrap text-sm text-gray-500 dark:text-gray-400">${e.line}</td>
+                <td class="px-6 py-3 whitespace-nowrap text-sm text-gray-900 dark:text-white">${formatDescription(e.uname, 50)}</td>
+                <td class="px-6 py-3 text-sm text-red-600 dark:text-red-400">${formatDescription(e.error, 200)}</td>
+            </tr>
+        `).join('');
+        resultEl.innerHTML = `
+            <div class="px-6 py-4 border-b border-gray-200 dark:border-gray-700 text-sm text-gray-700 dark:text-gray-300">
+                导入完成：用户 ${report.users}，工作组 ${report.groups}，项目 ${report.projects}，错误 ${report.errors.length}
+            </div>
+            ${report.errors.length ? `
+            <table class="min-w-full divide-y divide-gray-200 dark:divide-gray-700">
+                <thead class="bg-gray-50 dark:bg-gray-700">
+                    <tr>
+                        <th class="px-6 py-3 text-left text-xs font-medium text-gray-500 dark:text-gray-300 uppercase tracking-wider">行号</th>
+                        <th class="px-6 py-3 text-left text-xs font-medium text-gray-500 dark:text-gray-300 uppercase tracking-wider">用户名</th>
+                        <th class="px-6 py-3 text-left text-xs font-medium text-gray-500 dark:text-gray-300 uppercase tracking-wider">错误</th>
+                    </tr>
+                </thead>
+                <tbody class="bg-white dark:bg-gray-800 divide-y divide-gray-200 dark:divide-gray-700">${rows}</tbody>
+            </table>` : ''}
+        `;
+    }
+
+    rosterForm?.addEventListener('submit', async (e) => {
+        e.preventDefault();
+        const token = document.querySelector('meta[name="csrf-token"]')?.content;
+        try {
+            btnRoster.disabled = true;
+            showLoading();
+            const res = await fetch(rosterForm.dataset.endpoint, {
+                method: 'POST',
+                credentials: 'same-origin',
+                headers: token ? { 'X-CSRFToken': token } : {},
+                body: new FormData(rosterForm)
+            });
+            const data = await res.json().catch(() => ({}));
+            if (!res.ok) throw new Error(data.message || data.error || '请求失败');
+            renderRosterReport(data);
+            showFlash('花名册导入完成', data.errors.length ? 'warning' : 'success');
+            await loadStats();
+        } catch (err) {
+            resultEl.innerHTML = '';
+            showFlash('导入失败：' + err.message, 'danger');
+        } finally {
+            btnRoster.disabled = false;
+        }
+    });
+
     btnCancel?.addEventListener('click', closeConfirm);
     btnOk?.addEventListener('click', () => {
         if (pendingAction) pendingAction();
     });
 
+    // 容器资源占用排行
+    const topEl = document.getElementById('top-consumers');
+    const topBody = document.getElementById('top-consumers-body');
+    const topBy = document.getElementById('top-consumers-by');
+
+    function formatBytes(value) {
+        const units = ['B', 'KB', 'MB', 'GB'];
+        let i = 0;
+        while (value >= 1024 && i < units.length - 1) { value /= 1024; i++; }
+        return `${value.toFixed(i ? 1 : 0)} ${units[i]}`;
+    }
+
+    function topRow(p) {
+        return `
+            <tr>
+                <td class="px-3 py-2"><a href="/project/${p.pid}" class="text-primary-600 hover:underline dark:text-primary-400">${formatDescription(p.pname || p.pid, 30)}</a></td>
+                <td class="px-3 py-2">${p.cpu.toFixed(1)}%</td>
+                <td class="px-3 py-2">${formatBytes(p.memory)}</td>
+                <td class="px-3 py-2">${formatBytes(p.rx)}/s / ${formatBytes(p.tx)}/s</td>
+                <td class="px-3 py-2">${formatBytes(p.read)}/s / ${formatBytes(p.write)}/s</td>
+            </tr>
+        `;
+    }
+
+    async function loadTopConsumers() {
+        if (!topEl || !topBody) return;
+        try {
+            const data = await fetchJson(`${topEl.dataset.endpoint}?by=${topBy?.value || 'cpu'}`);
+            topBody.innerHTML = data.projects.length
+                ? data.projects.map(topRow).join('')
+                : '<tr><td colspan="5" class="px-3 py-4 text-center text-gray-500 dark:text-gray-400">暂无运行中的容器数据</td></tr>';
+        } catch (e) {
+            console.error('加载资源排行失败:', e);
+        }
+    }
+
+    topBy?.addEventListener('change', loadTopConsumers);
+
     // 页面加载时获取统计数据
     loadStats();
+    loadTopConsumers();
+    if (topEl) setInterval(loadTopConsumers, 30000);
 })();
\ No newline at end of file
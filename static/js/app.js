@@ -198,6 +198,40 @@
         applyPagination(list);
     }
 
+    // 项目状态徽章：页面上所有 [data-project-status="<pid>"] 一次请求批量获取
+    const STATUS_BADGES = {
+        running: ['运行中', 'bg-green-100 text-green-800'],
+        starting: ['启动中', 'bg-yellow-100 text-yellow-800'],
+        stopped: ['已停止', 'bg-gray-100 text-gray-600'],
+    };
+    async function loadProjectStatuses(){
+        const badges = Array.from(document.querySelectorAll('[data-project-status]'));
+        if(!badges.length) return;
+        const pids = [...new Set(badges.map(el => el.getAttribute('data-project-status')))];
+        const statuses = {};
+        // 服务端单次最多 200 个
+        for(let i = 0; i < pids.length; i += 200){
+            try{
+                const query = encodeURIComponent(pids.slice(i, i + 200).join(','));
+                const res = await fetch(`/project/docker/status?pids=${query}`, {
+                    headers: { 'Accept': 'application/json' }
+                });
+                const data = await res.json().catch(()=>({}));
+                if(res.ok && data.statuses) Object.assign(statuses, data.statuses);
+            }catch(e){
+                console.error('获取项目状态失败:', e);
+            }
+        }
+        badges.forEach(el => {
+            const badge = STATUS_BADGES[statuses[el.getAttribute('data-project-status')]];
+            if(!badge) return;
+            el.textContent = badge[0];
+            el.classList.add(...badge[1].split(' '));
+            el.classList.remove('hidden');
+        });
+    }
+    loadProjectStatuses();
+
     // 基础前端校验（必填与最小长度）。使用 data-validate="required|min:6" 声明
     document.querySelectorAll('form').forEach(form => {
         form.addEventListener('submit', (e) => {
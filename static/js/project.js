@@ -272,8 +272,8 @@
 
     // ==================== Docker 状态管理 ====================
     
-    // 更新状态徽章显示和按钮状态
-    function updateStatusBadge(status) {
+    // 更新状态徽章显示和按钮状态（progress 为可选的启动进度）
+    function updateStatusBadge(status, progress) {
         const el = document.getElementById('project-status');
         if(!el) return;
         
@@ -293,8 +293,9 @@
             if(stopBtn) stopBtn.disabled = false;
             if(removeBtn) removeBtn.disabled = false;
             if(terminalBtn) terminalBtn.style.display = 'flex';
-        }else if(status === 'starting'){
-            el.textContent = '启动中';
+        }else if(status === 'starting' || status === 'building'){
+            el.textContent = status === 'building' ? '构建中' : '启动中';
+            if(progress) el.textContent += ` ${progress}%`;
             el.classList.add('badge-warning');
             // 启动中：禁用所有按钮，隐藏 WebShell
             if(startBtn) startBtn.disabled = true;
@@ -302,8 +303,8 @@
             if(removeBtn) removeBtn.disabled = true;
             if(terminalBtn) terminalBtn.style.display = 'none';
         }else{
-            el.textContent = '已停止';
-            el.classList.add('badge-secondary');
+            el.textContent = status === 'failed' ? '启动失败' : '已停止';
+            el.classList.add(status === 'failed' ? 'badge-danger' : 'badge-secondary');
             // 已停止：启用启动，禁用停止，启用删除，隐藏 WebShell
             if(startBtn) startBtn.disabled = false;
             if(stopBtn) stopBtn.disabled = true;
@@ -335,6 +336,80 @@
         return null;
     }
 
+    // ==================== 状态推送（Socket.IO /status） ====================
+    // 服务端在状态变化时推送；推送不可用时回退到 HTTP 接口
+
+    const FALLBACK_POLL_MS = 3000;      // 未连接推送时的轮询间隔
+    const PUSH_SILENCE_MS = 15000;      // 已连接但长时间无推送时的兜底检查间隔
+    const START_TIMEOUT_MS = 120000;    // 等待启动结果的最长时间
+
+    let statusSocket = null;
+    let lastPushAt = 0;
+    let startWaiter = null;
+
+    function applyStatus(data){
+        updateStatusBadge(data.status, data.progress);
+        if(startWaiter && ['running', 'stopped', 'failed'].includes(data.status)){
+            const resolve = startWaiter;
+            startWaiter = null;
+            resolve(data.status);
+        }
+    }
+
+    function subscribeStatus(pid){
+        if(typeof io === 'undefined') return false;
+        const transports = (document.querySelector('meta[name="socketio-transports"]')?.content
+            || 'websocket').split(',');
+        statusSocket = io('/status', { transports });
+        statusSocket.on('connect', () => {
+            // 每次（重新）连接都重新订阅，ack 中带回缓存的当前状态
+            statusSocket.emit('subscribe', { pid }, (ack) => {
+                if(ack && ack.status){
+                    applyStatus(ack);
+                }else{
+                    fetchProjectStatus(pid);
+                }
+            });
+        });
+        statusSocket.on('status', (data) => {
+            if(!data || data.pid !== pid) return;
+            lastPushAt = Date.now();
+            applyStatus(data);
+        });
+        statusSocket.on('connect_error', () => {
+            console.warn('状态推送连接失败，使用 HTTP 回退');
+        });
+        return true;
+    }
+
+    // 等待启动结果：优先等推送，推送不可用或长时间沉默时回退到 HTTP 查询
+    function waitForStartResult(pid){
+        return new Promise((resolve) => {
+            const deadline = Date.now() + START_TIMEOUT_MS;
+            startWaiter = resolve;
+            const connected = () => statusSocket && statusSocket.connected;
+            const check = async () => {
+                if(startWaiter !== resolve) return;
+                if(Date.now() > deadline){
+                    startWaiter = null;
+                    resolve(null);
+                    return;
+                }
+                if(!connected() || Date.now() - lastPushAt >= PUSH_SILENCE_MS){
+                    const status = await fetchProjectStatus(pid);
+                    if(status && status !== 'starting' && startWaiter === resolve){
+                        startWaiter = null;
+                        resolve(status);
+                        return;
+                    }
+                }
+                setTimeout(check, connected() ? PUSH_SILENCE_MS : FALLBACK_POLL_MS);
+            };
+            lastPushAt = Date.now();
+            setTimeout(check, connected() ? PUSH_SILENCE_MS : FALLBACK_POLL_MS);
+        });
+    }
+
     // 启动/重启项目
     window.startProject = async function(pid){
         const startBtn = document.getElementById('project-start-btn');
@@ -353,23 +428,12 @@
             if(res.status) updateStatusBadge(res.status);
             showFlash(res.message || '启动已开始', 'info');
 
-            // 轮询状态直到完成（最多2分钟）
-            const startTime = Date.now();
-            const timeout = 120000; // 2分钟
-            
-            while(Date.now() - startTime < timeout){
-                await new Promise(r => setTimeout(r, 3000)); // 每3秒检查一次
-                const status = await fetchProjectStatus(pid);
-                
-                if(status && status !== 'starting'){
-                    // 启动完成
-                    if(status === 'running'){
-                        showFlash('容器启动成功！', 'success');
-                    }else{
-                        showFlash('容器未能启动，请查看日志', 'warning');
-                    }
-                    break;
-                }
+            // 等待启动结果（最多2分钟）
+            const status = await waitForStartResult(pid);
+            if(status === 'running'){
+                showFlash('容器启动成功！', 'success');
+            }else if(status){
+                showFlash('容器未能启动，请查看日志', 'warning');
             }
         }catch(e){
             if(e.message !== '需要登录'){
@@ -436,7 +500,40 @@
     }
 
     // 页面加载时获取初始状态
+    // 资源用量折线图
+    function drawSparkline(svg, values){
+        if(!svg) return;
+        if(values.length < 2){ svg.innerHTML = ''; return; }
+        const max = Math.max(...values) || 1;
+        const step = 100 / (values.length - 1);
+        const points = values.map((v, i) => `${(i * step).toFixed(2)},${(30 - v / max * 28).toFixed(2)}`).join(' ');
+        svg.innerHTML = `<polyline fill="none" stroke="currentColor" stroke-width="1.5" vector-effect="non-scaling-stroke" points="${points}"/>`;
+    }
+
+    async function loadResourceUsage(){
+        const el = document.getElementById('resource-usage');
+        if(!el) return;
+        try{
+            const res = await fetch(`${el.dataset.endpoint}?resolution=1m`, { headers: { 'Accept': 'application/json' } });
+            if(!res.ok) return;
+            const data = await res.json();
+            const cpu = data.points.map(p => p[1]);
+            const memory = data.points.map(p => p[2]);
+            drawSparkline(document.getElementById('usage-cpu'), cpu);
+            drawSparkline(document.getElementById('usage-memory'), memory);
+            if(cpu.length){
+                document.getElementById('usage-cpu-value').textContent = `${cpu[cpu.length - 1].toFixed(1)}%`;
+                document.getElementById('usage-memory-value').textContent = `${(memory[memory.length - 1] / 1048576).toFixed(1)} MB`;
+            }
+        }catch(e){
+            console.error('获取资源用量失败:', e);
+        }
+    }
+
     document.addEventListener('DOMContentLoaded', function(){
+        loadResourceUsage();
+        if(document.getElementById('resource-usage')) setInterval(loadResourceUsage, 60000);
+
         const statusEl = document.getElementById('project-status');
         if(!statusEl) return;
         
@@ -445,7 +542,8 @@
         const pid = pathParts[pathParts.indexOf('project') + 1];
         
         if(pid && pid.length > 20){ // 简单验证是 UUID
-            fetchProjectStatus(pid);
+            // 优先订阅推送（订阅应答中带有当前状态），不可用时回退到 HTTP
+            if(!subscribeStatus(pid)) fetchProjectStatus(pid);
         }
     });
 
@@ -79,9 +79,10 @@
     }
 
     // 连接 Socket.IO
-    const socket = io('/terminal', {
-        transports: ['websocket', 'polling']
-    });
+    // 传输方式由服务端配置（多 worker 且没有粘性会话时只能用 websocket）
+    const transports = (document.querySelector('meta[name="socketio-transports"]')?.content
+        || 'websocket').split(',');
+    const socket = io('/terminal', { transports });
 
     // Socket.IO 事件处理
     socket.on('connect', function () {
@@ -0,0 +1,70 @@
+"""
+项目活动记录
+
+记录每个项目最近一次终端输入、文件上传、HTTP 访问与启动的时间，供空闲休眠判断:
+
+- project_activity["<pid>:<kind>"] = 时间戳，kind 为 terminal | upload | http | start
+
+终端输入按键触发，同一进程对同一 (项目, 类型) 至多每 WRITE_INTERVAL 秒写一次 Redis。
+项目的 HTTP 服务由宿主机端口直接对外，请求不经过本应用，因此 http 活动由休眠
+检查任务根据容器网络接收字节数的变化记录（见 utils/hibernation.py）。
+"""
+
+from utils.redis_client import SharedDict
+import threading
+import time
+
+KINDS = ("terminal", "upload", "http", "start")
+# 同一进程对同一 (项目, 类型) 的最小写入间隔（秒）
+WRITE_INTERVAL = 30
+
+project_activity = SharedDict("project_activity")
+
+_written = {}  # (pid, kind) -> 本进程上次写入的 monotonic 时间
+_lock = threading.Lock()
+
+
+def touch(pid, kind, at=None) -> None:
+    """
+    记录一次项目活动。
+
+    参数:
+        pid (str): 项目ID。
+        kind (str): terminal | upload | http | start。
+        at (float): 活动时间戳，默认为当前时间。
+    """
+    key = (str(pid), kind)
+    now = time.monotonic()
+    with _lock:
+        if at is None and now - _written.get(key, -WRITE_INTERVAL) < WRITE_INTERVAL:
+            return
+        _written[key] = now
+    project_activity[f"{pid}:{kind}"] = at or time.time()
+
+
+def activity(pid) -> dict:
+    """
+    项目各类活动的最近时间。
+
+    返回:
+        dict: {kind: 时间戳或 None}。
+    """
+    values = project_activity.get_many([f"{pid}:{kind}" for kind in KINDS])
+    return {kind: values.get(f"{pid}:{kind}") for kind in KINDS}
+
+
+def last_active(pids) -> dict:
+    """
+    批量获取项目最近一次活动的时间（一次往返）。
+
+    返回:
+        dict: {pid: 时间戳}，从未记录过活动的项目不在结果中。
+    """
+    keys = [f"{pid}:{kind}" for pid in pids for kind in KINDS]
+    result = {}
+    for key, value in project_activity.get_many(keys).items():
+        if value is None:
+            continue
+        pid = key.rpartition(":")[0]
+        result[pid] = max(result.get(pid, 0), value)
+    return result
@@ -0,0 +1,459 @@
+"""
+容器资源统计
+
+所有 worker 通过 RedisLease 选出一个采集者，每 STATS_INTERVAL 秒采集一次运行中容器的
+CPU、内存、网络与块设备 IO:
+
+- 优先直接读取 cgroup 文件（v2: cpu.stat / memory.current / io.stat；v1: cpuacct /
+  memory / blkio），网络计数读取容器内进程的 /proc/<pid>/net/dev，不经过 Docker API；
+- cgroup 不可读时（例如应用运行在没有挂载宿主机 /sys/fs/cgroup 与 /proc 的容器中）
+  对该容器回退到 Docker 的 one-shot stats。Docker API 没有一次返回所有容器统计的接口，
+  docker stats 命令本身也是每个容器一个流。
+
+采样按 1m / 5m / 1h 三种粒度求平均，写入每个项目定长的环形缓冲区。缓冲区是
+array("d")，每个槽位为 FIELDS 对应的值，槽位下标 = 桶序号 % 槽位数，不需要写指针，
+读取时按时间过滤掉已过期的槽位。缓冲区以 bytes 保存在 SharedDict 中，任意 worker
+都可以读取，采集者切换后从 Redis 中的数据继续写入。
+
+- cpu: 占用一个 CPU 核的百分比
+- memory: 字节（不含页缓存）
+- rx / tx / read / write: 每秒字节数
+"""
+
+from array import array
+from database.actions import get_project_docker_names
+from database.base import db
+from utils.docker_client import (
+    BREAKER_RESET,
+    DockerUnavailable,
+    _docker_container_usage,
+    docker_client,
+)
+from utils.redis_client import NEAR_CACHE_TTL, RedisLease, SharedDict
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ("time", "cpu", "memory", "rx", "tx", "read", "write")
+# 粒度名称 -> (桶长度秒数, 槽位数)：最近 1 小时、24 小时、7 天
+RESOLUTIONS = {"1m": (60, 60), "5m": (300, 288), "1h": (3600, 168)}
+# top consumers 支持的排序方式
+ORDERINGS = {
+    "cpu": lambda row: row["cpu"],
+    "memory": lambda row: row["memory"],
+    "network": lambda row: row["rx"] + row["tx"],
+    "io": lambda row: row["read"] + row["write"],
+}
+
+# 采样间隔（秒）
+INTERVAL = float(os.getenv("STATS_INTERVAL", 10))
+# 数据来源: auto（cgroup 优先）| cgroup | docker
+SOURCE = os.getenv("STATS_SOURCE", "auto")
+CGROUP_ROOT = os.getenv("STATS_CGROUP_ROOT", "/sys/fs/cgroup")
+PROC_ROOT = os.getenv("STATS_PROC_ROOT", "/proc")
+# 未结束的桶写回 Redis 的最长间隔（秒）
+PERSIST_INTERVAL = 300
+# 容器名到项目映射的刷新间隔（秒）
+NAME_REFRESH_INTERVAL = 60
+# 采集者租约时长（秒）
+LEASE_TTL = 30
+
+# "<pid>:<粒度>" -> 环形缓冲区 bytes
+stats_series = SharedDict("container_stats")
+# pid -> 最近一次采样（容器停止后随过期时间消失）
+stats_latest = SharedDict("container_stats_latest", near_cache_ttl=NEAR_CACHE_TTL)
+
+
+class RingBuffer:
+    """定长环形缓冲区，每个槽位 len(FIELDS) 个 double，FIELDS[0] 为桶的起始时间"""
+
+    def __init__(self, bucket: int, size: int, raw: bytes = None):
+        self.bucket = bucket
+        self.size = size
+        width = size * len(FIELDS)
+        self.data = array("d")
+        if raw and len(raw) == width * self.data.itemsize:
+            self.data.frombytes(raw)
+        else:
+            self.data = array("d", [0.0]) * width
+
+    def put(self, values) -> None:
+        """写入（或覆盖）values[0] 所在桶的槽位"""
+        start = int(values[0] // self.bucket) % self.size * len(FIELDS)
+        self.data[start : start + len(FIELDS)] = array("d", values)
+
+    def points(self, now: float = None) -> list:
+        """按时间排序的有效槽位"""
+        width = len(FIELDS)
+        oldest = (now or time.time()) - self.bucket * self.size
+        rows = [
+            self.data[i : i + width].tolist() for i in range(0, len(self.data), width)
+        ]
+        return sorted((row for row in rows if row[0] > oldest), key=lambda row: row[0])
+
+    def to_bytes(self) -> bytes:
+        return self.data.tobytes()
+
+
+# -------------------------------------------------------------------------------------------
+# 计数器读取
+# -------------------------------------------------------------------------------------------
+def _read(path):
+    with open(path) as f:
+        return f.read()
+
+
+def _key_values(text):
+    """解析 "key value" 每行一项的 cgroup 统计文件"""
+    result = {}
+    for line in text.splitlines():
+        parts = line.split()
+        if len(parts) >= 2:
+            result[parts[0]] = int(parts[1])
+    return result
+
+
+def _cgroup_dir(controller, container_id):
+    """容器的 cgroup 目录（兼容 cgroupfs 与 systemd 两种驱动），找不到时返回 None"""
+    base = f"{CGROUP_ROOT}/{controller}" if controller else CGROUP_ROOT
+    for path in (
+        f"{base}/system.slice/docker-{container_id}.scope",
+        f"{base}/docker/{container_id}",
+    ):
+        if os.path.isdir(path):
+            return path
+    return None
+
+
+def _net_counters(procs_file):
+    """读取 cgroup 中第一个进程所在网络命名空间的收发字节数（不含 lo）"""
+    pids = _read(procs_file).split()
+    rx = tx = 0
+    for line in _read(f"{PROC_ROOT}/{pids[0]}/net/dev").splitlines()[2:]:
+        iface, _, data = line.partition(":")
+        if iface.strip() == "lo":
+            continue
+        columns = data.split()
+        rx += int(columns[0])
+        tx += int(columns[8])
+    return rx, tx
+
+
+def read_cgroup(container_id: str):
+    """
+    从 cgroup 文件读取容器的累计计数。
+
+    返回:
+        dict: {"cpu_ns", "memory", "rx", "tx", "read", "write"}；不可读时返回 None。
+    """
+    try:
+        path = _cgroup_dir(None, container_id)
+        if path and os.path.exists(f"{path}/cpu.stat"):
+            cpu_ns = _key_values(_read(f"{path}/cpu.stat"))["usage_usec"] * 1000
+            memory = int(_read(f"{path}/memory.current"))
+            memory -= _key_values(_read(f"{path}/memory.stat")).get("inactive_file", 0)
+            read = write = 0
+            for line in _read(f"{path}/io.stat").splitlines():
+                for field in line.split()[1:]:
+                    key, _, value = field.partition("=")
+                    if key == "rbytes":
+                        read += int(value)
+                    elif key == "wbytes":
+                        write += int(value)
+            procs = f"{path}/cgroup.procs"
+        else:
+            cpu_dir = _cgroup_dir("cpuacct", container_id)
+            mem_dir = _cgroup_dir("memory", container_id)
+            blk_dir = _cgroup_dir("blkio", container_id)
+            if not (cpu_dir and mem_dir and blk_dir):
+                return None
+            cpu_ns = int(_read(f"{cpu_dir}/cpuacct.usage"))
+            memory = int(_read(f"{mem_dir}/memory.usage_in_bytes"))
+            memory -= _key_values(_read(f"{mem_dir}/memory.stat")).get(
+                "total_inactive_file", 0
+            )
+            read = write = 0
+            for line in _read(f"{blk_dir}/blkio.throttle.io_service_bytes").splitlines():
+                parts = line.split()
+                if len(parts) == 3 and parts[1] == "Read":
+                    read += int(parts[2])
+                elif len(parts) == 3 and parts[1] == "Write":
+                    write += int(parts[2])
+            procs = f"{mem_dir}/cgroup.procs"
+        rx, tx = _net_counters(procs)
+    except (OSError, ValueError, KeyError, IndexError):
+        return None
+    return {
+        "cpu_ns": cpu_ns,
+        "memory": max(memory, 0),
+        "rx": rx,
+        "tx": tx,
+        "read": read,
+        "write": write,
+    }
+
+
+def read_docker(container_name: str):
+    """从 Docker one-shot stats 读取容器的累计计数，失败时返回 None"""
+    usage = _docker_container_usage(container_name)
+    if not usage:
+        return None
+    return {
+        "cpu_ns": usage["cpu_usage"],
+        "memory": usage["memory"],
+        "rx": usage["rx_bytes"],
+        "tx": usage["tx_bytes"],
+        "read": usage["read_bytes"],
+        "write": usage["write_bytes"],
+    }
+
+
+# -------------------------------------------------------------------------------------------
+# 采集
+# -------------------------------------------------------------------------------------------
+class StatsCollector:
+    """每个进程一个实例；只有持有租约的进程采集"""
+
+    def __init__(self):
+        self.lease = RedisLease("container_stats_collector", ttl=LEASE_TTL)
+        self.is_leader = False
+        self._app = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self._names = {}  # docker_name -> pid
+        self._names_loaded_at = 0.0
+        self._previous = {}  # pid -> (monotonic 时间, 累计计数)
+        self._buckets = {}  # (pid, 粒度) -> [桶起始时间, 采样数, 各字段之和]
+        self._rings = {}  # (pid, 粒度) -> RingBuffer
+        self._saved_at = {}  # (pid, 粒度) -> 上次写回 Redis 的时间
+        self._dirty = set()
+        self._sources = {"cgroup": 0, "docker": 0}
+
+    def ensure_running(self, app) -> None:
+        """每个进程（gunicorn fork 之后）启动一个选主线程"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._app = app
+            self.lease = RedisLease("container_stats_collector", ttl=LEASE_TTL)
+            threading.Thread(
+                target=self._run, name="container-stats", daemon=True
+            ).start()
+
+    def _run(self) -> None:
+        while True:
+            if not self.lease.acquire():
+                self.is_leader = False
+                time.sleep(LEASE_TTL / 3)
+                continue
+            self.is_leader = True
+            # 缓冲区从 Redis 重新加载，计数差值从第二次采样开始计算
+            self._reset()
+            due = 0.0
+            while self.lease.renew():
+                if time.monotonic() >= due:
+                    due = time.monotonic() + INTERVAL
+                    try:
+                        self.collect()
+                    except DockerUnavailable as e:
+                        logger.warning(f"Docker daemon 不可用，暂停资源采集: {e}")
+                        time.sleep(BREAKER_RESET)
+                    except Exception as e:
+                        logger.warning(f"容器资源采集失败: {e}", exc_info=True)
+                time.sleep(max(min(due - time.monotonic(), LEASE_TTL / 3), 0.1))
+            self.is_leader = False
+
+    def _read(self, container_id, container_name):
+        if SOURCE != "docker":
+            counters = read_cgroup(container_id)
+            if counters is not None:
+                self._sources["cgroup"] += 1
+                return counters
+        if SOURCE != "cgroup":
+            counters = read_docker(container_name)
+            if counters is not None:
+                self._sources["docker"] += 1
+                return counters
+        return None
+
+    def _rates(self, pid, counters):
+        """由两次累计计数计算速率，第一次采样或计数回退（容器重启）时返回 None"""
+        now = time.monotonic()
+        previous = self._previous.get(pid)
+        self._previous[pid] = (now, counters)
+        if previous is None or now <= previous[0]:
+            return None
+        elapsed = now - previous[0]
+        deltas = {
+            key: counters[key] - previous[1][key]
+            for key in ("cpu_ns", "rx", "tx", "read", "write")
+        }
+        if any(value < 0 for value in deltas.values()):
+            return None
+        return {
+            "cpu": deltas["cpu_ns"] / (elapsed * 1e9) * 100,
+            "memory": counters["memory"],
+            "rx": deltas["rx"] / elapsed,
+            "tx": deltas["tx"] / elapsed,
+            "read": deltas["read"] / elapsed,
+            "write": deltas["write"] / elapsed,
+        }
+
+    def _ring(self, pid, resolution) -> RingBuffer:
+        key = (pid, resolution)
+        ring = self._rings.get(key)
+        if ring is None:
+            bucket, size = RESOLUTIONS[resolution]
+            raw = stats_series.get(f"{pid}:{resolution}")
+            ring = self._rings[key] = RingBuffer(bucket, size, raw)
+            self._saved_at[key] = time.time()
+        return ring
+
+    def _add(self, pid, now, sample) -> None:
+        """把一次采样累加到各粒度当前的桶，并更新桶的平均值"""
+        values = [sample[field] for field in FIELDS[1:]]
+        for resolution, (bucket, _) in RESOLUTIONS.items():
+            key = (pid, resolution)
+            start = now - now % bucket
+            current = self._buckets.get(key)
+            if current is None or current[0] != start:
+                if current is not None:
+                    # 上一个桶已结束，立即写回
+                    self._saved_at[key] = 0.0
+                current = self._buckets[key] = [start, 0, [0.0] * len(values)]
+            current[1] += 1
+            current[2] = [total + value for total, value in zip(current[2], values)]
+            self._ring(pid, resolution).put(
+                [start] + [total / current[1] for total in current[2]]
+            )
+            self._dirty.add(key)
+
+    def _persist(self, now) -> None:
+        mapping = {}
+        for key in list(self._dirty):
+            bucket = RESOLUTIONS[key[1]][0]
+            if now - self._saved_at.get(key, 0.0) >= min(bucket, PERSIST_INTERVAL):
+                mapping[f"{key[0]}:{key[1]}"] = self._rings[key].to_bytes()
+                self._saved_at[key] = now
+                self._dirty.discard(key)
+        if mapping:
+            stats_series.set_many(mapping)
+
+    def collect(self) -> int:
+        """
+        采集一次所有运行中容器的资源用量。
+
+        返回:
+            int: 本次得到有效采样的项目数。
+        """
+        if time.monotonic() - self._names_loaded_at >= NAME_REFRESH_INTERVAL:
+            with self._app.app_context():
+                try:
+                    self._names = get_project_docker_names()
+                finally:
+                    db.session.remove()
+            self._names_loaded_at = time.monotonic()
+        now = time.time()
+        latest, seen = {}, set()
+        containers = docker_client.containers.list(
+            sparse=True, filters={"status": "running"}
+        )
+        for container in containers:
+            for name in container.attrs.get("Names") or []:
+                name = name.lstrip("/")
+                pid = self._names.get(name)
+                if pid is None:
+                    continue
+                seen.add(pid)
+                counters = self._read(container.id, name)
+                sample = self._rates(pid, counters) if counters else None
+                if sample is not None:
+                    latest[pid] = {"time": now, **sample}
+                    self._add(pid, now, sample)
+                break
+        # 已停止的容器重新启动后计数器从零开始
+        for pid in set(self._previous) - seen:
+            self._previous.pop(pid, None)
+        self._persist(now)
+        if latest:
+            stats_latest.set_many(latest, ex=int(INTERVAL * 3))
+        return len(latest)
+
+    def stats(self) -> dict:
+        return {
+            "pid": os.getpid(),
+            "leader": self.is_leader,
+            "holder": self.lease.holder(),
+            "source": SOURCE,
+            "reads": dict(self._sources),
+        }
+
+
+collector = StatsCollector()
+
+
+# -------------------------------------------------------------------------------------------
+# 查询
+# -------------------------------------------------------------------------------------------
+def series(pid, resolution="1m"):
+    """
+    项目的资源用量时间序列。
+
+    参数:
+        pid (str): 项目ID。
+        resolution (str): 1m | 5m | 1h。
+
+    返回:
+        dict: {"resolution", "bucket", "fields", "points": [[time, cpu, memory, rx,
+              tx, read, write], ...]}；粒度无效时返回 None。
+    """
+    if resolution not in RESOLUTIONS:
+        return None
+    bucket, size = RESOLUTIONS[resolution]
+    ring = RingBuffer(bucket, size, stats_series.get(f"{pid}:{resolution}"))
+    points = [
+        [int(row[0]), round(row[1], 2)] + [int(value) for value in row[2:]]
+        for row in ring.points()
+    ]
+    return {
+        "resolution": resolution,
+        "bucket": bucket,
+        "fields": FIELDS,
+        "points": points,
+    }
+
+
+def top_consumers(by="cpu", limit=10) -> list:
+    """
+    按最近一次采样排序的资源占用最高的项目。
+
+    参数:
+        by (str): cpu | memory | network | io。
+        limit (int): 返回条数。
+
+    返回:
+        list: [{"pid", "time", "cpu", "memory", "rx", "tx", "read", "write"}, ...]。
+    """
+    key = ORDERINGS.get(by, ORDERINGS["cpu"])
+    rows = [{"pid": pid, **value} for pid, value in stats_latest.items() if value]
+    rows.sort(key=key, reverse=True)
+    return rows[:limit]
+
+
+def init_container_stats(app):
+    """在本进程收到第一个请求时启动采集者选主线程（CLI 命令不会启动）"""
+    if not app.config.get("CONTAINER_STATS", True):
+        return
+
+    @app.before_request
+    def _start_stats_collector():
+        collector.ensure_running(app)
@@ -1,20 +1,263 @@
-"""Docker 客户端封装和工具函数"""
+"""
+Docker 客户端封装和工具函数
 
+docker_client 是一个按进程懒加载的代理：第一次使用时才连接 Docker daemon，gunicorn
+preload_app 模式下 fork 出的 worker 会各自重新创建客户端，不共享父进程的连接。
+
+所有 Docker API 请求都经过熔断器与指标统计:
+
+- 单次请求超时 DOCKER_READ_TIMEOUT 秒，创建客户端时的连接探测超时 DOCKER_CONNECT_TIMEOUT 秒
+  （事件流、exec socket、镜像构建等流式请求不受读超时限制）。
+- 连续 DOCKER_BREAKER_FAILURES 次连接错误、超时或 5xx 后熔断，DOCKER_BREAKER_RESET
+  秒内的请求直接失败，之后放行一个探测请求，成功则恢复。
+- 熔断期间 _docker_container_status / _docker_containers_status 返回最后一次查询到的
+  状态。
+"""
+
+from functools import wraps
 import os
+import re
 import docker
 import logging
+import requests
 import tarfile
+import threading
+import time
 import io
 
 
 logger = logging.getLogger(__name__)
 
-# Docker client (会自动连接到本地 Docker daemon)
-try:
-    docker_client = docker.from_env()
-except Exception as e:
-    logger.error(f"无法连接到 Docker daemon: {e}", exc_info=True)
-    docker_client = None
+CONNECT_TIMEOUT = float(os.getenv("DOCKER_CONNECT_TIMEOUT", 3))
+READ_TIMEOUT = float(os.getenv("DOCKER_READ_TIMEOUT", 30))
+BREAKER_FAILURES = int(os.getenv("DOCKER_BREAKER_FAILURES", 5))
+BREAKER_RESET = float(os.getenv("DOCKER_BREAKER_RESET", 30))
+
+
+class DockerUnavailable(docker.errors.DockerException):
+    """熔断期间或无法连接 Docker daemon 时抛出"""
+
+
+class CircuitBreaker:
+    """连续失败达到阈值后打开，reset_after 秒后半开放行一个探测请求"""
+
+    def __init__(self, failures: int, reset_after: float):
+        self.failures = failures
+        self.reset_after = reset_after
+        self.state = "closed"
+        self._consecutive = 0
+        self._opened_at = 0.0
+        self._trial = False
+        self._opens = 0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open":
+                if time.monotonic() - self._opened_at < self.reset_after:
+                    return False
+                self.state = "half_open"
+                self._trial = False
+            if self._trial:
+                return False
+            self._trial = True
+            return True
+
+    def is_open(self) -> bool:
+        """熔断中且尚未到探测时间"""
+        return (
+            self.state == "open"
+            and time.monotonic() - self._opened_at < self.reset_after
+        )
+
+    def success(self) -> None:
+        with self._lock:
+            if self.state != "closed":
+                logger.info("Docker daemon 已恢复，熔断器关闭")
+            self.state = "closed"
+            self._consecutive = 0
+            self._trial = False
+
+    def failure(self) -> None:
+        with self._lock:
+            self._consecutive += 1
+            if self.state == "half_open" or self._consecutive >= self.failures:
+                if self.state != "open":
+                    self._opens += 1
+                    logger.warning(
+                        f"Docker daemon 连续失败 {self._consecutive} 次，"
+                        f"熔断 {self.reset_after:.0f} 秒"
+                    )
+                self.state = "open"
+                self._opened_at = time.monotonic()
+                self._trial = False
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self._consecutive,
+            "opens": self._opens,
+        }
+
+
+breaker = CircuitBreaker(BREAKER_FAILURES, BREAKER_RESET)
+
+# 每个操作的调用统计: op -> {"calls", "errors", "rejected", "total_ms", "max_ms"}
+_metrics = {}
+_metrics_lock = threading.Lock()
+# 资源集合后面的路径段是 ID 或名称，统计时归一化
+_RESOURCE_COLLECTIONS = {"containers", "images", "exec", "networks", "volumes"}
+_COLLECTION_ACTIONS = {"json", "create", "prune", "load", "search", "get"}
+
+
+def _operation(method: str, url: str) -> str:
+    """把请求归一化为操作名，例如 GET /containers/{id}/json"""
+    path = requests.utils.urlparse(url).path
+    parts = [part for part in path.split("/") if part]
+    if parts and re.fullmatch(r"v\d+(\.\d+)?", parts[0]):
+        parts = parts[1:]
+    for i in range(1, len(parts)):
+        if (
+            parts[i - 1] in _RESOURCE_COLLECTIONS
+            and parts[i] not in _COLLECTION_ACTIONS
+        ):
+            parts[i] = "{id}"
+    return f"{method.upper()} /{'/'.join(parts)}"
+
+
+def _record(op: str, elapsed_ms: float = 0.0, error: bool = False, rejected=False):
+    with _metrics_lock:
+        entry = _metrics.setdefault(
+            op, {"calls": 0, "errors": 0, "rejected": 0, "total_ms": 0.0, "max_ms": 0.0}
+        )
+        if rejected:
+            entry["rejected"] += 1
+            return
+        entry["calls"] += 1
+        entry["errors"] += 1 if error else 0
+        entry["total_ms"] += elapsed_ms
+        entry["max_ms"] = max(entry["max_ms"], elapsed_ms)
+
+
+def _is_daemon_error(error: Exception) -> bool:
+    """连接错误、超时与 5xx 计入熔断；404、409 等客户端错误不计入"""
+    transport_errors = (
+        requests.exceptions.ConnectionError,
+        requests.exceptions.Timeout,
+    )
+    if isinstance(error, transport_errors):
+        return True
+    return isinstance(error, docker.errors.APIError) and error.is_server_error()
+
+
+def _instrument(api):
+    """包装 APIClient.request，为每个 HTTP 请求加上熔断与耗时统计"""
+    send = api.request
+
+    @wraps(send)
+    def request(method, url, *args, **kwargs):
+        op = _operation(method, url)
+        if not breaker.allow():
+            _record(op, rejected=True)
+            raise DockerUnavailable(f"Docker daemon 不可用（熔断中）: {op}")
+        started = time.perf_counter()
+        try:
+            response = send(method, url, *args, **kwargs)
+        except Exception as e:
+            _record(op, (time.perf_counter() - started) * 1000, error=True)
+            if _is_daemon_error(e):
+                breaker.failure()
+            else:
+                breaker.success()
+            raise
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        server_error = response.status_code >= 500
+        _record(op, elapsed_ms, error=server_error)
+        if server_error:
+            breaker.failure()
+        else:
+            breaker.success()
+        return response
+
+    api.request = request
+
+
+class _LazyDockerClient:
+    """按进程懒加载的 docker.DockerClient 代理；不可用时为假值"""
+
+    def __init__(self):
+        self._client = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        client = docker.from_env(timeout=CONNECT_TIMEOUT)
+        _instrument(client.api)
+        client.ping()
+        client.api.timeout = READ_TIMEOUT
+        return client
+
+    def get(self):
+        """返回本进程的客户端；熔断中或无法连接时返回 None"""
+        if self._pid == os.getpid() and self._client is not None:
+            return None if breaker.is_open() else self._client
+        with self._lock:
+            if self._pid != os.getpid():
+                # fork 之后丢弃父进程的客户端（不关闭，连接仍属于父进程）
+                self._client, self._pid = None, os.getpid()
+            if self._client is None:
+                if not breaker.allow():
+                    return None
+                try:
+                    self._client = self._connect()
+                    breaker.success()
+                    logger.info(f"Docker 客户端已连接: pid={os.getpid()}")
+                except Exception as e:
+                    breaker.failure()
+                    logger.error(f"无法连接到 Docker daemon: {e}")
+            return self._client
+
+    def __bool__(self):
+        return self.get() is not None
+
+    def __getattr__(self, name):
+        client = self.get()
+        if client is None:
+            raise DockerUnavailable("无法连接到 Docker daemon")
+        return getattr(client, name)
+
+
+# Docker client（第一次使用时连接到本地 Docker daemon）
+docker_client = _LazyDockerClient()
+
+# 最后一次查询到的容器状态，熔断期间返回: container_name -> "running" | "stopped"
+_last_known_status = {}
+
+
+def docker_metrics() -> dict:
+    """
+    当前进程的 Docker 调用统计。
+
+    返回:
+        dict: {"pid", "breaker", "operations": {op: {"calls", "errors", "rejected",
+              "avg_ms", "max_ms"}}}。
+    """
+    with _metrics_lock:
+        operations = {
+            op: {
+                "calls": entry["calls"],
+                "errors": entry["errors"],
+                "rejected": entry["rejected"],
+                "avg_ms": round(entry["total_ms"] / entry["calls"], 2)
+                if entry["calls"]
+                else None,
+                "max_ms": round(entry["max_ms"], 2),
+            }
+            for op, entry in _metrics.items()
+        }
+    return {"pid": os.getpid(), "breaker": breaker.stats(), "operations": operations}
 
 
 def _docker_image_exists(image_name: str) -> bool:
@@ -54,24 +297,74 @@ def _docker_container_exists(container_name: str) -> bool:
 def _docker_container_status(container_name: str) -> str:
     """获取容器状态: running, stopped"""
     if not docker_client:
-        logger.debug("Docker client 未初始化")
-        return "stopped"
+        logger.debug("Docker client 不可用，返回最后已知状态")
+        return _last_known_status.get(container_name, "stopped")
     try:
         container = docker_client.containers.get(container_name)
         status = container.status  # running, exited, paused, restarting, etc.
         logger.debug(f"容器 {container_name} 状态: {status}")
-        if status == "running":
-            return "running"
-        else:
-            return "stopped"
+        status = "running" if status == "running" else "stopped"
+        _last_known_status[container_name] = status
+        return status
     except docker.errors.NotFound:
         logger.debug(f"容器 {container_name} 不存在")
+        _last_known_status.pop(container_name, None)
         return "stopped"
+    except DockerUnavailable:
+        return _last_known_status.get(container_name, "stopped")
     except Exception as e:
         logger.error(f"获取容器 {container_name} 状态失败: {e}", exc_info=True)
         return "stopped"
 
 
+def _docker_containers_status(container_names: list) -> dict:
+    """
+    批量获取容器状态（每 100 个名称一次 containers.list 调用）。
+
+    返回:
+        dict: {container_name: "running" | "stopped"}，不存在的容器不在结果中；
+              熔断期间返回最后已知的状态，其他错误返回 None。
+    """
+    if not docker_client:
+        logger.debug("Docker client 不可用，返回最后已知状态")
+        return _last_known_subset(container_names)
+    wanted = set(container_names)
+    result = {}
+    names = sorted(wanted)
+    try:
+        for i in range(0, len(names), 100):
+            # name 过滤器按正则匹配，锚定以免前缀相同的容器混入
+            patterns = [f"^/?{re.escape(name)}$" for name in names[i : i + 100]]
+            containers = docker_client.containers.list(
+                all=True, sparse=True, filters={"name": patterns}
+            )
+            for container in containers:
+                for name in container.attrs.get("Names") or []:
+                    name = name.lstrip("/")
+                    if name in wanted:
+                        running = container.attrs.get("State") == "running"
+                        result[name] = "running" if running else "stopped"
+        for name in wanted:
+            if name in result:
+                _last_known_status[name] = result[name]
+            else:
+                _last_known_status.pop(name, None)
+        return result
+    except DockerUnavailable:
+        return _last_known_subset(container_names)
+    except Exception as e:
+        logger.error(f"批量获取容器状态失败: {e}", exc_info=True)
+        return None
+
+
+def _last_known_subset(container_names: list) -> dict:
+    return {
+        name: _last_known_status[name]
+        for name in container_names
+        if name in _last_known_status
+    }
+
+
 def _docker_build_image(image_name: str, path: str = None) -> bool:
     """构建 Docker 镜像（阻塞）。成功返回 True"""
     if not docker_client:
@@ -100,6 +393,28 @@ def _docker_build_image(image_name: str, path: str = None) -> bool:
         return False
 
 
+def _container_options(
+    container_name: str,
+    host_port: int,
+    container_port: int,
+    cpu_count: int = 1,
+    mem_limit: str = "1g",
+    memswap_limit: str = "1.5g",
+    pids_limit: int = 8,
+) -> dict:
+    """创建项目容器的参数（run 与预热池的 create 共用）"""
+    return dict(
+        name=container_name,
+        ports={f"{container_port}/tcp": host_port},
+        stdin_open=True,  # 等价于 docker run -i
+        tty=True,  # 等价于 docker run -t
+        cpu_count=cpu_count,
+        mem_limit=mem_limit,
+        memswap_limit=memswap_limit,
+        pids_limit=pids_limit,
+    )
+
+
 def _docker_run_container(
     image_name: str,
     container_name: str,
@@ -117,16 +432,17 @@ def _docker_run_container(
     try:
         container = docker_client.containers.run(
             image_name,
-            name=container_name,
-            ports={f"{container_port}/tcp": host_port},
             detach=True,
-            stdin_open=True,  # 等价于 docker run -i
-            tty=True,  # 等价于 docker run -t
             remove=False,  # 不自动删除
-            cpu_count=cpu_count,
-            mem_limit=mem_limit,
-            memswap_limit=memswap_limit,
-            pids_limit=pids_limit,
+            **_container_options(
+                container_name,
+                host_port,
+                container_port,
+                cpu_count,
+                mem_limit,
+                memswap_limit,
+                pids_limit,
+            ),
         )
         logger.info(
             f"容器创建并启动成功: {container_name} (ID: {container.short_id}, 端口: {host_port}:{container_port})"
@@ -140,6 +456,43 @@ def _docker_run_container(
         return ""
 
 
+def _docker_create_container(image_name: str, container_name: str, **options) -> str:
+    """
+    创建容器但不启动（预热池使用），参数同 _docker_run_container。
+
+    返回:
+        str: 容器 ID，失败返回空字符串。
+    """
+    if not docker_client:
+        logger.warning("Docker client 未初始化，无法创建容器")
+        return ""
+    try:
+        container = docker_client.containers.create(
+            image_name, **_container_options(container_name, **options)
+        )
+        logger.info(f"容器预创建成功: {container_name} (ID: {container.short_id})")
+        return container.id
+    except docker.errors.APIError as e:
+        logger.error(f"容器预创建失败: {container_name}, 错误: {e}")
+        return ""
+    except Exception as e:
+        logger.error(f"容器预创建异常: {container_name}", exc_info=True)
+        return ""
+
+
+def _docker_container_attrs(container_name: str) -> dict:
+    """获取容器的 inspect 信息，容器不存在或查询失败时返回空字典"""
+    if not docker_client:
+        return {}
+    try:
+        return docker_client.containers.get(container_name).attrs
+    except docker.errors.NotFound:
+        return {}
+    except Exception as e:
+        logger.error(f"查询容器信息失败: {container_name}, 错误: {e}")
+        return {}
+
+
 def _docker_start_container(container_name: str) -> bool:
     """启动已存在的容器"""
     if not docker_client:
@@ -182,6 +535,91 @@ def _docker_stop_container(container_name: str) -> bool:
         return False
 
 
+def _docker_pause_container(container_name: str) -> bool:
+    """暂停容器（冻结进程，内存仍保留）"""
+    if not docker_client:
+        logger.warning("Docker client 未初始化，无法暂停容器")
+        return False
+    try:
+        docker_client.containers.get(container_name).pause()
+        logger.info(f"容器暂停成功: {container_name}")
+        return True
+    except docker.errors.NotFound:
+        logger.warning(f"容器不存在，无法暂停: {container_name}")
+        return False
+    except docker.errors.APIError as e:
+        logger.error(f"容器暂停失败: {container_name}, 错误: {e}")
+        return False
+    except Exception as e:
+        logger.error(f"容器暂停异常: {container_name}", exc_info=True)
+        return False
+
+
+def _docker_unpause_container(container_name: str) -> bool:
+    """恢复已暂停的容器"""
+    if not docker_client:
+        logger.warning("Docker client 未初始化，无法恢复容器")
+        return False
+    try:
+        docker_client.containers.get(container_name).unpause()
+        logger.info(f"容器恢复成功: {container_name}")
+        return True
+    except docker.errors.NotFound:
+        logger.warning(f"容器不存在，无法恢复: {container_name}")
+        return False
+    except docker.errors.APIError as e:
+        logger.error(f"容器恢复失败: {container_name}, 错误: {e}")
+        return False
+    except Exception as e:
+        logger.error(f"容器恢复异常: {container_name}", exc_info=True)
+        return False
+
+
+def _docker_container_usage(container_name: str) -> dict:
+    """
+    读取容器当前的资源用量（one-shot stats，不等待两次采样）。
+
+    返回:
+        dict: {"memory": 字节（不含页缓存）, "memory_limit": 字节,
+              "rx_bytes": 累计接收字节, "tx_bytes": 累计发送字节,
+              "read_bytes": 累计块设备读字节, "write_bytes": 累计块设备写字节,
+              "cpu_usage": 累计 CPU 纳秒, "system_cpu_usage": 累计系统 CPU 纳秒,
+              "online_cpus": CPU 数}；查询失败时返回空字典。
+    """
+    if not docker_client:
+        return {}
+    try:
+        stats = docker_client.api.stats(container_name, stream=False, one_shot=True)
+    except docker.errors.NotFound:
+        return {}
+    except Exception as e:
+        logger.error(f"读取容器资源用量失败: {container_name}, 错误: {e}")
+        return {}
+    memory = stats.get("memory_stats") or {}
+    # cgroup v1 为 cache，v2 为 inactive_file，与 docker stats 的计算方式一致
+    cache = (memory.get("stats") or {}).get("inactive_file")
+    if cache is None:
+        cache = (memory.get("stats") or {}).get("cache", 0)
+    networks = (stats.get("networks") or {}).values()
+    cpu = stats.get("cpu_stats") or {}
+    blkio = (stats.get("blkio_stats") or {}).get("io_service_bytes_recursive") or []
+    return {
+        "memory": max(memory.get("usage", 0) - cache, 0),
+        "memory_limit": memory.get("limit", 0),
+        "rx_bytes": sum(net.get("rx_bytes", 0) for net in networks),
+        "tx_bytes": sum(net.get("tx_bytes", 0) for net in networks),
+        "read_bytes": sum(
+            io.get("value", 0) for io in blkio if io.get("op", "").lower() == "read"
+        ),
+        "write_bytes": sum(
+            io.get("value", 0) for io in blkio if io.get("op", "").lower() == "write"
+        ),
+        "cpu_usage": (cpu.get("cpu_usage") or {}).get("total_usage", 0),
+        "system_cpu_usage": cpu.get("system_cpu_usage", 0),
+        "online_cpus": cpu.get("online_cpus") or 1,
+    }
+
+
 def _docker_remove_container(container_name: str) -> bool:
     """删除容器"""
     if not docker_client:
@@ -0,0 +1,249 @@
+"""
+Docker 事件监听：让 docker_status 与容器实际状态保持一致
+
+所有 gunicorn worker 通过 RedisLease 选出一个 leader，由它订阅 Docker 事件流
+（start / die / stop / destroy / oom / health_status）并写入共享状态:
+
+- docker_status[pid]: "running" | "stopped"（启动任务进行中时由启动路由写入 "starting"）
+- docker_events[pid]: {"status", "event", "time", "exit_code", "health", "oom"}
+
+成为 leader 时先按容器列表全量校正一次，再从校正开始的时间点订阅事件，期间发生的
+事件不会丢失。项目状态查询因此只需读取缓存，不再访问 Docker daemon。
+"""
+
+from blueprints.status import publish_status
+from database.actions import get_project_docker_names
+from database.base import db
+from utils.docker_client import BREAKER_RESET, DockerUnavailable, docker_client
+from utils.redis_client import (
+    NEAR_CACHE_TTL,
+    RedisLease,
+    SharedDict,
+    docker_status as DOCKER_STATUS,
+)
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+WATCHED_EVENTS = ["start", "die", "stop", "destroy", "oom", "health_status"]
+# leader 租约时长（秒），每 1/3 周期续期一次
+LEASE_TTL = 15
+# 事件中出现未知容器名时，至少间隔多少秒才重新加载项目映射
+NAME_REFRESH_INTERVAL = 5
+# 非 leader 判断“监听是否在工作”的本地缓存时间（秒）
+ACTIVE_CHECK_INTERVAL = 5
+
+docker_events = SharedDict("docker_events", near_cache_ttl=NEAR_CACHE_TTL)
+
+
+class DockerEventWatcher:
+    """每个进程一个实例；只有持有租约的进程真正订阅事件"""
+
+    def __init__(self):
+        self.lease = RedisLease("docker_event_watcher", ttl=LEASE_TTL)
+        self.is_leader = False
+        self._app = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._names = {}  # docker_name -> pid
+        self._names_loaded_at = 0.0
+        self._active = (0.0, False)  # (检查时间, 是否有 leader)
+        self._events = 0
+        self._reconciled_at = None
+
+    # ------------------------------------------------------------------------------
+    # 启动与选主
+    # ------------------------------------------------------------------------------
+    def ensure_running(self, app) -> None:
+        """每个进程（gunicorn fork 之后）启动一个选主线程"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._app = app
+            self.lease = RedisLease("docker_event_watcher", ttl=LEASE_TTL)
+            threading.Thread(
+                target=self._run, name="docker-event-watcher", daemon=True
+            ).start()
+
+    def _run(self) -> None:
+        while True:
+            if not self.lease.acquire():
+                time.sleep(LEASE_TTL / 3)
+                continue
+            self.is_leader = True
+            logger.info(f"Docker 事件监听由本进程负责: pid={os.getpid()}")
+            try:
+                self._lead()
+            except DockerUnavailable as e:
+                # 熔断期间等到可以探测时再重试
+                logger.warning(f"Docker daemon 不可用，暂停事件监听: {e}")
+                time.sleep(BREAKER_RESET)
+            except Exception as e:
+                logger.warning(f"Docker 事件流中断，稍后重新校正: {e}")
+                time.sleep(2)
+            if not self.lease.renew():
+                self.is_leader = False
+                logger.info("Docker 事件监听租约已失去，转为跟随者")
+
+    def _lead(self) -> None:
+        since = int(time.time())
+        self.reconcile()
+        stream = docker_client.events(
+            decode=True,
+            since=since,
+            filters={"type": "container", "event": WATCHED_EVENTS},
+        )
+        stop = threading.Event()
+        threading.Thread(
+            target=self._keep_lease,
+            args=(stop, stream),
+            name="docker-event-lease",
+            daemon=True,
+        ).start()
+        try:
+            for event in stream:
+                self._handle(event)
+        finally:
+            stop.set()
+            stream.close()
+
+    def _keep_lease(self, stop, stream) -> None:
+        while not stop.wait(LEASE_TTL / 3):
+            if not self.lease.renew():
+                logger.warning("Docker 事件监听租约续期失败，停止订阅")
+                self.is_leader = False
+                stream.close()
+                return
+
+    def is_active(self) -> bool:
+        """是否有 worker 正在监听事件（为 True 时缓存未命中即视为已停止）"""
+        if self.is_leader:
+            return True
+        checked_at, active = self._active
+        if time.monotonic() - checked_at >= ACTIVE_CHECK_INTERVAL:
+            active = self.lease.holder() is not None
+            self._active = (time.monotonic(), active)
+        return active
+
+    # ------------------------------------------------------------------------------
+    # 容器名到项目的映射
+    # ------------------------------------------------------------------------------
+    def _load_names(self) -> dict:
+        with self._app.app_context():
+            try:
+                names = get_project_docker_names()
+            finally:
+                db.session.remove()
+        self._names = names
+        self._names_loaded_at = time.monotonic()
+        return names
+
+    def _pid_for(self, name: str):
+        pid = self._names.get(name)
+        if pid is None and (
+            time.monotonic() - self._names_loaded_at >= NAME_REFRESH_INTERVAL
+        ):
+            pid = self._load_names().get(name)
+        return pid
+
+    # ------------------------------------------------------------------------------
+    # 全量校正与事件处理
+    # ------------------------------------------------------------------------------
+    def reconcile(self) -> int:
+        """
+        按 Docker 容器列表校正所有项目的状态。
+
+        返回:
+            int: 状态发生变化的项目数。
+        """
+        names = self._load_names()
+        running = set()
+        for container in docker_client.containers.list(all=True, sparse=True):
+            for name in container.attrs.get("Names") or []:
+                if container.attrs.get("State") == "running":
+                    running.add(name.lstrip("/"))
+        pids = list(names.values())
+        current = DOCKER_STATUS.get_many(pids)
+        now = time.time()
+        statuses, details = {}, {}
+        for name, pid in names.items():
+            status = "running" if name in running else "stopped"
+            # 启动任务仍在构建镜像时没有容器，保留 "starting"
+            if current.get(pid) == "starting" and status == "stopped":
+                continue
+            if current.get(pid) != status:
+                statuses[pid] = status
+                details[pid] = {"status": status, "event": "reconcile", "time": now}
+        if statuses:
+            DOCKER_STATUS.set_many(statuses)
+            docker_events.set_many(details)
+            for pid, status in statuses.items():
+                publish_status(pid, status)
+        self._reconciled_at = now
+        logger.info(f"Docker 状态校正完成: 项目 {len(names)} 个, 变化 {len(statuses)} 个")
+        return len(statuses)
+
+    def _handle(self, event: dict) -> None:
+        action = event.get("Action") or event.get("status") or ""
+        attributes = (event.get("Actor") or {}).get("Attributes") or {}
+        pid = self._pid_for(attributes.get("name", ""))
+        if pid is None:
+            return
+        self._events += 1
+        timestamp = event.get("timeNano", 0) / 1e9 or event.get("time") or time.time()
+        detail = docker_events.get(pid) or {}
+        detail.update({"event": action, "time": timestamp})
+        status = None
+        if action == "start":
+            status = "running"
+            detail.update({"exit_code": None, "oom": False, "health": None})
+        elif action in ("die", "stop"):
+            status = "stopped"
+            if "exitCode" in attributes:
+                detail["exit_code"] = int(attributes["exitCode"])
+        elif action == "destroy":
+            status = "stopped"
+            detail["health"] = None
+        elif action == "oom":
+            detail["oom"] = True
+        elif action.startswith("health_status"):
+            detail["health"] = action.partition(":")[2].strip() or None
+        if status is not None:
+            detail["status"] = status
+            DOCKER_STATUS[pid] = status
+        docker_events[pid] = detail
+        publish_status(
+            pid,
+            detail.get("status") or status or "stopped",
+            exit_code=detail.get("exit_code"),
+            health=detail.get("health"),
+            oom=detail.get("oom", False),
+        )
+
+    def stats(self) -> dict:
+        return {
+            "pid": os.getpid(),
+            "leader": self.is_leader,
+            "holder": self.lease.holder(),
+            "events": self._events,
+            "reconciled_at": self._reconciled_at,
+        }
+
+
+watcher = DockerEventWatcher()
+
+
+def init_docker_watcher(app):
+    """在本进程收到第一个请求时启动选主线程（CLI 命令不会启动）"""
+    if not app.config.get("DOCKER_EVENT_WATCHER", True):
+        return
+
+    @app.before_request
+    def _start_docker_watcher():
+        watcher.ensure_running(app)
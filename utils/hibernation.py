@@ -0,0 +1,285 @@
+"""
+空闲容器休眠
+
+所有 worker 通过 RedisLease 选出一个检查者，每 HIBERNATE_CHECK_INTERVAL 秒检查一次
+运行中的容器：最近一次活动（utils/activity.py）距今超过所在工作组的 idle_timeout
+（未设置时使用 HIBERNATE_IDLE_MINUTES，0 表示不休眠）时提交 hibernate 生命周期任务。
+
+- stop（默认）: 停止容器，释放全部内存；下次启动时重新运行容器进程
+- pause: 冻结容器进程，只释放 CPU，内存仍被占用；恢复几乎没有延迟
+
+休眠中的容器记录在 hibernated[pid] = {"mode", "memory", "since", "idle_minutes"}，
+memory 为休眠前的内存用量。下次打开终端、上传文件或点击启动时通过生命周期任务自动
+恢复（paused 容器 unpause，stopped 容器 start）；检查者发现容器重新运行或已删除时
+清除记录。hibernation:metrics 累计休眠次数、恢复次数与释放的内存。
+"""
+
+from database.actions import get_project_idle_timeouts
+from database.base import db
+from utils import activity, lifecycle
+from utils.docker_client import (
+    BREAKER_RESET,
+    DockerUnavailable,
+    _docker_container_attrs,
+    _docker_container_usage,
+    _docker_pause_container,
+    _docker_stop_container,
+    docker_client,
+)
+from utils.redis_client import RedisClient, RedisLease, SharedDict
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# 工作组未设置 idle_timeout 时的默认空闲分钟数，0 表示不休眠
+DEFAULT_IDLE_MINUTES = int(os.getenv("HIBERNATE_IDLE_MINUTES", 0))
+# 休眠方式: stop | pause
+MODE = os.getenv("HIBERNATE_MODE", "stop")
+# 检查间隔（秒）
+CHECK_INTERVAL = float(os.getenv("HIBERNATE_CHECK_INTERVAL", 60))
+# 打开终端时等待容器恢复的最长时间（秒）
+RESUME_TIMEOUT = 60
+# 两次检查之间网络接收超过该字节数视为有 HTTP 访问
+RX_ACTIVITY_BYTES = 1024
+# 检查者租约时长（秒）
+LEASE_TTL = 30
+
+METRICS_KEY = "hibernation:metrics"
+
+hibernated = SharedDict("hibernated")
+
+
+def _incr(**counts) -> None:
+    client = RedisClient()
+    if not client.is_available():
+        return
+    try:
+        pipe = client.client.pipeline(transaction=False)
+        for field, amount in counts.items():
+            pipe.hincrby(METRICS_KEY, field, int(amount))
+        pipe.execute()
+    except Exception as e:
+        client.report_failure(e)
+
+
+def _hibernate(ctx):
+    """hibernate 生命周期任务：再次确认空闲后暂停或停止容器"""
+    params = ctx.params
+    container_name = params["container_name"]
+    ctx.check()
+    # 入队之后有新的活动则放弃
+    if activity.last_active([ctx.pid]).get(ctx.pid, 0) > params["idle_since"]:
+        return
+    if (_docker_container_attrs(container_name).get("State") or {}).get(
+        "Status"
+    ) != "running":
+        return
+    if params["mode"] == "pause":
+        done = _docker_pause_container(container_name)
+    else:
+        done = _docker_stop_container(container_name)
+    if not done:
+        raise lifecycle.JobFailed("容器休眠失败", retry=True)
+    memory = params.get("memory") or 0
+    hibernated[ctx.pid] = {
+        "mode": params["mode"],
+        "memory": memory,
+        "since": time.time(),
+        "idle_minutes": params["idle_minutes"],
+    }
+    # pause 不释放内存，只计入休眠次数
+    _incr(hibernations=1, reclaimed_bytes=memory if params["mode"] == "stop" else 0)
+    ctx.set_status("stopped", message="空闲休眠，打开终端或启动时自动恢复")
+    logger.info(
+        f"容器已休眠: container={container_name}, pid={ctx.pid}, mode={params['mode']}"
+    )
+
+
+lifecycle.register_action("hibernate", _hibernate)
+
+
+def resume(project, config, timeout=RESUME_TIMEOUT) -> bool:
+    """
+    项目容器处于休眠时提交启动任务并等待恢复。
+
+    参数:
+        project (Project): 项目对象。
+        config (dict): 应用配置。
+        timeout (float): 最长等待时间（秒）。
+
+    返回:
+        bool: 容器是否已恢复运行；不在休眠中时返回 False。
+    """
+    pid = str(project.pid)
+    if hibernated.get(pid) is None:
+        return False
+    params = lifecycle.start_params(project, config)
+    if params is None:
+        return False
+    logger.info(f"恢复休眠容器: project={project.pname}, pid={pid}")
+    job, _ = lifecycle.enqueue("start", pid, params)
+    job = lifecycle.wait_for(job["id"], timeout=timeout)
+    return bool(job) and job["status"] == "succeeded"
+
+
+class HibernationReaper:
+    """每个进程一个实例；只有持有租约的进程执行检查"""
+
+    def __init__(self):
+        self.lease = RedisLease("hibernation_reaper", ttl=LEASE_TTL)
+        self.is_leader = False
+        self._app = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._rx = {}  # pid -> 上次检查时的网络接收字节数
+
+    def ensure_running(self, app) -> None:
+        """每个进程（gunicorn fork 之后）启动一个选主线程"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._app = app
+            self.lease = RedisLease("hibernation_reaper", ttl=LEASE_TTL)
+            self._rx = {}
+            threading.Thread(
+                target=self._run, name="hibernation-reaper", daemon=True
+            ).start()
+
+    def _run(self) -> None:
+        while True:
+            if not self.lease.acquire():
+                self.is_leader = False
+                time.sleep(LEASE_TTL / 3)
+                continue
+            self.is_leader = True
+            due = 0.0
+            while self.lease.renew():
+                if time.monotonic() >= due:
+                    try:
+                        self.sweep()
+                    except DockerUnavailable as e:
+                        logger.warning(f"Docker daemon 不可用，跳过空闲检查: {e}")
+                        time.sleep(BREAKER_RESET)
+                    except Exception as e:
+                        logger.warning(f"空闲容器检查失败: {e}", exc_info=True)
+                    due = time.monotonic() + CHECK_INTERVAL
+                time.sleep(min(LEASE_TTL / 3, CHECK_INTERVAL))
+            self.is_leader = False
+
+    def sweep(self) -> int:
+        """
+        检查一次所有容器，为空闲超时的容器提交休眠任务。
+
+        返回:
+            int: 本次提交的休眠任务数。
+        """
+        with self._app.app_context():
+            try:
+                projects = get_project_idle_timeouts()
+            finally:
+                db.session.remove()
+        names = {name: pid for pid, (name, _) in projects.items()}
+        states = {}
+        for container in docker_client.containers.list(all=True, sparse=True):
+            for name in container.attrs.get("Names") or []:
+                pid = names.get(name.lstrip("/"))
+                if pid is not None:
+                    states[pid] = container.attrs.get("State")
+
+        # 已恢复运行或已删除的容器清除休眠记录
+        for pid, _ in hibernated.items():
+            state = states.get(pid)
+            if state is None:
+                hibernated.pop(pid, None)
+            elif state == "running":
+                hibernated.pop(pid, None)
+                _incr(resumes=1)
+
+        running = [pid for pid, state in states.items() if state == "running"]
+        last = activity.last_active(running)
+        now = time.time()
+        submitted = 0
+        for pid in running:
+            container_name, idle_timeout = projects[pid]
+            minutes = DEFAULT_IDLE_MINUTES if idle_timeout is None else idle_timeout
+            if minutes <= 0:
+                continue
+            usage = _docker_container_usage(container_name)
+            rx_bytes, previous = usage.get("rx_bytes"), self._rx.get(pid)
+            self._rx[pid] = rx_bytes
+            if rx_bytes is not None and previous is not None:
+                if rx_bytes - previous >= RX_ACTIVITY_BYTES:
+                    activity.touch(pid, "http", at=now)
+                    continue
+            seen = last.get(pid)
+            if seen is None:
+                # 第一次看到该容器（例如在本功能上线前启动），从现在开始计时
+                activity.touch(pid, "start", at=now)
+                continue
+            if now - seen < minutes * 60:
+                continue
+            params = {
+                "container_name": container_name,
+                "mode": MODE,
+                "memory": usage.get("memory", 0),
+                "idle_since": seen,
+                "idle_minutes": minutes,
+            }
+            _, created = lifecycle.enqueue("hibernate", pid, params)
+            submitted += created
+        if submitted:
+            logger.info(f"提交 {submitted} 个空闲容器休眠任务")
+        return submitted
+
+
+reaper = HibernationReaper()
+
+
+def hibernation_stats() -> dict:
+    """
+    休眠状态与释放的内存（管理员仪表盘使用）。
+
+    返回:
+        dict: {"mode", "default_idle_minutes", "hibernated", "paused",
+              "reclaimed_bytes", "held_bytes", "totals": {"hibernations",
+              "resumes", "reclaimed_bytes"}, "leader"}。
+              reclaimed_bytes 为当前已停止的休眠容器休眠前的内存用量之和，
+              held_bytes 为暂停中的容器仍占用的内存。
+    """
+    entries = [entry for _, entry in hibernated.items() if entry]
+    result = {
+        "mode": MODE,
+        "default_idle_minutes": DEFAULT_IDLE_MINUTES,
+        "hibernated": len(entries),
+        "paused": sum(1 for entry in entries if entry.get("mode") == "pause"),
+        "reclaimed_bytes": sum(
+            entry.get("memory", 0) for entry in entries if entry.get("mode") == "stop"
+        ),
+        "held_bytes": sum(
+            entry.get("memory", 0) for entry in entries if entry.get("mode") == "pause"
+        ),
+        "totals": {"hibernations": 0, "resumes": 0, "reclaimed_bytes": 0},
+        "leader": reaper.lease.holder(),
+    }
+    client = RedisClient()
+    if client.is_available():
+        try:
+            totals = client.client.hgetall(METRICS_KEY)
+            result["totals"].update({key: int(value) for key, value in totals.items()})
+        except Exception as e:
+            client.report_failure(e)
+    return result
+
+
+def init_hibernation(app):
+    """在本进程收到第一个请求时启动检查者选主线程（CLI 命令不会启动）"""
+
+    @app.before_request
+    def _start_hibernation_reaper():
+        reaper.ensure_running(app)
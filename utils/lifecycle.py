@@ -0,0 +1,779 @@
+"""
+容器生命周期任务队列（start / stop / remove / rebuild 等）
+
+任务保存在 Redis 中，worker 被回收或重启后不会丢失:
+
+- lifecycle:job:<id>     任务 hash（pid、action、params、status、attempts、error ...）
+- lifecycle:queue        待执行队列（LPUSH 入队，BRPOPLPUSH 取出）
+- lifecycle:processing   已取出、正在执行的任务
+- lifecycle:delayed      等待重试的任务（score 为可执行时间）
+- lifecycle:pending      "<pid>:<action>" -> 任务ID，同一项目的同一操作只排队一次
+
+所有 worker 通过 RedisLease 选出一个执行者，用有界线程池（LIFECYCLE_CONCURRENCY）
+执行任务，因此全局并发有上限。同一项目的任务通过 lifecycle:lock:<pid>（SET NX PX）
+互斥，每次加锁从 lifecycle:fence:<pid> 取得递增的 fencing token；任务每一步写状态或
+调用 Docker 之前都会校验锁仍属于自己，锁被接管后立即停止，不会与新的执行者交错执行。
+
+执行者成为 leader 时把 processing 中锁已失效的任务重新入队（原执行者已退出）；
+队列空闲时为预热池补充预创建的容器（prewarm 任务，见 utils/warm_pool.py）。
+Redis 不可用时任务在本进程的有界线程池中执行，状态只保存在内存中。
+"""
+
+from blueprints.status import publish_status
+from database.actions import get_startable_projects
+from database.base import db
+from utils import activity, warm_pool
+from utils.docker_client import (
+    DockerUnavailable,
+    _docker_build_image,
+    _docker_container_attrs,
+    _docker_container_exists,
+    _docker_create_container,
+    _docker_image_exists,
+    _docker_remove_container,
+    _docker_run_container,
+    _docker_start_container,
+    _docker_stop_container,
+    _docker_unpause_container,
+)
+from utils.redis_client import RedisClient, RedisLease, docker_status as DOCKER_STATUS
+from utils.worker_channel import worker_id
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# 全局同时执行的任务数上限
+CONCURRENCY = int(os.getenv("LIFECYCLE_CONCURRENCY", 4))
+# 失败后最多尝试次数（含第一次），重试间隔 2^n 秒
+MAX_ATTEMPTS = int(os.getenv("LIFECYCLE_MAX_ATTEMPTS", 3))
+# 项目锁时长（秒），执行期间每 1/3 周期续期
+LOCK_TTL = 30
+# 执行者租约时长（秒）
+LEASE_TTL = 15
+# 已结束任务的保留时间（秒）
+JOB_TTL = 24 * 3600
+
+QUEUE_KEY = "lifecycle:queue"
+PROCESSING_KEY = "lifecycle:processing"
+DELAYED_KEY = "lifecycle:delayed"
+PENDING_KEY = "lifecycle:pending"
+
+FINISHED = ("succeeded", "failed")
+
+
+def _job_key(job_id):
+    return f"lifecycle:job:{job_id}"
+
+
+def _lock_key(pid):
+    return f"lifecycle:lock:{pid}"
+
+
+def _fence_key(pid):
+    return f"lifecycle:fence:{pid}"
+
+
+# 同一项目同一操作已有未结束的任务时返回其ID，否则创建任务并入队
+_ENQUEUE_SCRIPT = """
+local existing = redis.call('HGET', KEYS[1], ARGV[1])
+if existing and redis.call('EXISTS', ARGV[3] .. existing) == 1 then
+    return {existing, 0}
+end
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+redis.call('HSET', KEYS[2], unpack(ARGV, 5))
+redis.call('EXPIRE', KEYS[2], ARGV[4])
+redis.call('LPUSH', KEYS[3], ARGV[2])
+return {ARGV[2], 1}
+"""
+
+# 项目锁空闲时加锁并返回新的 fencing token，否则返回 0
+_LOCK_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return 0
+end
+local token = redis.call('INCR', KEYS[2])
+redis.call('SET', KEYS[1], ARGV[1] .. ':' .. token, 'PX', ARGV[2])
+return token
+"""
+
+_RENEW_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+_UNLOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# 把到期的重试任务移回队列
+_PROMOTE_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, 100)
+for _, job_id in ipairs(due) do
+    redis.call('ZREM', KEYS[1], job_id)
+    redis.call('LPUSH', KEYS[2], job_id)
+end
+return #due
+"""
+
+
+class JobFailed(Exception):
+    """任务失败；retry 为 True 时按退避重试"""
+
+    def __init__(self, message, retry=False):
+        super().__init__(message)
+        self.retry = retry
+
+
+class JobFenced(Exception):
+    """项目锁已过期或被其他任务接管"""
+
+
+# -------------------------------------------------------------------------------------------
+# 状态写入
+# -------------------------------------------------------------------------------------------
+def set_docker_status(pid, status, phase=None, progress=None, message=None):
+    """
+    更新共享的容器状态并推送给订阅该项目的页面。
+
+    参数:
+        pid (str): 项目ID。
+        status (str): 保存的状态 starting | running | stopped。
+        phase (str): 推送的阶段，默认与 status 相同（building / failed 只用于推送）。
+        progress (int): 启动进度百分比。
+        message (str): 提示信息。
+    """
+    DOCKER_STATUS[pid] = status
+    publish_status(pid, phase or status, progress=progress, message=message)
+
+
+class JobContext:
+    """传给操作函数的执行上下文，每一步之前校验项目锁"""
+
+    def __init__(self, job, lock_value=None):
+        self.job = job
+        self.pid = job["pid"]
+        self.params = job["params"]
+        self.lock_value = lock_value
+        self.lost = threading.Event()
+
+    def check(self):
+        if self.lost.is_set():
+            raise JobFenced(f"项目锁已失去: pid={self.pid}")
+        if self.lock_value is None:
+            return
+        if RedisClient().client.get(_lock_key(self.pid)) != self.lock_value:
+            self.lost.set()
+            raise JobFenced(f"项目锁已被接管: pid={self.pid}")
+
+    def set_status(self, status, phase=None, progress=None, message=None):
+        self.check()
+        set_docker_status(self.pid, status, phase, progress, message)
+
+
+# -------------------------------------------------------------------------------------------
+# 操作
+# -------------------------------------------------------------------------------------------
+def start_params(project, config):
+    """
+    生成启动任务参数（入队时确定，执行时不再读取数据库与应用配置）。
+
+    参数:
+        project (Project): 项目对象。
+        config (dict): 应用配置。
+
+    返回:
+        dict: 任务参数；端口未配置时返回 None。
+    """
+    try:
+        host_port = int(project.port) if project.port else None
+        container_port = int(project.docker_port) if project.docker_port else None
+    except Exception:
+        host_port = None
+        container_port = None
+    if not host_port or not container_port:
+        return None
+    return {
+        "pname": project.pname,
+        "container_name": project.docker_name,
+        "image_name": config.get("IMAGE_NAME"),
+        "working_dir": config.get("WORKING_DIR"),
+        "host_port": host_port,
+        "container_port": container_port,
+        "cpu_count": config.get("CPU_COUNT", 1),
+        "mem_limit": config.get("MEM_LIMIT", "1g"),
+        "memswap_limit": config.get("MEMSWAP_LIMIT", "1.5g"),
+        "pids_limit": config.get("PIDS_LIMIT", 8),
+    }
+
+
+def _container_options(params):
+    return {
+        key: params[key]
+        for key in (
+            "host_port",
+            "container_port",
+            "cpu_count",
+            "mem_limit",
+            "memswap_limit",
+            "pids_limit",
+        )
+    }
+
+
+def _ensure_image(ctx, quiet=False):
+    """镜像不存在时构建；quiet 为 True 时不推送构建进度（预热任务）"""
+    image_name = ctx.params["image_name"]
+    if not _docker_image_exists(image_name):
+        logger.info(f"镜像不存在，开始构建: image={image_name}, pid={ctx.pid}")
+        if not quiet:
+            ctx.set_status("starting", "building", progress=20, message="正在构建镜像")
+        if not _docker_build_image(image_name, path=ctx.params["working_dir"]):
+            raise JobFailed("镜像构建失败", retry=True)
+    ctx.check()
+
+
+def _start(ctx):
+    params = ctx.params
+    container_name = params["container_name"]
+    ctx.set_status("starting", progress=5, message="启动已开始")
+    # 命中预热池时容器已按当前配置创建好，跳过镜像检查与创建
+    warm = warm_pool.claim(ctx.pid, params)
+    if not warm:
+        _ensure_image(ctx)
+    attrs = {} if warm else _docker_container_attrs(container_name)
+    if (attrs.get("State") or {}).get("Status") == "paused":
+        # 以 pause 方式休眠的容器
+        ctx.set_status("starting", progress=60, message="正在唤醒容器")
+        if not _docker_unpause_container(container_name):
+            raise JobFailed("容器唤醒失败", retry=True)
+    elif warm or attrs:
+        ctx.set_status("starting", progress=60, message="正在启动容器")
+        if not _docker_start_container(container_name):
+            raise JobFailed("容器启动失败", retry=True)
+    else:
+        ctx.set_status("starting", progress=60, message="正在创建容器")
+        container_id = _docker_run_container(
+            params["image_name"], container_name, **_container_options(params)
+        )
+        if not container_id:
+            raise JobFailed("容器创建失败", retry=True)
+    ctx.set_status("running", progress=100)
+    activity.touch(ctx.pid, "start", at=time.time())
+    warm_pool.record_start(warm, time.time() - ctx.job["created_at"])
+    logger.info(f"容器启动成功: container={container_name}, pid={ctx.pid}, warm={warm}")
+
+
+def _stop(ctx):
+    container_name = ctx.params["container_name"]
+    ctx.check()
+    if not _docker_container_exists(container_name):
+        raise JobFailed("容器不存在")
+    if not _docker_stop_container(container_name):
+        raise JobFailed("停止容器失败", retry=True)
+    ctx.set_status("stopped")
+
+
+def _remove(ctx, missing_ok=False):
+    container_name = ctx.params["container_name"]
+    ctx.check()
+    if not _docker_container_exists(container_name):
+        if missing_ok:
+            return
+        raise JobFailed("容器不存在")
+    if not _docker_remove_container(container_name):
+        raise JobFailed("删除容器失败", retry=True)
+    ctx.check()
+    warm_pool.discard(ctx.pid)
+    DOCKER_STATUS.pop(ctx.pid, None)
+    publish_status(ctx.pid, "stopped", message="容器已删除")
+
+
+def _rebuild(ctx):
+    """删除并按当前配置重新创建容器"""
+    _remove(ctx, missing_ok=True)
+    _start(ctx)
+
+
+def _prewarm(ctx):
+    """为预热池预创建容器（不启动，不推送状态）"""
+    params = ctx.params
+    container_name = params["container_name"]
+    ctx.check()
+    if _docker_container_exists(container_name):
+        return
+    _ensure_image(ctx, quiet=True)
+    if not _docker_create_container(
+        params["image_name"], container_name, **_container_options(params)
+    ):
+        raise JobFailed("预热容器创建失败")
+    warm_pool.add(ctx.pid, container_name)
+
+
+_HANDLERS = {
+    "start": _start,
+    "stop": _stop,
+    "remove": _remove,
+    "rebuild": _rebuild,
+    "prewarm": _prewarm,
+}
+
+
+def register_action(action, handler):
+    """
+    注册其他模块提供的生命周期操作（如 utils/hibernation.py 的 hibernate）。
+
+    参数:
+        action (str): 操作名称。
+        handler (callable): 接收 JobContext 的执行函数，失败时抛出 JobFailed。
+    """
+    _HANDLERS[action] = handler
+
+
+def _on_failed(job, error):
+    """任务最终失败后的状态处理"""
+    if job["action"] in ("start", "rebuild"):
+        set_docker_status(job["pid"], "stopped", "failed", message=error)
+
+
+# -------------------------------------------------------------------------------------------
+# 任务存取
+# -------------------------------------------------------------------------------------------
+# Redis 不可用时的内存任务表与执行器
+_local_jobs = OrderedDict()
+_local_locks = {}
+_local_lock = threading.Lock()
+_local_pool = None
+
+
+def _encode_job(job):
+    return {
+        key: json.dumps(value) if key == "params" else str(value)
+        for key, value in job.items()
+        if value is not None
+    }
+
+
+def _decode_job(data):
+    if not data:
+        return None
+    job = dict(data)
+    job["params"] = json.loads(job.get("params") or "{}")
+    job["attempts"] = int(job.get("attempts", 0))
+    for key in ("created_at", "updated_at"):
+        if key in job:
+            job[key] = float(job[key])
+    return job
+
+
+def get_job(job_id):
+    """
+    获取任务。
+
+    返回:
+        dict: 任务字典，不存在时返回 None。
+    """
+    client = RedisClient()
+    if client.is_available():
+        try:
+            return _decode_job(client.client.hgetall(_job_key(job_id)))
+        except Exception as e:
+            client.report_failure(e)
+            logger.error(f"读取任务 {job_id} 失败: {e}")
+    return _local_jobs.get(job_id)
+
+
+def _update_job(job_id, **fields):
+    fields["updated_at"] = time.time()
+    client = RedisClient()
+    if client.is_available():
+        client.client.hset(_job_key(job_id), mapping=_encode_job(fields))
+        return
+    job = _local_jobs.get(job_id)
+    if job is not None:
+        job.update(fields)
+
+
+def enqueue(action, pid, params):
+    """
+    提交生命周期任务；同一项目的同一操作已在排队或执行时返回已有任务。
+
+    参数:
+        action (str): start | stop | remove | rebuild | prewarm，或 register_action 注册的操作。
+        pid (str): 项目ID。
+        params (dict): 执行所需的参数（容器名、端口、资源限制等，入队时确定）。
+
+    返回:
+        tuple: (任务字典, 是否新建)。
+    """
+    if action not in _HANDLERS:
+        raise ValueError(f"未知的生命周期操作: {action}")
+    now = time.time()
+    job = {
+        "id": uuid.uuid4().hex,
+        "pid": str(pid),
+        "action": action,
+        "params": params,
+        "status": "queued",
+        "attempts": 0,
+        "created_at": now,
+        "updated_at": now,
+    }
+    client = RedisClient()
+    if client.is_available():
+        try:
+            fields = []
+            for key, value in _encode_job(job).items():
+                fields += [key, value]
+            job_id, created = client.client.eval(
+                _ENQUEUE_SCRIPT,
+                3,
+                PENDING_KEY,
+                _job_key(job["id"]),
+                QUEUE_KEY,
+                f"{pid}:{action}",
+                job["id"],
+                _job_key(""),
+                JOB_TTL,
+                *fields,
+            )
+            if created:
+                logger.info(f"生命周期任务已入队: {action} pid={pid} job={job_id}")
+                return job, True
+            return get_job(job_id) or job, False
+        except Exception as e:
+            client.report_failure(e)
+            logger.error(f"任务入队失败，改为本地执行: {e}")
+    return _enqueue_local(job)
+
+
+def _enqueue_local(job):
+    global _local_pool
+    with _local_lock:
+        for existing in _local_jobs.values():
+            if (
+                existing["pid"] == job["pid"]
+                and existing["action"] == job["action"]
+                and existing["status"] not in FINISHED
+            ):
+                return existing, False
+        _local_jobs[job["id"]] = job
+        while len(_local_jobs) > 1000:
+            _local_jobs.popitem(last=False)
+        if _local_pool is None:
+            _local_pool = ThreadPoolExecutor(
+                max_workers=CONCURRENCY, thread_name_prefix="lifecycle"
+            )
+    _local_pool.submit(_run_local, job)
+    return job, True
+
+
+def _run_local(job):
+    with _local_lock:
+        lock = _local_locks.setdefault(job["pid"], threading.Lock())
+    with lock:
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            _update_job(job["id"], status="running", attempts=attempt)
+            try:
+                _HANDLERS[job["action"]](JobContext(job))
+                _update_job(job["id"], status="succeeded", error=None)
+                return
+            except Exception as e:
+                retry = getattr(e, "retry", not isinstance(e, JobFailed))
+                if retry and attempt < MAX_ATTEMPTS:
+                    time.sleep(2**attempt)
+                    continue
+                logger.error(f"生命周期任务失败: {job['action']} pid={job['pid']}: {e}")
+                _update_job(job["id"], status="failed", error=str(e))
+                _on_failed(job, str(e))
+                return
+
+
+def wait_for(job_id, timeout=30.0, interval=0.2):
+    """
+    等待任务结束。
+
+    返回:
+        dict: 任务字典（超时返回最后一次读取的状态）；任务不存在时返回 None。
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        job = get_job(job_id)
+        if job is None or job["status"] in FINISHED or time.monotonic() >= deadline:
+            return job
+        time.sleep(interval)
+
+
+# -------------------------------------------------------------------------------------------
+# 执行者
+# -------------------------------------------------------------------------------------------
+class LifecycleExecutor:
+    """每个进程一个实例；只有持有租约的进程从队列取任务"""
+
+    def __init__(self):
+        self.lease = RedisLease("lifecycle_executor", ttl=LEASE_TTL)
+        self.is_leader = False
+        self._app = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(CONCURRENCY)
+        self._inflight = set()
+        self._refilled_at = 0.0
+
+    def ensure_running(self, app) -> None:
+        """每个进程（gunicorn fork 之后）启动一个选主线程"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._app = app
+            self.lease = RedisLease("lifecycle_executor", ttl=LEASE_TTL)
+            self._slots = threading.BoundedSemaphore(CONCURRENCY)
+            self._inflight = set()
+            threading.Thread(
+                target=self._run, name="lifecycle-executor", daemon=True
+            ).start()
+
+    def _run(self) -> None:
+        client = RedisClient()
+        while True:
+            # Redis 不可用时任务走本地执行，不需要选主
+            if not client.is_available() or not self.lease.acquire():
+                self.is_leader = False
+                time.sleep(LEASE_TTL / 3)
+                continue
+            self.is_leader = True
+            logger.info(f"生命周期任务由本进程执行: pid={os.getpid()}")
+            try:
+                self._dispatch(client.client)
+            except Exception as e:
+                client.report_failure(e)
+                logger.warning(f"生命周期任务分发中断: {e}")
+                time.sleep(1)
+            self.is_leader = False
+
+    def _dispatch(self, redis) -> None:
+        renewed_at = 0.0
+        while True:
+            if time.monotonic() - renewed_at >= LEASE_TTL / 3:
+                if not self.lease.renew():
+                    logger.info("生命周期执行者租约已失去")
+                    return
+                self.recover(redis)
+                renewed_at = time.monotonic()
+            redis.eval(_PROMOTE_SCRIPT, 2, DELAYED_KEY, QUEUE_KEY, time.time())
+            if not self._slots.acquire(timeout=1):
+                continue
+            try:
+                job_id = redis.brpoplpush(QUEUE_KEY, PROCESSING_KEY, timeout=1)
+            except Exception:
+                self._slots.release()
+                raise
+            if not job_id:
+                self._slots.release()
+                self._refill_warm_pool()
+                continue
+            self._inflight.add(job_id)
+            threading.Thread(
+                target=self._execute, args=(redis, job_id), daemon=True
+            ).start()
+
+    def _refill_warm_pool(self) -> None:
+        """队列空闲且没有执行中的任务时为预热池提交 prewarm 任务"""
+        if self._inflight or not warm_pool.enabled():
+            return
+        if time.monotonic() - self._refilled_at < warm_pool.REFILL_INTERVAL:
+            return
+        self._refilled_at = time.monotonic()
+        try:
+            vacancies = warm_pool.vacancies()
+            if not vacancies:
+                return
+            with self._app.app_context():
+                try:
+                    projects = get_startable_projects()
+                    picked = warm_pool.pick(projects, vacancies)
+                    for project in picked:
+                        params = start_params(project, self._app.config)
+                        enqueue("prewarm", str(project.pid), params)
+                finally:
+                    db.session.remove()
+            if picked:
+                logger.info(f"预热池补充 {len(picked)} 个容器")
+        except Exception as e:
+            logger.warning(f"预热池补充失败: {e}")
+
+    def recover(self, redis) -> int:
+        """
+        将 processing 中已失去项目锁的任务重新入队（原执行者已退出）。
+
+        返回:
+            int: 重新入队的任务数。
+        """
+        recovered = 0
+        for job_id in redis.lrange(PROCESSING_KEY, 0, -1):
+            if job_id in self._inflight:
+                continue
+            job = get_job(job_id)
+            if job is None or job["status"] in FINISHED:
+                redis.lrem(PROCESSING_KEY, 0, job_id)
+                continue
+            holder = redis.get(_lock_key(job["pid"])) or ""
+            if holder.startswith(f"{job_id}:"):
+                continue  # 原执行者仍持有锁
+            pipe = redis.pipeline()
+            pipe.lrem(PROCESSING_KEY, 0, job_id)
+            pipe.lpush(QUEUE_KEY, job_id)
+            pipe.execute()
+            _update_job(job_id, status="queued")
+            recovered += 1
+        if recovered:
+            logger.warning(f"重新入队 {recovered} 个中断的生命周期任务")
+        return recovered
+
+    def _execute(self, redis, job_id) -> None:
+        try:
+            self._run_job(redis, job_id)
+        except Exception as e:
+            logger.error(f"执行生命周期任务 {job_id} 异常: {e}", exc_info=True)
+        finally:
+            self._inflight.discard(job_id)
+            self._slots.release()
+
+    def _requeue(self, redis, job_id, delay=0.0) -> None:
+        pipe = redis.pipeline()
+        pipe.lrem(PROCESSING_KEY, 0, job_id)
+        if delay:
+            pipe.zadd(DELAYED_KEY, {job_id: time.time() + delay})
+        else:
+            pipe.lpush(QUEUE_KEY, job_id)
+        pipe.execute()
+
+    def _finish(self, redis, job, status, error=None) -> None:
+        _update_job(job["id"], status=status, error=error)
+        pipe = redis.pipeline()
+        pipe.expire(_job_key(job["id"]), JOB_TTL)
+        pipe.lrem(PROCESSING_KEY, 0, job["id"])
+        pipe.hdel(PENDING_KEY, f"{job['pid']}:{job['action']}")
+        pipe.execute()
+
+    def _run_job(self, redis, job_id) -> None:
+        job = get_job(job_id)
+        if job is None or job["status"] in FINISHED:
+            redis.lrem(PROCESSING_KEY, 0, job_id)
+            return
+        pid = job["pid"]
+        token = redis.eval(
+            _LOCK_SCRIPT,
+            2,
+            _lock_key(pid),
+            _fence_key(pid),
+            job_id,
+            LOCK_TTL * 1000,
+        )
+        if not token:
+            # 同一项目的其他任务正在执行，稍后再试
+            self._requeue(redis, job_id, delay=1)
+            return
+
+        lock_value = f"{job_id}:{token}"
+        ctx = JobContext(job, lock_value)
+        attempts = job["attempts"] + 1
+        _update_job(
+            job_id, status="running", attempts=attempts, fence=token, worker=worker_id()
+        )
+        stop = threading.Event()
+        threading.Thread(
+            target=self._keep_lock, args=(redis, ctx, stop), daemon=True
+        ).start()
+        try:
+            _HANDLERS[job["action"]](ctx)
+            self._finish(redis, job, "succeeded")
+            logger.info(f"生命周期任务完成: {job['action']} pid={pid} fence={token}")
+        except JobFenced as e:
+            # 锁已被接管，由新的持有者负责，本任务不再写任何状态
+            logger.warning(f"生命周期任务被接管，停止执行: job={job_id}: {e}")
+        except Exception as e:
+            retry = getattr(e, "retry", True) or isinstance(e, DockerUnavailable)
+            if retry and attempts < MAX_ATTEMPTS:
+                delay = 2**attempts
+                logger.warning(
+                    f"生命周期任务失败，{delay} 秒后重试: {job['action']} pid={pid}: {e}"
+                )
+                _update_job(job_id, status="queued", error=str(e))
+                self._requeue(redis, job_id, delay=delay)
+            else:
+                logger.error(f"生命周期任务失败: {job['action']} pid={pid}: {e}")
+                self._finish(redis, job, "failed", str(e))
+                _on_failed(job, str(e))
+        finally:
+            stop.set()
+            redis.eval(_UNLOCK_SCRIPT, 1, _lock_key(pid), lock_value)
+
+    def _keep_lock(self, redis, ctx, stop) -> None:
+        while not stop.wait(LOCK_TTL / 3):
+            try:
+                renewed = redis.eval(
+                    _RENEW_LOCK_SCRIPT,
+                    1,
+                    _lock_key(ctx.pid),
+                    ctx.lock_value,
+                    LOCK_TTL * 1000,
+                )
+            except Exception as e:
+                logger.warning(f"项目锁续期失败: pid={ctx.pid}: {e}")
+                continue
+            if not renewed:
+                ctx.lost.set()
+                return
+
+    def stats(self) -> dict:
+        """队列长度与执行者信息"""
+        client = RedisClient()
+        result = {
+            "pid": os.getpid(),
+            "leader": self.is_leader,
+            "holder": self.lease.holder(),
+            "inflight": len(self._inflight),
+            "concurrency": CONCURRENCY,
+            "warm_pool": warm_pool.stats(),
+        }
+        if client.is_available():
+            try:
+                pipe = client.client.pipeline(transaction=False)
+                pipe.llen(QUEUE_KEY)
+                pipe.llen(PROCESSING_KEY)
+                pipe.zcard(DELAYED_KEY)
+                queued, processing, delayed = pipe.execute()
+                result.update(queued=queued, processing=processing, delayed=delayed)
+            except Exception as e:
+                client.report_failure(e)
+        else:
+            result["local_jobs"] = sum(
+                1 for job in _local_jobs.values() if job["status"] not in FINISHED
+            )
+        return result
+
+
+executor = LifecycleExecutor()
+
+
+def init_lifecycle(app):
+    """在本进程收到第一个请求时启动执行者选主线程（CLI 命令不会启动）"""
+
+    @app.before_request
+    def _start_lifecycle_executor():
+        executor.ensure_running(app)
@@ -0,0 +1,270 @@
+"""
+项目宿主机端口分配
+
+Redis 位图 ports:reserved 记录端口范围（PORT_RANGE）内已被占用的端口，第 N 位对应
+端口 N（整个 0-65535 范围共 8 KB）。占用来源:
+
+- projects.port 列中已分配给项目的端口
+- 宿主机上正在监听的 TCP 端口（读取 PORTS_PROC_ROOT/1/net/tcp 与 tcp6）
+
+分配时在 Lua 脚本中用 BITPOS 找到第一个空闲位并置 1，多个 worker 同时分配不会拿到
+同一个端口；指定端口时用 SETBIT 的返回值判断是否已被占用。删除项目后释放端口。
+
+位图每 SEED_INTERVAL 秒由第一个分配端口的进程从数据库和宿主机监听端口合并一次
+（只置位，不清除），宿主机上已退出的进程留下的占用位通过 flask reseed-ports 重建。
+Redis 不可用时按数据库与宿主机监听端口逐个查找，跨进程的冲突由 projects.port
+的唯一约束兜底。
+"""
+
+from database.actions import get_project_ports
+from utils.redis_client import RedisClient
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+# 项目宿主机端口范围（与 ProjectForm.validate_port 一致）
+PORT_RANGE = (10000, 65535)
+# 合并数据库与宿主机监听端口的间隔（秒）
+SEED_INTERVAL = int(os.getenv("PORTS_SEED_INTERVAL", 600))
+# 宿主机 /proc 挂载位置；读取 1 号进程所在网络命名空间的监听端口
+PROC_ROOT = os.getenv("PORTS_PROC_ROOT", "/proc")
+
+BITMAP_KEY = "ports:reserved"
+SEEDED_KEY = "ports:seeded"
+
+# 取出 ARGV[3] 个空闲端口并置位；端口范围首尾所在字节中范围外的位先置 1，
+# 按字节范围查找时不会落在范围外，同时保证位图覆盖整个范围
+_RESERVE_SCRIPT = """
+local first, last = tonumber(ARGV[1]), tonumber(ARGV[2])
+for bit = first - first % 8, first - 1 do
+    redis.call('SETBIT', KEYS[1], bit, 1)
+end
+for bit = last + 1, last - last % 8 + 7 do
+    redis.call('SETBIT', KEYS[1], bit, 1)
+end
+redis.call('SETBIT', KEYS[1], last, redis.call('GETBIT', KEYS[1], last))
+local first_byte, last_byte = math.floor(first / 8), math.floor(last / 8)
+local ports = {}
+for i = 1, tonumber(ARGV[3]) do
+    local port = redis.call('BITPOS', KEYS[1], 0, first_byte, last_byte)
+    if port < 0 then
+        break
+    end
+    redis.call('SETBIT', KEYS[1], port, 1)
+    ports[i] = port
+end
+return ports
+"""
+
+# Redis 不可用时本进程已分配、尚未写入数据库的端口
+_local_reserved = set()
+_local_lock = threading.Lock()
+
+
+def _in_range(port) -> bool:
+    return PORT_RANGE[0] <= port <= PORT_RANGE[1]
+
+
+def _listening_ports() -> set:
+    """宿主机上处于 LISTEN 状态的 TCP 端口"""
+    ports = set()
+    for name in ("tcp", "tcp6"):
+        try:
+            with open(f"{PROC_ROOT}/1/net/{name}") as f:
+                next(f, None)
+                for line in f:
+                    fields = line.split()
+                    if len(fields) > 3 and fields[3] == "0A":
+                        ports.add(int(fields[1].rsplit(":", 1)[1], 16))
+        except (OSError, ValueError) as e:
+            logger.debug(f"读取监听端口失败: {name}, {e}")
+    return ports
+
+
+def _used_ports() -> set:
+    ports = set(get_project_ports()) | _listening_ports()
+    return {port for port in ports if _in_range(port)}
+
+
+def seed(replace=False) -> int:
+    """
+    把数据库中的项目端口与宿主机监听端口写入位图。
+
+    参数:
+        replace (bool): 为 True 时先清空位图（清除已失效的占用位），否则只合并置位。
+
+    返回:
+        int: 写入的端口数；Redis 不可用时返回 0。
+    """
+    client = RedisClient()
+    if not client.is_available():
+        return 0
+    ports = _used_ports()
+    try:
+        pipe = client.client.pipeline(transaction=replace)
+        if replace:
+            pipe.delete(BITMAP_KEY)
+        for port in ports:
+            pipe.setbit(BITMAP_KEY, port, 1)
+        pipe.set(SEEDED_KEY, 1, ex=SEED_INTERVAL)
+        pipe.execute()
+    except Exception as e:
+        client.report_failure(e)
+        return 0
+    logger.info(f"端口位图已{'重建' if replace else '合并'}: {len(ports)} 个端口已占用")
+    return len(ports)
+
+
+def _ensure_seeded(client) -> None:
+    """每 SEED_INTERVAL 秒只有一个进程执行合并"""
+    if client.client.set(SEEDED_KEY, 1, nx=True, ex=SEED_INTERVAL):
+        seed()
+
+
+def _fallback_allocate(count) -> list:
+    with _local_lock:
+        used = _used_ports() | _local_reserved
+        ports = []
+        for port in range(PORT_RANGE[0], PORT_RANGE[1] + 1):
+            if len(ports) == count:
+                break
+            if port not in used:
+                ports.append(port)
+        _local_reserved.update(ports)
+        return ports
+
+
+def allocate_many(count) -> list:
+    """
+    分配 count 个空闲端口。
+
+    参数:
+        count (int): 端口数。
+
+    返回:
+        list: 已预留的端口；可用端口不足时少于 count 个。
+    """
+    if count <= 0:
+        return []
+    client = RedisClient()
+    if client.is_available():
+        try:
+            _ensure_seeded(client)
+            ports = client.client.eval(
+                _RESERVE_SCRIPT, 1, BITMAP_KEY, PORT_RANGE[0], PORT_RANGE[1], count
+            )
+            return [int(port) for port in ports]
+        except Exception as e:
+            client.report_failure(e)
+    return _fallback_allocate(count)
+
+
+def allocate():
+    """
+    分配一个空闲端口。
+
+    返回:
+        int: 已预留的端口；没有可用端口时返回 None。
+    """
+    ports = allocate_many(1)
+    return ports[0] if ports else None
+
+
+def claim(port) -> bool:
+    """
+    预留指定端口。
+
+    参数:
+        port (int): 端口号。
+
+    返回:
+        bool: 预留成功返回 True；端口不在范围内或已被占用返回 False。
+    """
+    port = int(port)
+    if not _in_range(port):
+        return False
+    client = RedisClient()
+    if client.is_available():
+        try:
+            _ensure_seeded(client)
+            return client.client.setbit(BITMAP_KEY, port, 1) == 0
+        except Exception as e:
+            client.report_failure(e)
+    with _local_lock:
+        if port in _local_reserved or port in _listening_ports():
+            return False
+        _local_reserved.add(port)
+        return True
+
+
+def release(port) -> None:
+    """
+    释放端口（删除项目、修改端口或创建项目失败时调用）。
+
+    参数:
+        port (int): 端口号，为 None 时忽略。
+    """
+    if port is None or not _in_range(int(port)):
+        return
+    port = int(port)
+    with _local_lock:
+        _local_reserved.discard(port)
+    client = RedisClient()
+    if not client.is_available():
+        return
+    try:
+        client.client.setbit(BITMAP_KEY, port, 0)
+    except Exception as e:
+        client.report_failure(e)
+
+
+def is_reserved(port) -> bool:
+    """
+    端口是否已被项目或宿主机进程占用。
+
+    参数:
+        port (int): 端口号。
+
+    返回:
+        bool: 已占用返回 True。
+    """
+    port = int(port)
+    client = RedisClient()
+    if client.is_available():
+        try:
+            _ensure_seeded(client)
+            return bool(client.client.getbit(BITMAP_KEY, port))
+        except Exception as e:
+            client.report_failure(e)
+    return port in _local_reserved or port in _listening_ports()
+
+
+def port_stats() -> dict:
+    """
+    端口范围的占用情况。
+
+    返回:
+        dict: {"range", "reserved", "free"}；Redis 不可用时 reserved 为 None。
+    """
+    total = PORT_RANGE[1] - PORT_RANGE[0] + 1
+    result = {"range": list(PORT_RANGE), "reserved": None, "free": None}
+    client = RedisClient()
+    if not client.is_available():
+        return result
+    try:
+        pipe = client.client.pipeline(transaction=False)
+        pipe.bitcount(BITMAP_KEY, PORT_RANGE[0] // 8, PORT_RANGE[1] // 8)
+        for bit in range(PORT_RANGE[0] - PORT_RANGE[0] % 8, PORT_RANGE[0]):
+            pipe.getbit(BITMAP_KEY, bit)
+        for bit in range(PORT_RANGE[1] + 1, PORT_RANGE[1] - PORT_RANGE[1] % 8 + 8):
+            pipe.getbit(BITMAP_KEY, bit)
+        counts = pipe.execute()
+    except Exception as e:
+        client.report_failure(e)
+        return result
+    # 减去首尾字节中范围外的位
+    reserved = counts[0] - sum(counts[1:])
+    result.update(reserved=reserved, free=total - reserved)
+    return result
@@ -1,16 +1,27 @@
 """Redis 客户端封装，用于跨 worker 共享数据"""
 
+from utils.shared_codec import get_codec
 import redis
 import json
 import logging
 import os
+import threading
+import time
+from collections import OrderedDict
 from typing import Any, Optional
 
 logger = logging.getLogger(__name__)
 
 
 class RedisClient:
-    """Redis 客户端单例"""
+    """
+    Redis 客户端单例
+
+    每个 worker 进程为 SharedDict（REDIS_DB）与 Flask-Session（REDIS_SESSION_DB）各维护
+    一个有上限的阻塞连接池（两者所在的库和解码方式不同，无法共用同一个池）。
+    连接出错时切换到内存字典并启动后台重连线程，Redis 恢复后切回，并按各命名空间的
+    策略回放或丢弃降级期间的写入。
+    """
 
     _instance = None
     _redis_client = None
@@ -21,123 +32,929 @@ class RedisClient:
         return cls._instance
 
     def __init__(self):
-        if self._redis_client is None:
-            try:
-                self._redis_client = redis.Redis(
-                    host=os.getenv("REDIS_HOST", "localhost"),
-                    port=int(os.getenv("REDIS_PORT", 6379)),
-                    db=int(os.getenv("REDIS_DB", 0)),
-                    password=os.getenv("REDIS_PASSWORD", None),
-                    decode_responses=True,  # 自动解码为字符串
-                    socket_connect_timeout=5,
-                    socket_timeout=5,
-                )
-                # 测试连接
-                self._redis_client.ping()
-                logger.info("Redis 连接成功")
-            except Exception as e:
-                logger.warning(f"Redis 连接失败，将使用内存字典: {e}")
-                self._redis_client = None
+        if self._redis_client is not None:
+            return
+        self._available = False
+        self._reconnect_pid = None
+        self._lock = threading.Lock()
+        self._failback_hooks = []
+        self._failures = 0
+        self._failbacks = 0
+        self._last_error = None
+        self._pool = self._make_pool(int(os.getenv("REDIS_DB", 0)), True)
+        self._session_pool = self._make_pool(
+            int(os.getenv("REDIS_SESSION_DB", 1)), False  # Flask-Session 需要 bytes
+        )
+        self._redis_client = redis.Redis(connection_pool=self._pool)
+        self._session_client = redis.Redis(connection_pool=self._session_pool)
+        try:
+            # 测试连接
+            self._redis_client.ping()
+            self._available = True
+            logger.info("Redis 连接成功")
+        except Exception as e:
+            logger.warning(f"Redis 连接失败，将使用内存字典并在后台重连: {e}")
+            self._last_error = str(e)
+            self._ensure_reconnect()
+
+    @staticmethod
+    def _make_pool(db: int, decode_responses: bool):
+        return redis.BlockingConnectionPool(
+            host=os.getenv("REDIS_HOST", "localhost"),
+            port=int(os.getenv("REDIS_PORT", 6379)),
+            db=db,
+            password=os.getenv("REDIS_PASSWORD", None),
+            decode_responses=decode_responses,  # 自动解码为字符串
+            socket_connect_timeout=5,
+            socket_timeout=5,
+            socket_keepalive=True,
+            health_check_interval=30,  # 空闲超过 30 秒的连接使用前先 PING
+            max_connections=int(os.getenv("REDIS_MAX_CONNECTIONS", 20)),
+            timeout=5,  # 连接池耗尽时最多等待 5 秒
+        )
 
     @property
     def client(self):
         return self._redis_client
 
+    @property
+    def session_client(self):
+        """Flask-Session 使用的客户端（REDIS_SESSION_DB，不解码响应）"""
+        return self._session_client
+
     def is_available(self) -> bool:
         """检查 Redis 是否可用"""
-        return self._redis_client is not None
+        if not self._available:
+            self._ensure_reconnect()
+        return self._available
+
+    def add_failback_hook(self, hook) -> None:
+        """注册 Redis 恢复后的回调（SharedDict 用来回放或丢弃降级期间的写入）"""
+        self._failback_hooks.append(hook)
+
+    def report_failure(self, error: Exception) -> None:
+        """操作出错时调用；连接类错误会切换到降级模式并启动重连"""
+        if not isinstance(error, (redis.ConnectionError, redis.TimeoutError)):
+            return
+        with self._lock:
+            if not self._available:
+                return
+            self._available = False
+            self._failures += 1
+            self._last_error = str(error)
+        logger.warning(f"Redis 连接中断，切换到内存字典: {error}")
+        self._ensure_reconnect()
+
+    def _ensure_reconnect(self) -> None:
+        """每个进程（gunicorn fork 之后）至多一个重连线程"""
+        with self._lock:
+            if self._reconnect_pid == os.getpid():
+                return
+            self._reconnect_pid = os.getpid()
+        threading.Thread(
+            target=self._reconnect_loop, name="redis-reconnect", daemon=True
+        ).start()
+
+    def _reconnect_loop(self) -> None:
+        interval = float(os.getenv("REDIS_RECONNECT_INTERVAL", 2))
+        while True:
+            time.sleep(interval)
+            try:
+                self._redis_client.ping()
+            except Exception as e:
+                self._last_error = str(e)
+                continue
+            break
+        # 先取出各命名空间降级期间的写入（纯内存操作，不会切换协程），再切回 Redis，
+        # 最后回放；切回之后的新写入直接进入 Redis
+        replays = []
+        for hook in self._failback_hooks:
+            try:
+                replays.append(hook())
+            except Exception as e:
+                logger.error(f"Redis 恢复后处理降级数据失败: {e}", exc_info=True)
+        with self._lock:
+            self._available = True
+            self._failbacks += 1
+            self._reconnect_pid = None
+        logger.info("Redis 已恢复，切回共享存储")
+        for replay in replays:
+            if replay is None:
+                continue
+            try:
+                replay()
+            except Exception as e:
+                logger.error(f"回放降级期间的写入失败: {e}", exc_info=True)
+
+    @staticmethod
+    def _pool_stats(pool) -> dict:
+        try:
+            created = len(pool._connections)
+            idle = sum(1 for conn in list(pool.pool.queue) if conn is not None)
+        except Exception:
+            created = idle = None
+        return {
+            "max_connections": pool.max_connections,
+            "created": created,
+            "idle": idle,
+            "in_use": None if created is None else created - idle,
+        }
+
+    def stats(self) -> dict:
+        """连接池占用与故障切换统计"""
+        return {
+            "available": self._available,
+            "failures": self._failures,
+            "failbacks": self._failbacks,
+            "last_error": self._last_error,
+            "pool": self._pool_stats(self._pool),
+            "session_pool": self._pool_stats(self._session_pool),
+        }
+
+
+# 持有者一致时续期；键已过期则重新占有；否则返回 0
+_RENEW_LEASE_SCRIPT = """
+local holder = redis.call('GET', KEYS[1])
+if holder == ARGV[1] then
+    redis.call('PEXPIRE', KEYS[1], ARGV[2])
+    return 1
+end
+if not holder then
+    redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+    return 1
+end
+return 0
+"""
+
+# 仅持有者可以释放
+_RELEASE_LEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class RedisLease:
+    """
+    基于 SET NX PX 的租约，用于在多个 gunicorn worker 中选出唯一的执行者。
+
+    持有者需在 ttl 内调用 renew() 续期，进程退出或卡住时租约自动过期，由其他 worker
+    接管。Redis 不可用时每个 worker 都视为持有者（降级期间各 worker 只能看到自己的
+    内存字典，各自执行是正确的），Redis 恢复后 renew() 会让多余的持有者退出。
+    """
+
+    def __init__(self, name: str, ttl: float = 15):
+        self.key = f"lease:{name}"
+        self.ttl = ttl
+        self.token = f"{os.getpid()}:{os.urandom(8).hex()}"
+        self.redis_client = RedisClient()
+
+    def acquire(self) -> bool:
+        """尝试占有租约"""
+        if not self.redis_client.is_available():
+            return True
+        try:
+            return bool(
+                self.redis_client.client.set(
+                    self.key, self.token, nx=True, px=int(self.ttl * 1000)
+                )
+                or self.renew()
+            )
+        except Exception as e:
+            self.redis_client.report_failure(e)
+            logger.error(f"占有租约 {self.key} 失败: {e}")
+            return not self.redis_client.is_available()
+
+    def renew(self) -> bool:
+        """续期，返回是否仍是持有者"""
+        if not self.redis_client.is_available():
+            return True
+        try:
+            return bool(
+                self.redis_client.client.eval(
+                    _RENEW_LEASE_SCRIPT, 1, self.key, self.token, int(self.ttl * 1000)
+                )
+            )
+        except Exception as e:
+            self.redis_client.report_failure(e)
+            logger.error(f"续期租约 {self.key} 失败: {e}")
+            return not self.redis_client.is_available()
+
+    def release(self) -> None:
+        if not self.redis_client.is_available():
+            return
+        try:
+            self.redis_client.client.eval(
+                _RELEASE_LEASE_SCRIPT, 1, self.key, self.token
+            )
+        except Exception as e:
+            self.redis_client.report_failure(e)
+            logger.error(f"释放租约 {self.key} 失败: {e}")
+
+    def holder(self) -> Optional[str]:
+        """当前持有者标识，无人持有或 Redis 不可用时返回 None"""
+        if not self.redis_client.is_available():
+            return None
+        try:
+            return self.redis_client.client.get(self.key)
+        except Exception as e:
+            self.redis_client.report_failure(e)
+            return None
+
+
+# 近端缓存失效通知频道
+INVALIDATION_CHANNEL = "shared:invalidate"
+# 近端缓存中表示“Redis 中不存在该键”的占位值
+_MISSING = object()
+
+
+class NearCache:
+    """每个 worker 进程内的有界 TTL LRU 缓存，位于 Redis 之前"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (过期时间, 值)
+        self._lock = threading.Lock()
+        # 每收到一次失效通知加一，读取 Redis 期间发生过失效时不回填旧值
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Any:
+        """返回缓存值；未命中返回 None，缓存的“不存在”返回 _MISSING"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: str, value: Any, generation: int, ttl: Optional[float] = None):
+        with self._lock:
+            if generation != self.generation:
+                return
+            ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+            if ttl <= 0:
+                return
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, keys=None) -> None:
+        """删除指定键，keys 为 None 时清空"""
+        with self._lock:
+            self.generation += 1
+            if keys is None:
+                self._data.clear()
+            else:
+                for key in keys:
+                    self._data.pop(key, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else None,
+                "evictions": self.evictions,
+            }
+
+
+class _Invalidator:
+    """订阅失效通知频道，把其他 worker 的写入同步到本进程的近端缓存"""
+
+    def __init__(self):
+        self._caches = {}  # namespace -> NearCache
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def register(self, namespace: str, cache: NearCache) -> None:
+        self._caches[namespace] = cache
+
+    def ensure_running(self, client) -> None:
+        """每个进程（gunicorn fork 之后）启动一个订阅线程"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            threading.Thread(
+                target=self._listen,
+                args=(client,),
+                name="shared-dict-invalidator",
+                daemon=True,
+            ).start()
+
+    def _clear_all(self) -> None:
+        for cache in self._caches.values():
+            cache.invalidate()
+
+    def _handle(self, data: str) -> None:
+        try:
+            message = json.loads(data)
+        except (json.JSONDecodeError, TypeError):
+            return
+        cache = self._caches.get(message.get("n"))
+        if cache is not None:
+            cache.invalidate(message.get("k"))
+
+    def _listen(self, client) -> None:
+        while True:
+            pubsub = None
+            try:
+                pubsub = client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(INVALIDATION_CHANNEL)
+                # 订阅建立之前的通知可能已经丢失，清空一次
+                self._clear_all()
+                while True:
+                    message = pubsub.get_message(timeout=1.0)
+                    if message:
+                        self._handle(message["data"])
+            except Exception as e:
+                logger.warning(f"近端缓存失效订阅中断，清空缓存后重连: {e}")
+                self._clear_all()
+                time.sleep(1)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+
+
+_invalidator = _Invalidator()
+# 所有 SharedDict 实例，用于汇总缓存统计
+_instances = []
+
+
+# 仅删除过期时间仍早于 now 的字段
+_PURGE_EXPIRED_SCRIPT = """
+local now = tonumber(ARGV[1])
+for i = 2, #ARGV do
+    local deadline = redis.call('ZSCORE', KEYS[2], ARGV[i])
+    if deadline and tonumber(deadline) <= now then
+        redis.call('HDEL', KEYS[1], ARGV[i])
+        redis.call('ZREM', KEYS[2], ARGV[i])
+    end
+end
+return 0
+"""
+
+# 写入带过期时间的键时顺带删除一批已到期的字段（主动过期，只写不读的键也会被清理）
+_PURGE_DUE_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+if #due > 0 then
+    redis.call('HDEL', KEYS[1], unpack(due))
+    redis.call('ZREM', KEYS[2], unpack(due))
+end
+return #due
+"""
+# 每次写入最多主动清理的过期字段数
+EXPIRE_BATCH = 100
 
 
 class SharedDict:
-    """基于 Redis 的共享字典，支持 fallback 到内存字典"""
+    """
+    基于 Redis 的共享字典，支持 fallback 到内存字典
 
-    def __init__(self, namespace: str):
+    每个命名空间存放在一个 Redis hash（shared:<namespace>）中，keys()/items()/len()
+    只访问本命名空间，一到两次往返即可完成，不再使用阻塞整个 Redis 的 KEYS 命令。
+    单个键的过期时间记录在有序集合 shared:<namespace>:expiry 中（score 为过期时间戳），
+    读取时过滤并顺带清理已过期的键；每次写入带过期时间的键时再主动清理最多
+    EXPIRE_BATCH 个已到期的字段，只写不读的命名空间也不会无限增长。
+
+    near_cache_ttl > 0 时启用进程内近端缓存：读取先查本地有界 LRU，写入时通过
+    INVALIDATION_CHANNEL 通知其他 worker 删除对应条目；通知丢失时最长陈旧
+    near_cache_ttl 秒。Redis 不可用时使用的内存字典最多保存 fallback_size 个键，
+    超出后按 LRU 淘汰。
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        near_cache_ttl: float = 0,
+        near_cache_size: int = 1024,
+        fallback_size: int = 10000,
+        failback_policy: str = "replay",
+        codec=None,
+    ):
         self.namespace = namespace
         self.redis_client = RedisClient()
-        self._memory_dict = {}  # fallback 内存字典
+        # 值的编解码器（见 utils.shared_codec），可按命名空间选择
+        self.codec = get_codec(codec)
+        # Redis 恢复后对降级期间写入的处理: replay 写回 Redis，discard 丢弃
+        self.failback_policy = failback_policy
+        self._memory_dict = OrderedDict()  # fallback 内存字典（有界 LRU）
+        self._memory_expiry = {}  # fallback 内存字典的过期时间
+        self._memory_deleted = set()  # 降级期间删除的键（回放时同步删除）
+        self._fallback_size = fallback_size
+        self._fallback_evictions = 0
+        self._hash_key = f"shared:{namespace}"
+        self._expiry_key = f"shared:{namespace}:expiry"
+        self._near = None
+        if near_cache_ttl and near_cache_ttl > 0:
+            self._near = NearCache(near_cache_size, near_cache_ttl)
+            _invalidator.register(namespace, self._near)
+        _instances.append(self)
+        self.redis_client.add_failback_hook(self._take_fallback_writes)
+        if self.redis_client.is_available():
+            self._migrate_once()
 
     def _make_key(self, key: str) -> str:
-        """生成带命名空间的 Redis key"""
+        """生成旧版（每个键一个 Redis key）的带命名空间 key"""
         return f"{self.namespace}:{key}"
 
+    def _encode(self, value: Any) -> str:
+        return self.codec.encode(value)
+
+    def _decode(self, value: Any) -> Any:
+        return self.codec.decode(value)
+
+    # ----------------------------------------------------------------------------------
+    # 旧数据迁移
+    # ----------------------------------------------------------------------------------
+    def migrate_legacy_keys(self, batch_size: int = 500) -> int:
+        """
+        将旧版 <namespace>:<key> 字符串键迁移到 hash 中，保留剩余的过期时间。
+        使用增量 SCAN 遍历，不会阻塞 Redis。
+
+        返回:
+            int: 迁移的键数量。
+        """
+        client = self.redis_client.client
+        migrated = 0
+        prefix = f"{self.namespace}:"
+        batch = []
+
+        def flush(batch):
+            read = client.pipeline(transaction=False)
+            for redis_key in batch:
+                read.get(redis_key)
+                read.pttl(redis_key)
+            results = read.execute()
+            write = client.pipeline()
+            count = 0
+            for i, redis_key in enumerate(batch):
+                value, pttl = results[2 * i], results[2 * i + 1]
+                if value is None:
+                    continue  # 已过期或已被其他 worker 迁移
+                key = redis_key[len(prefix) :]
+                write.hset(self._hash_key, key, value)
+                if pttl and pttl > 0:
+                    write.zadd(self._expiry_key, {key: time.time() + pttl / 1000})
+                write.delete(redis_key)
+                count += 1
+            write.execute()
+            return count
+
+        for redis_key in client.scan_iter(match=f"{prefix}*", count=batch_size):
+            batch.append(redis_key)
+            if len(batch) >= batch_size:
+                migrated += flush(batch)
+                batch = []
+        if batch:
+            migrated += flush(batch)
+        if migrated:
+            logger.info(f"SharedDict[{self.namespace}] 已迁移旧版键 {migrated} 个")
+        return migrated
+
+    def _migrate_once(self):
+        """每个命名空间只由第一个启动的 worker 执行一次迁移"""
+        try:
+            marker = f"shared:{self.namespace}:migrated"
+            if self.redis_client.client.set(marker, 1, nx=True):
+                self.migrate_legacy_keys()
+        except Exception as e:
+            logger.error(f"SharedDict[{self.namespace}] 迁移旧版键失败: {e}")
+
+    # ----------------------------------------------------------------------------------
+    # 过期处理
+    # ----------------------------------------------------------------------------------
+    def _purge_expired(self, fields) -> None:
+        """删除已过期的字段（在 Redis 端再次确认，避免误删其他 worker 刚写入的新值）"""
+        if fields:
+            self.redis_client.client.eval(
+                _PURGE_EXPIRED_SCRIPT,
+                2,
+                self._hash_key,
+                self._expiry_key,
+                time.time(),
+                *fields,
+            )
+
+    def _purge_due(self, pipe) -> None:
+        """在写入管道中追加一次有界的主动过期清理"""
+        pipe.eval(
+            _PURGE_DUE_SCRIPT,
+            2,
+            self._hash_key,
+            self._expiry_key,
+            time.time(),
+            EXPIRE_BATCH,
+        )
+
+    def _memory_purge(self) -> None:
+        now = time.time()
+        expired = [k for k, deadline in self._memory_expiry.items() if deadline <= now]
+        for key in expired:
+            self._memory_expiry.pop(key, None)
+            self._memory_dict.pop(key, None)
+
+    def _memory_set(self, key: str, value: Any, ex: Optional[int] = None) -> None:
+        self._memory_deleted.discard(key)
+        self._memory_dict[key] = value
+        self._memory_dict.move_to_end(key)
+        if ex:
+            self._memory_expiry[key] = time.time() + ex
+        else:
+            self._memory_expiry.pop(key, None)
+        while len(self._memory_dict) > self._fallback_size:
+            evicted, _ = self._memory_dict.popitem(last=False)
+            self._memory_expiry.pop(evicted, None)
+            if self._fallback_evictions == 0:
+                logger.warning(
+                    f"SharedDict[{self.namespace}] 内存字典已满 ({self._fallback_size})，"
+                    "开始淘汰最久未写入的键"
+                )
+            self._fallback_evictions += 1
+
+    # ----------------------------------------------------------------------------------
+    # 近端缓存
+    # ----------------------------------------------------------------------------------
+    def _near_generation(self) -> Optional[int]:
+        """启用近端缓存时确保订阅线程在运行，并返回当前失效代数"""
+        if self._near is None:
+            return None
+        _invalidator.ensure_running(self.redis_client.client)
+        return self._near.generation
+
+    def _near_store(self, generation, key, value, deadline) -> None:
+        """缓存 Redis 中的原始字符串（命中时再解码，调用方修改返回值不会污染缓存）"""
+        if self._near is None:
+            return
+        ttl = None if deadline is None else deadline - time.time()
+        self._near.put(key, _MISSING if value is None else value, generation, ttl)
+
+    def _publish_invalidation(self, pipe, keys) -> None:
+        """在写入管道中附带失效通知，并删除本进程中的对应条目"""
+        if self._near is None:
+            return
+        self._near.invalidate(keys)
+        pipe.publish(INVALIDATION_CHANNEL, json.dumps({"n": self.namespace, "k": keys}))
+
+    def stats(self) -> dict:
+        """近端缓存命中统计与内存字典占用"""
+        return {
+            "namespace": self.namespace,
+            "near_cache": self._near.stats() if self._near else None,
+            "codec": self.codec.name,
+            "failback_policy": self.failback_policy,
+            "fallback_size": len(self._memory_dict),
+            "fallback_limit": self._fallback_size,
+            "fallback_evictions": self._fallback_evictions,
+        }
+
+    def _memory_delete(self, key: str) -> None:
+        self._memory_dict.pop(key, None)
+        self._memory_expiry.pop(key, None)
+        if len(self._memory_deleted) < self._fallback_size:
+            self._memory_deleted.add(key)
+
+    def _take_fallback_writes(self):
+        """
+        Redis 恢复时取出并清空降级期间的写入。
+
+        返回:
+            callable: 切回 Redis 后执行的回放函数；discard 策略或没有写入时返回 None。
+        """
+        self._memory_purge()
+        items = dict(self._memory_dict)
+        deadlines = dict(self._memory_expiry)
+        deleted = list(self._memory_deleted)
+        self._memory_dict.clear()
+        self._memory_expiry.clear()
+        self._memory_deleted.clear()
+        if self._near is not None:
+            self._near.invalidate()
+        if not items and not deleted:
+            return None
+        if self.failback_policy != "replay":
+            logger.info(
+                f"SharedDict[{self.namespace}] 丢弃降级期间的 {len(items)} 个写入"
+            )
+            return None
+
+        def replay():
+            now = time.time()
+            ttl = {key: max(deadline - now, 1) for key, deadline in deadlines.items()}
+            if deleted:
+                self.delete_many(deleted)
+            if items:
+                self.set_many(items, ex=ttl)
+            logger.info(
+                f"SharedDict[{self.namespace}] 已回放降级期间的写入: "
+                f"{len(items)} 个设置, {len(deleted)} 个删除"
+            )
+
+        return replay
+
+    # ----------------------------------------------------------------------------------
+    # 字典接口
+    # ----------------------------------------------------------------------------------
     def set(self, key: str, value: Any, ex: Optional[int] = None) -> bool:
         """设置值，支持过期时间（秒）"""
         try:
             if self.redis_client.is_available():
-                redis_key = self._make_key(key)
-                # 如果值是复杂对象，序列化为 JSON
-                if isinstance(value, (dict, list)):
-                    value = json.dumps(value)
-                self.redis_client.client.set(redis_key, value, ex=ex)
+                pipe = self.redis_client.client.pipeline()
+                if ex:
+                    # 先清理再写入，避免删掉本次写入的、之前已过期的同名键
+                    self._purge_due(pipe)
+                pipe.hset(self._hash_key, key, self._encode(value))
+                if ex:
+                    pipe.zadd(self._expiry_key, {key: time.time() + ex})
+                else:
+                    pipe.zrem(self._expiry_key, key)
+                self._publish_invalidation(pipe, [key])
+                pipe.execute()
                 return True
             else:
                 # fallback 到内存
-                self._memory_dict[key] = value
+                self._memory_set(key, value, ex)
                 return True
         except Exception as e:
             logger.error(f"Redis set 失败: {e}")
-            self._memory_dict[key] = value
+            self.redis_client.report_failure(e)
+            self._memory_set(key, value, ex)
             return False
 
     def get(self, key: str, default: Any = None) -> Any:
         """获取值"""
         try:
             if self.redis_client.is_available():
-                redis_key = self._make_key(key)
-                value = self.redis_client.client.get(redis_key)
-                if value is None:
-                    return default
-                # 尝试解析 JSON
-                try:
-                    return json.loads(value)
-                except (json.JSONDecodeError, TypeError):
-                    return value
+                generation = self._near_generation()
+                if generation is not None:
+                    cached = self._near.get(key)
+                    if cached is _MISSING:
+                        return default
+                    if cached is not None:
+                        return self._decode(cached)
+                pipe = self.redis_client.client.pipeline(transaction=False)
+                pipe.hget(self._hash_key, key)
+                pipe.zscore(self._expiry_key, key)
+                value, deadline = pipe.execute()
+                if value is not None and deadline is not None:
+                    if deadline <= time.time():
+                        self._purge_expired([key])
+                        value = None
+                self._near_store(generation, key, value, deadline)
+                return default if value is None else self._decode(value)
             else:
                 # fallback 到内存
+                self._memory_purge()
                 return self._memory_dict.get(key, default)
         except Exception as e:
             logger.error(f"Redis get 失败: {e}")
+            self.redis_client.report_failure(e)
+            self._memory_purge()
             return self._memory_dict.get(key, default)
 
     def delete(self, key: str) -> bool:
         """删除键"""
         try:
             if self.redis_client.is_available():
-                redis_key = self._make_key(key)
-                self.redis_client.client.delete(redis_key)
+                pipe = self.redis_client.client.pipeline()
+                pipe.hdel(self._hash_key, key)
+                pipe.zrem(self._expiry_key, key)
+                self._publish_invalidation(pipe, [key])
+                pipe.execute()
                 return True
             else:
-                self._memory_dict.pop(key, None)
+                self._memory_delete(key)
                 return True
         except Exception as e:
             logger.error(f"Redis delete 失败: {e}")
-            self._memory_dict.pop(key, None)
+            self.redis_client.report_failure(e)
+            self._memory_delete(key)
             return False
 
+    def _snapshot(self, with_values: bool):
+        """一次往返读取整个命名空间，返回 (未过期的数据, 已过期的字段)"""
+        pipe = self.redis_client.client.pipeline(transaction=False)
+        if with_values:
+            pipe.hgetall(self._hash_key)
+        else:
+            pipe.hkeys(self._hash_key)
+        pipe.zrangebyscore(self._expiry_key, "-inf", time.time())
+        data, expired = pipe.execute()
+        expired = set(expired)
+        if expired:
+            self._purge_expired(list(expired))
+        return data, expired
+
     def keys(self) -> list:
         """获取所有键（只返回当前命名空间的）"""
         try:
             if self.redis_client.is_available():
-                pattern = f"{self.namespace}:*"
-                keys = self.redis_client.client.keys(pattern)
-                # 去掉命名空间前缀
-                return [k.replace(f"{self.namespace}:", "", 1) for k in keys]
+                fields, expired = self._snapshot(with_values=False)
+                return [key for key in fields if key not in expired]
             else:
+                self._memory_purge()
                 return list(self._memory_dict.keys())
         except Exception as e:
             logger.error(f"Redis keys 失败: {e}")
+            self.redis_client.report_failure(e)
             return list(self._memory_dict.keys())
 
     def items(self):
         """返回所有键值对"""
-        for key in self.keys():
-            yield key, self.get(key)
+        try:
+            if self.redis_client.is_available():
+                data, expired = self._snapshot(with_values=True)
+                return [
+                    (key, self._decode(value))
+                    for key, value in data.items()
+                    if key not in expired
+                ]
+            else:
+                self._memory_purge()
+                return list(self._memory_dict.items())
+        except Exception as e:
+            logger.error(f"Redis items 失败: {e}")
+            self.redis_client.report_failure(e)
+            return list(self._memory_dict.items())
 
     def pop(self, key: str, default: Any = None) -> Any:
-        """弹出并删除键"""
-        value = self.get(key, default)
-        self.delete(key)
-        return value
+        """原子地弹出并删除键（MULTI/EXEC 中读取并删除，并发 pop 只有一个能拿到值）"""
+        try:
+            if self.redis_client.is_available():
+                pipe = self.redis_client.client.pipeline()
+                pipe.hget(self._hash_key, key)
+                pipe.zscore(self._expiry_key, key)
+                pipe.hdel(self._hash_key, key)
+                pipe.zrem(self._expiry_key, key)
+                self._publish_invalidation(pipe, [key])
+                value, deadline = pipe.execute()[:2]
+                if value is None or (deadline is not None and deadline <= time.time()):
+                    return default
+                return self._decode(value)
+            else:
+                self._memory_purge()
+                self._memory_expiry.pop(key, None)
+                return self._memory_dict.pop(key, default)
+        except Exception as e:
+            logger.error(f"Redis pop 失败: {e}")
+            self.redis_client.report_failure(e)
+            self._memory_expiry.pop(key, None)
+            return self._memory_dict.pop(key, default)
+
+    # ----------------------------------------------------------------------------------
+    # 批量接口（一次往返完成）
+    # ----------------------------------------------------------------------------------
+    def get_many(self, keys, default: Any = None) -> dict:
+        """
+        批量获取（HMGET），未找到或已过期的键取 default。
+
+        返回:
+            dict: 键 -> 值。
+        """
+        keys = list(keys)
+        if not keys:
+            return {}
+        try:
+            if self.redis_client.is_available():
+                result = {}
+                generation = self._near_generation()
+                if generation is not None:
+                    for key in keys:
+                        cached = self._near.get(key)
+                        if cached is _MISSING:
+                            result[key] = default
+                        elif cached is not None:
+                            result[key] = self._decode(cached)
+                    keys = [key for key in keys if key not in result]
+                    if not keys:
+                        return result
+                pipe = self.redis_client.client.pipeline(transaction=False)
+                pipe.hmget(self._hash_key, keys)
+                pipe.zmscore(self._expiry_key, keys)
+                values, deadlines = pipe.execute()
+                now = time.time()
+                expired = []
+                for key, value, deadline in zip(keys, values, deadlines):
+                    if value is not None and deadline is not None and deadline <= now:
+                        expired.append(key)
+                        value = None
+                    self._near_store(generation, key, value, deadline)
+                    result[key] = default if value is None else self._decode(value)
+                self._purge_expired(expired)
+                return result
+            else:
+                self._memory_purge()
+                return {key: self._memory_dict.get(key, default) for key in keys}
+        except Exception as e:
+            logger.error(f"Redis get_many 失败: {e}")
+            self.redis_client.report_failure(e)
+            self._memory_purge()
+            return {key: self._memory_dict.get(key, default) for key in keys}
+
+    def set_many(self, mapping: dict, ex=None) -> bool:
+        """
+        批量设置（一个 MULTI/EXEC 管道）。
+
+        参数:
+            mapping (dict): 键 -> 值。
+            ex (int | dict): 统一的过期时间（秒），或 键 -> 过期时间 的字典，
+                             未出现在字典中的键不过期。
+        """
+        if not mapping:
+            return True
+
+        def ttl(key):
+            return ex.get(key) if isinstance(ex, dict) else ex
+
+        try:
+            if self.redis_client.is_available():
+                now = time.time()
+                deadlines = {key: now + ttl(key) for key in mapping if ttl(key)}
+                persistent = [key for key in mapping if key not in deadlines]
+                pipe = self.redis_client.client.pipeline()
+                if deadlines:
+                    self._purge_due(pipe)
+                pipe.hset(
+                    self._hash_key,
+                    mapping={key: self._encode(v) for key, v in mapping.items()},
+                )
+                if deadlines:
+                    pipe.zadd(self._expiry_key, deadlines)
+                if persistent:
+                    pipe.zrem(self._expiry_key, *persistent)
+                self._publish_invalidation(pipe, list(mapping))
+                pipe.execute()
+                return True
+            else:
+                for key, value in mapping.items():
+                    self._memory_set(key, value, ttl(key))
+                return True
+        except Exception as e:
+            logger.error(f"Redis set_many 失败: {e}")
+            self.redis_client.report_failure(e)
+            for key, value in mapping.items():
+                self._memory_set(key, value, ttl(key))
+            return False
+
+    def delete_many(self, keys) -> bool:
+        """批量删除"""
+        keys = list(keys)
+        if not keys:
+            return True
+        try:
+            if self.redis_client.is_available():
+                pipe = self.redis_client.client.pipeline()
+                pipe.hdel(self._hash_key, *keys)
+                pipe.zrem(self._expiry_key, *keys)
+                self._publish_invalidation(pipe, keys)
+                pipe.execute()
+                return True
+            else:
+                for key in keys:
+                    self._memory_delete(key)
+                return True
+        except Exception as e:
+            logger.error(f"Redis delete_many 失败: {e}")
+            self.redis_client.report_failure(e)
+            for key in keys:
+                self._memory_delete(key)
+            return False
+
+    def __len__(self) -> int:
+        try:
+            if self.redis_client.is_available():
+                pipe = self.redis_client.client.pipeline(transaction=False)
+                pipe.hlen(self._hash_key)
+                pipe.zcount(self._expiry_key, "-inf", time.time())
+                total, expired = pipe.execute()
+                return max(total - expired, 0)
+            else:
+                self._memory_purge()
+                return len(self._memory_dict)
+        except Exception as e:
+            logger.error(f"Redis len 失败: {e}")
+            self.redis_client.report_failure(e)
+            return len(self._memory_dict)
 
     def __getitem__(self, key: str) -> Any:
         value = self.get(key)
@@ -155,6 +972,52 @@ class SharedDict:
         return self.get(key) is not None
 
 
+def benchmark_shared_dict(count: int = 200, rounds: int = 5) -> dict:
+    """
+    对比逐键读写与批量读写的 Redis 往返开销（使用临时命名空间，结束后清理）。
+
+    返回:
+        dict: 各操作平均耗时（毫秒），{"keys", "set", "set_many", "get", "get_many",
+              "delete", "delete_many"}；Redis 不可用时返回 None。
+    """
+    shared = SharedDict(f"benchmark:{os.getpid()}")
+    if not shared.redis_client.is_available():
+        return None
+    keys = [f"key-{i}" for i in range(count)]
+    mapping = {key: {"status": "running", "index": i} for i, key in enumerate(keys)}
+
+    def measure(func):
+        started = time.perf_counter()
+        for _ in range(rounds):
+            func()
+        return round((time.perf_counter() - started) * 1000 / rounds, 3)
+
+    result = {"keys": count}
+    try:
+        result["set"] = measure(
+            lambda: [shared.set(k, v, ex=60) for k, v in mapping.items()]
+        )
+        result["set_many"] = measure(lambda: shared.set_many(mapping, ex=60))
+        result["get"] = measure(lambda: [shared.get(k) for k in keys])
+        result["get_many"] = measure(lambda: shared.get_many(keys))
+        result["delete"] = measure(lambda: [shared.delete(k) for k in keys])
+        shared.set_many(mapping)
+        result["delete_many"] = measure(lambda: shared.delete_many(keys))
+    finally:
+        shared.redis_client.client.delete(
+            shared._hash_key, shared._expiry_key, f"shared:{shared.namespace}:migrated"
+        )
+    return result
+
+
+def cache_stats() -> list:
+    """本进程中所有 SharedDict 的近端缓存与内存字典统计"""
+    return [shared.stats() for shared in _instances]
+
+
+# 近端缓存 TTL（秒），0 表示关闭
+NEAR_CACHE_TTL = float(os.getenv("SHARED_DICT_NEAR_CACHE_TTL", 5))
+
 # 创建共享字典实例
-docker_status = SharedDict("docker_status")
-terminal_sessions = SharedDict("terminal_sessions")
+docker_status = SharedDict("docker_status", near_cache_ttl=NEAR_CACHE_TTL)
+terminal_sessions = SharedDict("terminal_sessions", near_cache_ttl=NEAR_CACHE_TTL)
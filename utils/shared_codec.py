@@ -0,0 +1,218 @@
+"""
+SharedDict 值的编解码
+
+写入 Redis 的值统一编码为带类型标记的字符串: "\\x1e" + 类型标记 + 内容。
+
+- s: 字符串（原样保存，读取时不再尝试解析 JSON）
+- i / f / b / n: 整数 / 浮点数 / 布尔值 / None
+- y: bytes（base64）
+- j: dict、list（JSON；tuple 与 set 保存为 list）
+- z: zlib 压缩后的完整编码（base64），仅在超过压缩阈值且确实变小时使用
+
+SharedDict 使用 decode_responses=True 的连接池，值必须是合法的 UTF-8 文本，因此
+结构化数据使用 JSON（安装了 orjson 时使用 orjson）而不是 msgpack 二进制。
+没有类型标记的值是旧版写入的数据，按旧逻辑尝试 json.loads，下次写入时自动改为新格式。
+"""
+
+import base64
+import json
+import logging
+import os
+import time
+import zlib
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # orjson 为可选依赖
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+MARKER = "\x1e"
+
+
+class TaggedCodec:
+    """
+    带类型标记的编解码器
+
+    参数:
+        backend (str): 结构化数据的 JSON 实现，"json" 或 "orjson"（未安装时回退到 json）。
+        compress_threshold (int): 编码后超过该字符数时尝试 zlib 压缩，0 表示不压缩。
+    """
+
+    def __init__(self, backend: str = "json", compress_threshold: int = 0):
+        if backend == "orjson" and orjson is None:
+            logger.warning("未安装 orjson，SharedDict 编解码回退到标准库 json")
+            backend = "json"
+        if backend not in ("json", "orjson"):
+            raise ValueError(f"未知的 JSON 实现: {backend}")
+        self.backend = backend
+        self.compress_threshold = compress_threshold
+
+    @property
+    def name(self) -> str:
+        if self.compress_threshold:
+            return f"{self.backend}+zlib>{self.compress_threshold}"
+        return self.backend
+
+    def _dumps(self, value: Any) -> str:
+        if self.backend == "orjson":
+            return orjson.dumps(
+                value, default=_json_default, option=orjson.OPT_NON_STR_KEYS
+            ).decode("utf-8")
+        return json.dumps(value, ensure_ascii=False, default=_json_default)
+
+    def _loads(self, text: str) -> Any:
+        if self.backend == "orjson":
+            return orjson.loads(text)
+        return json.loads(text)
+
+    def _encode_plain(self, value: Any) -> str:
+        # bool 是 int 的子类，必须先判断
+        if isinstance(value, str):
+            return MARKER + "s" + value
+        if isinstance(value, bool):
+            return MARKER + "b" + ("1" if value else "0")
+        if isinstance(value, int):
+            return MARKER + "i" + str(value)
+        if isinstance(value, float):
+            return MARKER + "f" + repr(value)
+        if value is None:
+            return MARKER + "n"
+        if isinstance(value, (bytes, bytearray)):
+            return MARKER + "y" + base64.b64encode(value).decode("ascii")
+        return MARKER + "j" + self._dumps(value)
+
+    def encode(self, value: Any) -> str:
+        """将 Python 值编码为写入 Redis 的字符串"""
+        data = self._encode_plain(value)
+        if self.compress_threshold and len(data) > self.compress_threshold:
+            packed = base64.b64encode(zlib.compress(data.encode("utf-8"))).decode(
+                "ascii"
+            )
+            if len(packed) + 2 < len(data):
+                return MARKER + "z" + packed
+        return data
+
+    def decode(self, data: Any) -> Any:
+        """将 Redis 中的字符串解码为 Python 值"""
+        if not isinstance(data, str) or not data.startswith(MARKER) or len(data) < 2:
+            return _decode_legacy(data)
+        tag, body = data[1], data[2:]
+        if tag == "s":
+            return body
+        if tag == "j":
+            return self._loads(body)
+        if tag == "i":
+            return int(body)
+        if tag == "f":
+            return float(body)
+        if tag == "b":
+            return body == "1"
+        if tag == "n":
+            return None
+        if tag == "y":
+            return base64.b64decode(body)
+        if tag == "z":
+            return self.decode(zlib.decompress(base64.b64decode(body)).decode("utf-8"))
+        return _decode_legacy(data)
+
+
+def _json_default(value):
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    raise TypeError(f"无法序列化的类型: {type(value).__name__}")
+
+
+def _decode_legacy(value: Any) -> Any:
+    """旧版格式：dict/list 为 JSON，其余原样保存"""
+    try:
+        return json.loads(value)
+    except (json.JSONDecodeError, TypeError):
+        return value
+
+
+def get_codec(codec=None) -> TaggedCodec:
+    """
+    按名称获取编解码器。
+
+    参数:
+        codec (str | TaggedCodec | None): "json"、"orjson"，可带 "+zlib" 后缀
+            （使用 SHARED_DICT_COMPRESS_THRESHOLD 作为压缩阈值）；
+            None 时读取环境变量 SHARED_DICT_CODEC（默认 json）。
+
+    返回:
+        TaggedCodec: 编解码器实例。
+    """
+    if isinstance(codec, TaggedCodec):
+        return codec
+    name = codec or os.getenv("SHARED_DICT_CODEC", "json")
+    backend, _, compress = name.partition("+")
+    threshold = 0
+    if compress == "zlib":
+        threshold = int(os.getenv("SHARED_DICT_COMPRESS_THRESHOLD", 1024))
+    elif compress:
+        raise ValueError(f"未知的压缩方式: {compress}")
+    return TaggedCodec(backend, threshold)
+
+
+# -------------------------------------------------------------------------------------------
+# 基准测试
+# -------------------------------------------------------------------------------------------
+def sample_records() -> dict:
+    """与线上结构一致的示例记录: 终端会话元数据与容器状态"""
+    return {
+        "terminal_session": {
+            "exec_id": "5f0c" * 16,
+            "pid": 4123,
+            "session_marker": "uniweb-session-8c1f2a",
+            "container_id": "a3b1" * 16,
+            "container_name": "uniweb-project-42",
+        },
+        "docker_status": "running",
+        "status_batch": {
+            str(pid): {"status": "running", "port": 10000 + pid, "cpu": 0.25 * pid}
+            for pid in range(200)
+        },
+    }
+
+
+def _legacy_encode(value):
+    return json.dumps(value) if isinstance(value, (dict, list)) else value
+
+
+def benchmark_codecs(rounds: int = 2000) -> list:
+    """
+    对比各编解码器对示例记录的编码、解码耗时（微秒/次）与编码后大小（字节）。
+
+    返回:
+        list: 每个 (记录, 编解码器) 一行 {"record", "codec", "encode_us", "decode_us",
+              "bytes"}；legacy 为改动前的逻辑。
+    """
+    codecs = {"legacy": (_legacy_encode, _decode_legacy)}
+    for name in ("json", "orjson", "json+zlib", "orjson+zlib"):
+        codec = get_codec(name)
+        if codec.name not in codecs:
+            codecs[codec.name] = (codec.encode, codec.decode)
+
+    def measure(func, value):
+        started = time.perf_counter()
+        for _ in range(rounds):
+            func(value)
+        return round((time.perf_counter() - started) * 1e6 / rounds, 2)
+
+    rows = []
+    for record, value in sample_records().items():
+        for name, (encode, decode) in codecs.items():
+            data = encode(value)
+            rows.append(
+                {
+                    "record": record,
+                    "codec": name,
+                    "encode_us": measure(encode, value),
+                    "decode_us": measure(decode, data),
+                    "bytes": len(str(data).encode("utf-8")),
+                }
+            )
+    return rows
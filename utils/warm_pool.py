@@ -0,0 +1,219 @@
+"""
+容器预热池
+
+上课时全班同时点击“启动”，每个项目都要依次检查镜像、创建容器（含端口绑定）再启动。
+预热池在生命周期执行者空闲时，为已配置端口但还没有容器的项目提前创建好容器
+（只创建、不启动，不占用内存与 CPU），启动任务认领后只需 start。
+
+Docker 不允许修改已有容器的端口绑定与标签，而每个项目都通过自己的宿主机端口对外
+访问，因此池中的容器直接按项目的容器名与端口创建，“认领”即从池中移除该项目:
+
+- warm_pool:members   pid -> 容器名（已预创建、尚未被启动过的容器）
+- warm_pool:metrics   hits / misses 计数
+- warm_pool:latency   最近的启动耗时（"hit:秒" / "miss:秒"）
+
+WARM_POOL_SIZE 为池中容器数上限，0 表示关闭。Redis 不可用时预热池不工作。
+"""
+
+from utils.docker_client import (
+    _docker_container_attrs,
+    _docker_container_exists,
+    _docker_remove_container,
+    docker_client,
+)
+from utils.redis_client import RedisClient
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# 池中预创建容器数上限，0 表示关闭
+SIZE = int(os.getenv("WARM_POOL_SIZE", 0))
+# 空闲时至少间隔多少秒检查一次是否需要补充
+REFILL_INTERVAL = float(os.getenv("WARM_POOL_REFILL_INTERVAL", 60))
+# 保留最近多少次启动耗时用于计算分位数
+LATENCY_SAMPLES = 500
+
+MEMBERS_KEY = "warm_pool:members"
+METRICS_KEY = "warm_pool:metrics"
+LATENCY_KEY = "warm_pool:latency"
+
+
+def _redis():
+    client = RedisClient()
+    return client if client.is_available() else None
+
+
+def enabled() -> bool:
+    return SIZE > 0 and _redis() is not None
+
+
+def add(pid, container_name) -> None:
+    """记录一个已预创建的容器"""
+    client = _redis()
+    if client is None:
+        return
+    try:
+        client.client.hset(MEMBERS_KEY, str(pid), container_name)
+    except Exception as e:
+        client.report_failure(e)
+        logger.error(f"记录预热容器失败: pid={pid}, 错误: {e}")
+
+
+def discard(pid) -> bool:
+    """
+    从池中移除项目（容器被启动、删除或重建时调用）。
+
+    返回:
+        bool: 项目是否在池中。
+    """
+    client = _redis()
+    if client is None:
+        return False
+    try:
+        return client.client.hdel(MEMBERS_KEY, str(pid)) > 0
+    except Exception as e:
+        client.report_failure(e)
+        logger.error(f"移除预热容器记录失败: pid={pid}, 错误: {e}")
+        return False
+
+
+def claim(pid, params) -> bool:
+    """
+    认领项目的预热容器。容器已不存在、已被启动过或端口与当前配置不一致时
+    视为未命中（端口不一致的容器会被删除，由启动任务重新创建）。
+
+    参数:
+        pid (str): 项目ID。
+        params (dict): 启动任务参数（container_name、host_port、container_port）。
+
+    返回:
+        bool: 是否命中，命中时只需启动容器。
+    """
+    if not discard(pid):
+        return False
+    container_name = params["container_name"]
+    attrs = _docker_container_attrs(container_name)
+    if not attrs or (attrs.get("State") or {}).get("Status") != "created":
+        return False
+    bindings = (attrs.get("HostConfig") or {}).get("PortBindings") or {}
+    host_ports = [
+        binding.get("HostPort")
+        for binding in bindings.get(f"{params['container_port']}/tcp") or []
+    ]
+    if str(params["host_port"]) not in host_ports:
+        logger.info(f"预热容器端口已过期，删除后重新创建: {container_name}")
+        _docker_remove_container(container_name)
+        return False
+    return True
+
+
+def vacancies() -> int:
+    """池中还可以补充的容器数"""
+    client = _redis()
+    if SIZE <= 0 or client is None:
+        return 0
+    try:
+        return max(SIZE - client.client.hlen(MEMBERS_KEY), 0)
+    except Exception as e:
+        client.report_failure(e)
+        return 0
+
+
+def pick(projects, limit) -> list:
+    """
+    从候选项目中挑出需要预热的项目，同时清理已不再需要的池记录。
+
+    参数:
+        projects (list): get_startable_projects() 的结果（按优先级排序）。
+        limit (int): 最多挑选的数量。
+
+    返回:
+        list: 需要预创建容器的项目对象。
+    """
+    client = _redis()
+    if client is None or limit <= 0:
+        return []
+    members = client.client.hgetall(MEMBERS_KEY)
+    startable = {str(project.pid) for project in projects}
+    for pid, container_name in members.items():
+        # 项目已删除或不再配置端口
+        if pid not in startable:
+            discard(pid)
+            if _docker_container_exists(container_name):
+                _docker_remove_container(container_name)
+    existing = set()
+    for container in docker_client.containers.list(all=True, sparse=True):
+        for name in container.attrs.get("Names") or []:
+            existing.add(name.lstrip("/"))
+    picked = []
+    for project in projects:
+        if len(picked) >= limit:
+            break
+        if str(project.pid) in members or project.docker_name in existing:
+            continue
+        picked.append(project)
+    return picked
+
+
+def record_start(hit, seconds) -> None:
+    """记录一次启动是否命中预热池及从提交到运行的耗时"""
+    client = _redis()
+    if client is None or SIZE <= 0:
+        return
+    try:
+        pipe = client.client.pipeline(transaction=False)
+        pipe.hincrby(METRICS_KEY, "hits" if hit else "misses", 1)
+        pipe.lpush(LATENCY_KEY, f"{'hit' if hit else 'miss'}:{seconds:.3f}")
+        pipe.ltrim(LATENCY_KEY, 0, LATENCY_SAMPLES - 1)
+        pipe.execute()
+    except Exception as e:
+        client.report_failure(e)
+
+
+def _percentiles(values) -> dict:
+    if not values:
+        return {"count": 0, "p50": None, "p95": None}
+    values = sorted(values)
+    return {
+        "count": len(values),
+        "p50": values[len(values) // 2],
+        "p95": values[min(int(len(values) * 0.95), len(values) - 1)],
+    }
+
+
+def stats() -> dict:
+    """
+    预热池状态与命中率。
+
+    返回:
+        dict: {"size", "members", "hits", "misses", "hit_rate",
+              "latency": {"hit": {...}, "miss": {...}}}，耗时单位为秒。
+    """
+    result = {"size": SIZE, "enabled": enabled()}
+    client = _redis()
+    if client is None:
+        return result
+    try:
+        pipe = client.client.pipeline(transaction=False)
+        pipe.hlen(MEMBERS_KEY)
+        pipe.hgetall(METRICS_KEY)
+        pipe.lrange(LATENCY_KEY, 0, -1)
+        members, metrics, samples = pipe.execute()
+    except Exception as e:
+        client.report_failure(e)
+        return result
+    hits, misses = int(metrics.get("hits", 0)), int(metrics.get("misses", 0))
+    latency = {"hit": [], "miss": []}
+    for sample in samples:
+        kind, _, seconds = sample.partition(":")
+        if kind in latency:
+            latency[kind].append(float(seconds))
+    result.update(
+        members=members,
+        hits=hits,
+        misses=misses,
+        hit_rate=round(hits / (hits + misses), 3) if hits + misses else None,
+        latency={kind: _percentiles(values) for kind, values in latency.items()},
+    )
+    return result
@@ -0,0 +1,108 @@
+"""
+worker 之间的定向消息
+
+每个 worker 进程订阅自己的 Redis 频道 worker:<hostname>:<pid>，其他 worker 通过
+send() 把只能由持有者处理的操作（例如写入某个终端 exec socket）转发给它。
+PUBLISH 返回订阅者数量，为 0 说明目标 worker 已经退出。
+"""
+
+from utils.redis_client import RedisClient
+import json
+import logging
+import os
+import socket
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_PREFIX = "worker:"
+
+
+def worker_id() -> str:
+    """当前进程的标识（gunicorn fork 之后各不相同）"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class WorkerChannel:
+    def __init__(self):
+        self._handlers = {}  # op -> callable(payload)
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def on(self, op: str, handler) -> None:
+        """注册操作处理函数，handler 接收发送方传入的 payload 字典"""
+        self._handlers[op] = handler
+
+    def ensure_running(self) -> bool:
+        """每个进程启动一个订阅线程；Redis 不可用时返回 False"""
+        client = RedisClient()
+        if not client.is_available():
+            return False
+        if self._pid == os.getpid():
+            return True
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                threading.Thread(
+                    target=self._listen,
+                    args=(client.client, CHANNEL_PREFIX + worker_id()),
+                    name="worker-channel",
+                    daemon=True,
+                ).start()
+        return True
+
+    def send(self, target: str, op: str, payload: dict) -> bool:
+        """
+        向目标 worker 发送一条操作。
+
+        返回:
+            bool: 目标 worker 是否在线并收到消息。
+        """
+        client = RedisClient()
+        if not client.is_available():
+            return False
+        try:
+            message = json.dumps({"op": op, "payload": payload})
+            return client.client.publish(CHANNEL_PREFIX + target, message) > 0
+        except Exception as e:
+            client.report_failure(e)
+            logger.error(f"转发 {op} 到 worker {target} 失败: {e}")
+            return False
+
+    def _dispatch(self, data: str) -> None:
+        try:
+            message = json.loads(data)
+        except (json.JSONDecodeError, TypeError):
+            return
+        handler = self._handlers.get(message.get("op"))
+        if handler is None:
+            logger.warning(f"未知的 worker 消息: {message.get('op')}")
+            return
+        try:
+            handler(message.get("payload") or {})
+        except Exception as e:
+            logger.error(f"处理 worker 消息 {message.get('op')} 失败: {e}", exc_info=True)
+
+    def _listen(self, client, channel: str) -> None:
+        while True:
+            pubsub = None
+            try:
+                pubsub = client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(channel)
+                while True:
+                    message = pubsub.get_message(timeout=1.0)
+                    if message:
+                        self._dispatch(message["data"])
+            except Exception as e:
+                logger.warning(f"worker 频道订阅中断，稍后重连: {e}")
+                time.sleep(1)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+
+
+worker_channel = WorkerChannel()